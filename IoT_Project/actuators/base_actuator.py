@@ -4,7 +4,10 @@ import json, time
 import threading
 from utils.config_loader import ConfigLoader
 from utils.device_registrar import DeviceRegistrar
+from utils.heartbeat import HeartbeatSender
 from utils.topic_fetcher import TopicFetcher
+from utils.warning_topics import WarningTopics
+from utils.latency_metrics import LatencyMetrics
 
 class BaseActuator:
     def __init__(self, actuator_type):
@@ -16,12 +19,24 @@ class BaseActuator:
         self.catalog_url = cfg.catalog_url
         self.mqtt_host = cfg.mqtt_host
         self.mqtt_port = cfg.mqtt_port
+        self.liveness_config = cfg.liveness_config
 
         # Fetch topics
         fetcher = TopicFetcher(self.catalog_url)
         self.adjust_topic = fetcher.get_adjust_topic()
         self.warning_topic = fetcher.get_warning_topic()
 
+        # Warnings: only the topics of the buildings where this actuator has devices (+ the broadcast)
+        self.warning_topics = WarningTopics(self.warning_topic or "EQ_WARNING/", cfg.warning_regions)
+        self.warning_buildings = {}     # building -> running devices in it
+        self.warning_client = None
+
+        # latency of the warnings (controller publish -> receive -> act), see utils/latency_metrics.py
+        self.latency = LatencyMetrics(actuator_type, cfg.latency_dir, cfg.latency_dump_interval)
+
+        # (incident id, building) -> highest level acted on (one warning per building and level of an incident)
+        self.handled = {}
+
     # MQTT connect callback
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
@@ -40,36 +55,102 @@ class BaseActuator:
                 self.add_device(data)
 
             elif action == "remove":
-                device_id = data.get("device_id")
-                self.remove_device(device_id)
+                for device_id in data.get("device_ids") or [data.get("device_id")]:
+                    self.remove_device(device_id)
 
         except Exception as e:
             return
 
+    # --- Per building warning topics ---
+    def subscribe_warnings(self, client):
+        """ Called by the child classes in on_connect. """
+        self.warning_client = client
+        client.subscribe(self.warning_topic)    # broadcast (building of the sensor unknown)
+        for building in self.warning_buildings:
+            client.subscribe(self.warning_topics.building_filter(building))
+
+    def watch_building(self, building):
+        count = self.warning_buildings.get(building, 0)
+        self.warning_buildings[building] = count + 1
+        if count == 0 and self.warning_client is not None:
+            self.warning_client.subscribe(self.warning_topics.building_filter(building))
+            print(f"[MQTT][baseActuator] Subscribed to warnings of {building}")
+
+    def unwatch_building(self, building):
+        count = self.warning_buildings.get(building, 0) - 1
+        if count > 0:
+            self.warning_buildings[building] = count
+            return
+        self.warning_buildings.pop(building, None)
+        if self.warning_client is not None:
+            self.warning_client.unsubscribe(self.warning_topics.building_filter(building))
+            print(f"[MQTT][baseActuator] Unsubscribed from warnings of {building}")
+
+    # --- Warnings of an incident: act once per level (QoS 1 duplicates, building + broadcast topics) ---
+    def first_time(self, payload, keep=100):
+        if payload.get("command") == "REACTIVATE":
+            # operator re-armed the cutoffs: the next warnings are acted on again
+            building = payload.get("building")
+            self.handled = {key: level for key, level in self.handled.items()
+                            if building is not None and key[1] != building}
+            return True
+        incident, level = payload.get("incident"), payload.get("level")
+        if incident is None or level is None:
+            return True     # not a coalesced warning (ex. REACTIVATE, MANUAL_SHUTOFF)
+        key = (incident, payload.get("building"))
+        if level <= self.handled.get(key, 0):
+            return False
+        self.handled[key] = level
+        if len(self.handled) > keep:
+            del self.handled[next(iter(self.handled))]
+        return True
+
+    # --- Alert latency: child classes call it once the action is done ---
+    def acted(self, payload, received):
+        """ payload: warning message (correlation id + timestamps), received: time.time() in on_message. """
+        now = time.time()
+        command = payload.get("command")
+        self.latency.record_between(f"{command} publish->receive", payload.get("t_publish"), received)
+        self.latency.record_between(f"{command} receive->act", received, now)
+        self.latency.record_between(f"{command} sample->act", payload.get("t_sample"), now)
+        if payload.get("t_sample") is not None:
+            print(f"[LATENCY][{self.actuator_type}] {command} {payload.get('id')}: "
+                  f"{(now - payload['t_sample']) * 1000:.0f} ms from the sample of {payload.get('sensor_id')}")
+
     def add_device(self, data):
         """
-        Register device and start its thread.
-        This should be called by on_message for 'add' action.
+        Register device(s) and start their threads.
+        This should be called by on_message for 'add' action ("count": N devices, one catalog request).
         """
         building = data.get("building")
         location = data.get("location", {})
         latitude = location.get("latitude")
         longitude = location.get("longitude")
+        count = data.get("count", 1)
 
         # Register device in catalog
         registrar = DeviceRegistrar(self.catalog_url)
-        device_id, topic = registrar.register(
-            {"type": self.actuator_type, "building": building,
-             "location": {"latitude": latitude, "longitude": longitude}},
-            )
+        payload = {"type": self.actuator_type, "building": building,
+                   "location": {"latitude": latitude, "longitude": longitude}}
+        if count == 1:
+            device_id, topic = registrar.register(payload)
+            self.start_device(device_id, building, topic, payload)
+        else:
+            for answer in registrar.register_many([payload] * count):
+                self.start_device(answer["client_id"], building, answer["topic"], payload)
 
+    def start_device(self, device_id, building, topic, payload=None):
         running = {"flag": True}
         t = threading.Thread(
             target=self.run_single_device,
             args=(device_id, building, topic, running)
         )
         t.daemon = True
-        self.sensors[device_id] = {"thread": t, "running": running}
+        # registration kept to register again with the same client_id if evicted (see utils/heartbeat.py)
+        registration = dict(payload, client_id=device_id) if payload is not None else None
+        self.sensors[device_id] = {"thread": t, "running": running, "building": building,
+                                   "registration": registration}
+        self.watch_building(building)
         t.start()
         print(f"[INFO][baseActuator] {self.actuator_type} {device_id} started for building {building}")
 
@@ -81,8 +162,13 @@ class BaseActuator:
             print(f"[INFO][baseActuator] Stopping {self.actuator_type} {device_id}")
             self.sensors[device_id]["running"]["flag"] = False
             self.sensors[device_id]["thread"].join()
+            self.unwatch_building(self.sensors[device_id]["building"])
             del self.sensors[device_id]
 
+    def registration(self, device_id):
+        device = self.sensors.get(device_id)
+        return device["registration"] if device is not None else None
+
     def run_single_device(self, device_id, building, topic, running, interval=0.1):
         """
         Method to run the actuator thread.
@@ -105,6 +191,11 @@ class BaseActuator:
         """
         Main loop to listen for Adjust messages.
         """
+        self.latency.start_dump()
+        # one batched heartbeat for all the devices of this process
+        if self.liveness_config.get("enabled", False):
+            HeartbeatSender(self.catalog_url, self.liveness_config.get("interval", 10),
+                            lambda: list(self.sensors), self.registration, name=self.actuator_type).start()
         self.mqtt_client = mqtt.Client(client_id=f"{self.actuator_type}AdjustListener")
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
@@ -10,14 +10,18 @@ class BuzzerActuator(BaseActuator):
         super().on_connect(client, userdata, flags, rc)
         if rc == 0:
             print("[MQTT][Buzzer] Subscribing also to Warning topic...")
-            client.subscribe(self.warning_topic)
+            self.subscribe_warnings(client)
 
     def on_message(self, client, userdata, msg):
         try:
+            received = time.time()
             payload = json.loads(msg.payload.decode("utf-8"))
             command = payload.get("command")
+            if not self.first_time(payload):
+                return      # this incident / level was already handled (duplicate delivery)
 
             if command in ["EARTHQUAKE", "ALARM"]:
+                self.acted(payload, received)   # the alarm starts now (and lasts a few seconds)
                 self.alarm()
             else:
                 # fall back to parent behavior (adjust add/remove)
@@ -10,15 +10,19 @@ class GasCutoffActuator(BaseActuator):
         super().on_connect(client, userdata, flags, rc)
         if rc == 0:
             print("[MQTT][GasCutoff] Subscribing also to Warning topic...")
-            client.subscribe(self.warning_topic)
+            self.subscribe_warnings(client)
 
     def on_message(self, client, userdata, msg):
         try:
+            received = time.time()
             payload = json.loads(msg.payload.decode("utf-8"))
             command = payload.get("command")
+            if not self.first_time(payload):
+                return      # this incident / level was already handled (duplicate delivery)
 
             if command in ["EARTHQUAKE", "MANUAL_SHUTOFF"]:
                 self.cut_gas(command)
+                self.acted(payload, received)
             elif command == "REACTIVATE":
                 self.reconnect_gas()
             else:
@@ -3,6 +3,7 @@ import sys
 import subprocess
 import time
 import pathlib
+from utils.config_loader import ConfigLoader
 
 ROOT = pathlib.Path(__file__).parent.resolve()
 
@@ -20,16 +21,31 @@ SERVICES = [
     ("Telegram Bot",          "services.telegram_bot")
 ]
 
-def start_service(name, module):
+def start_service(name, module, *args):
     print(f"\n→ starting {name} ...")
     # Run modules with -m so imports are accurate and hassle-free
-    return subprocess.Popen([sys.executable, "-m", module], cwd=ROOT)
+    return subprocess.Popen([sys.executable, "-m", module, *args], cwd=ROOT)
+
+def services():
+    """ SERVICES, with the Controller split into a coordinator + N workers when sharding is configured. """
+    shards = ConfigLoader().controller_shards
+    if shards <= 1:
+        return list(SERVICES)
+    result = []
+    for name, module in SERVICES:
+        if module != "services.controller":
+            result.append((name, module))
+            continue
+        result.append(("Controller Coordinator", "services.controller_coordinator"))
+        for shard in range(shards):
+            result.append((f"Controller worker {shard}", module, "--shard", str(shard), "--shards", str(shards)))
+    return result
 
 def main():
     print("[runner] booting...")
     processes = []
-    for name, module in SERVICES:
-        p = start_service(name, module)
+    for name, module, *args in services():
+        p = start_service(name, module, *args)
         processes.append((name, p))
         time.sleep(2)
     time.sleep(5)
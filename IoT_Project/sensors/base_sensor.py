@@ -1,12 +1,19 @@
 # base_sensor.py
 import paho.mqtt.client as mqtt
 import threading
+import heapq
 import json
 import time
-import random
+import numpy as np
 from utils.config_loader import ConfigLoader
 from utils.device_registrar import DeviceRegistrar
+from utils.heartbeat import HeartbeatSender
 from utils.topic_fetcher import TopicFetcher
+from utils.mqtt_publisher import MqttPublisherPool
+from utils.payload_codec import get_codec, JsonCodec
+from sensors.waveform_generator import SeismicWaveformGenerator
+from sensors.edge_trigger import EdgeTrigger
+from sensors.summary_stream import SummaryAggregator
 
 '''
 Sensors publishe their reading on SenML Dataformat (Sensor Markup Language):
@@ -14,14 +21,143 @@ payload = {
 "bn": "client_id",
 "e": [{ "n": "self.DATA_KEY", "u": "Gal", "t": time.time(), "v":{"x": x, "y": y, "z": z} }]
 }
+With batching ("sensor_batch" in system_config.json) one record carries several samples,
+each entry in "e" keeps its own timestamp:
+"e": [{ "n": ..., "t": t0, "v": {...} }, { "n": ..., "t": t0 + interval, "v": {...} }, ...]
+The record is encoded with "sensor_codec" (SenML JSON or compact binary, see utils/payload_codec.py),
+and the codec is advertised in the catalog when the sensor registers.
+With "edge_trigger" enabled a quiet sensor only publishes a heartbeat (peak |x|, |y|, |z| and RMS since the last one):
+"e": [{ "n": "heartbeat", "u": "Gal", "t": t, "v": {"x": peak_x, "y": peak_y, "z": peak_z} },
+      { "n": "heartbeat_rms", "u": "Gal", "t": t, "v": {"x": rms_x, "y": rms_y, "z": rms_z} }]
+and streams at full rate (with a pre-trigger buffer) when excited, see sensors/edge_trigger.py.
+Every second each sensor also publishes min/max/mean/peak per axis on its summary topic
+(<topic>/summary, see sensors/summary_stream.py), whatever the trigger state.
 '''
 
 
+class VirtualSensor:
+    """ State of one simulated sensor driven by the SensorScheduler. """
+    __slots__ = ("client_id", "topic", "summary_topic", "slot", "building", "interval", "phase", "trigger",
+                 "entries", "batch_start", "start", "next_deadline", "samples", "missed", "jitter_sum", "jitter_max")
+
+    def __init__(self, client_id, topic, building, interval, phase, trigger=None, summary_topic=None, slot=None):
+        self.client_id = client_id
+        self.topic = topic
+        self.summary_topic = summary_topic  # decimated stream (None -> no summaries)
+        self.slot = slot                    # row in the SummaryAggregator
+        self.building = building
+        self.interval = interval
+        self.phase = phase          # per axis phase of the simulated waves
+        self.trigger = trigger      # EdgeTrigger, or None to always stream at full rate
+        self.entries = []           # samples waiting to be published in one SenML record
+        self.batch_start = None
+        self.start = None           # monotonic time of the first deadline
+        self.next_deadline = None
+        self.samples = 0
+        self.missed = 0             # deadlines skipped because the scheduler was too late
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+
+    def achieved_rate(self, now):
+        elapsed = now - self.start
+        return self.samples / elapsed if elapsed > 0 else 0.0
+
+    def mean_jitter(self):
+        return self.jitter_sum / self.samples if self.samples else 0.0
+
+
+class SensorScheduler:
+    """
+    One thread drives every virtual sensor of the process against absolute deadlines
+    (start + k * interval) kept in a min-heap, instead of one thread per sensor doing
+    time.sleep(interval) after its work. Lateness never accumulates into the sample rate,
+    and the samples are timestamped with their nominal deadline.
+    """
+    def __init__(self, on_tick, max_lateness=1.0):
+        self.on_tick = on_tick              # called with the list of (sensor, t) that are due
+        self.max_lateness = max_lateness    # if we are later than this, skip the missed deadlines
+        self.sensors = {}
+        self.heap = []
+        self.cond = threading.Condition()
+        self.thread = None
+        # wall clock <-> monotonic clock, so that "t" is a real timestamp without drift
+        self.wall_offset = time.time() - time.monotonic()
+
+    def add(self, sensor):
+        with self.cond:
+            now = time.monotonic()
+            sensor.start = now
+            sensor.next_deadline = now
+            self.sensors[sensor.client_id] = sensor
+            heapq.heappush(self.heap, (sensor.next_deadline, sensor.client_id))
+            self.cond.notify()
+
+    def remove(self, client_id):
+        # the heap entry is dropped lazily when it comes up
+        with self.cond:
+            return self.sensors.pop(client_id, None)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.heap:
+                    self.cond.wait()
+                delay = self.heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self.cond.wait(delay)   # woken up earlier if a sensor is added
+                    continue
+
+                # collect every sensor whose deadline has passed, and schedule its next one
+                now = time.monotonic()
+                due = []
+                while self.heap and self.heap[0][0] <= now:
+                    deadline, client_id = heapq.heappop(self.heap)
+                    sensor = self.sensors.get(client_id)
+                    if sensor is None or sensor.next_deadline != deadline:
+                        continue    # removed sensor
+                    lateness = now - deadline
+                    if lateness > self.max_lateness:
+                        skipped = int(lateness / sensor.interval)
+                        sensor.missed += skipped
+                        deadline += skipped * sensor.interval
+                        lateness = now - deadline
+                    sensor.samples += 1
+                    sensor.jitter_sum += lateness
+                    sensor.jitter_max = max(sensor.jitter_max, lateness)
+                    sensor.next_deadline = deadline + sensor.interval
+                    heapq.heappush(self.heap, (sensor.next_deadline, client_id))
+                    due.append((sensor, deadline + self.wall_offset))
+
+            try:
+                self.on_tick(due)
+            except Exception as e:
+                print(f"[ERROR][baseSensor] Scheduler tick failed: {e}")
+
+    def stats(self):
+        """ Achieved rate (Hz) and jitter (s) of every sensor. """
+        now = time.monotonic()
+        with self.cond:
+            return {
+                client_id: {
+                    "rate": round(s.achieved_rate(now), 2),
+                    "jitter_mean": round(s.mean_jitter(), 6),
+                    "jitter_max": round(s.jitter_max, 6),
+                    "missed": s.missed
+                }
+                for client_id, s in self.sensors.items()
+            }
+
+
 class BaseSensor:
     SENSOR_TYPE = "BaseSensor"  # overridden in child class
     DATA_KEY = "data"           # key in mqtt message, for accelerometer: "acceleration", velocity: "velocity"
     UNIT = "unit"               # overridden in child class
-    DATA_RANGE = ((0,1),(0,1),(0,1)) # x, y, z range
+    DATA_RANGE = ((0,1),(0,1),(0,1)) # x, y, z range of the background noise
+    PEAK_SCALE = 1.0                 # scale of the simulated earthquake peak for this kind of sensor
 
     def __init__(self):
         self.sensors = {}
@@ -32,6 +168,33 @@ class BaseSensor:
         self.mqtt_host = cfg.mqtt_host
         self.mqtt_port = cfg.mqtt_port
         self.sensor_interval = float(cfg.sensor_interval)
+        self.batch_size = max(1, int(cfg.sensor_batch_size))      # samples per SenML record
+        self.batch_window = float(cfg.sensor_batch_window)         # or max seconds per SenML record
+        self.mqtt_connections = cfg.sensor_mqtt_connections
+        self.codec = get_codec(cfg.sensor_codec)
+        self.stats_interval = cfg.sensor_stats_interval
+        self.liveness_config = cfg.liveness_config
+        self.registrations = {}     # client_id -> registration, to register again if evicted (utils/heartbeat.py)
+        self.publisher = None       # shared connections, opened in run()
+
+        # A single scheduler thread drives all the sensors of this process
+        self.scheduler = SensorScheduler(self.on_tick)
+
+        # Simulated signal: noise + earthquake scenarios (seeded -> repeatable)
+        self.generator = SeismicWaveformGenerator(self.DATA_RANGE, self.PEAK_SCALE, seed=cfg.simulation_seed)
+        self.scenarios = cfg.simulation_quakes
+
+        # Edge trigger: the gate is a fraction of the Warning threshold of this kind of sensor
+        self.trigger_config = dict(cfg.edge_trigger)
+        warning = cfg.thresholds_config.get(self.DATA_KEY.capitalize(), {}).get("Warning")
+        gate = self.trigger_config.pop("gate", 0.5)
+        self.trigger_gate = gate * warning if warning is not None else float("inf")
+        self.trigger_enabled = self.trigger_config.pop("enabled", False)
+
+        # per second min/max/mean/peak of every sensor, for storage and dashboards
+        self.summaries = SummaryAggregator(cfg.summary_period)
+        self.summary_lock = threading.Lock()    # adjust messages and the scheduler thread both use it
+        self.summary_codec = JsonCodec()
 
         # Fetch Adjust topic
         fetcher = TopicFetcher(self.catalog_url)
@@ -45,6 +208,36 @@ class BaseSensor:
         else:
             print(f"[MQTT][baseSensor] Connection failed with code {rc}")
 
+    def start_sensor(self, answer, building, payload=None):
+        """ answer: registration answer of the catalog (client_id, topic, summary_topic), payload: registration """
+        client_id, topic = answer["client_id"], answer["topic"]
+        if payload is not None:
+            self.registrations[client_id] = dict(payload, client_id=client_id)
+        trigger = None
+        if self.trigger_enabled:
+            trigger = EdgeTrigger(self.sensor_interval, self.trigger_gate, **self.trigger_config)
+        summary_topic = answer.get("summary_topic")
+        with self.summary_lock:
+            slot = self.summaries.add_slot() if summary_topic else None
+        sensor = VirtualSensor(client_id, topic, building, self.sensor_interval,
+                               self.generator.new_phase(), trigger, summary_topic, slot)
+        self.sensors[client_id] = sensor
+        self.scheduler.add(sensor)
+        print(f"[INFO][baseSensor] {self.SENSOR_TYPE}|{client_id} started for building {building}")
+
+    def stop_sensor(self, device_id):
+        if device_id in self.sensors:
+            print(f"[INFO][baseSensor] Stopping sensor: {device_id}")
+            self.scheduler.remove(device_id)    # no more deadlines for this sensor
+            if self.sensors[device_id].slot is not None:
+                with self.summary_lock:
+                    self.summaries.release(self.sensors[device_id].slot)
+            del self.sensors[device_id] #And Goodby sensor_id! :)
+            self.registrations.pop(device_id, None)
+            print(f"[INFO][baseSensor] {self.SENSOR_TYPE} {device_id} stopped.")
+        else:
+            print(f"[INFO][baseSensor] Sensor with device_id {device_id} not found.")
+
     def on_message(self, client, userdata, msg):
         try:
             data = json.loads(msg.payload.decode("utf-8"))
@@ -55,69 +248,138 @@ class BaseSensor:
                 location = data.get("location", {})
                 latitude = location.get("latitude")
                 longitude = location.get("longitude")
+                count = data.get("count", 1)    # N sensors of the building with one message
 
                 registrar = DeviceRegistrar(self.catalog_url)
-                client_id, topic = registrar.register(
-                    {"type": self.SENSOR_TYPE, "building": building,
-                     "location": {"latitude": latitude, "longitude": longitude}}
-                )
+                payload = {"type": self.SENSOR_TYPE, "building": building,
+                           "location": {"latitude": latitude, "longitude": longitude},
+                           "codec": self.codec.name}
+                if count == 1:
+                    client_id, topic = registrar.register(payload)
+                    answers = [registrar.info]
+                else:
+                    answers = registrar.register_many([payload] * count)   # one request, one transaction
 
-                running = {"flag": True} #is used for the time that the operator orders to stop that sensor!
                 '''
                 we need to use multiple sensors at the same time.
-                so this code should read some lines not in its' usual order!
-                We esued threating to run some parts of the code in a simultaniously!
+                Instead of one thread per sensor, the scheduler calls on_tick for all the
+                sensors whose next sample is due (the representative of that sensor in our code!)
                 '''
-                t = threading.Thread(               # the representative of that sensor in our code!
-                    target=self.run_single_sensor,
-                    args=(client_id, topic, running, self.sensor_interval)
-                )
-                t.daemon = True
-                self.sensors[client_id] = {"thread": t, "running": running}
-                t.start()
-                print(f"[INFO][baseSensor] {self.SENSOR_TYPE}|{client_id} started for building {building}")
+                for answer in answers:
+                    self.start_sensor(answer, building, payload)
 
             elif action == "remove" and data.get("type") == self.SENSOR_TYPE:
-                device_id = data.get("device_id")
-                if device_id in self.sensors:
-                    print(f"[INFO][baseSensor] Stopping sensor: {device_id}")
-                    self.sensors[device_id]["running"]["flag"] = False  # This will cause the while running["flag"]: inside run_single_sensor to become false and exit the sensor loop.
-                    self.sensors[device_id]["thread"].join()       # The main program says: "I'll wait until that thread actually terminates and all its resources are freed." :)
-                    del self.sensors[device_id] #And Goodby sensor_id! :)
-                else:
-                    print(f"[INFO][baseSensor] Sensor with device_id {device_id} not found.")
+                device_ids = data.get("device_ids") or [data.get("device_id")]
+                for device_id in device_ids:
+                    self.stop_sensor(device_id)
+
+            elif action == "simulate_quake":
+                '''payload =
+                {"action": "simulate_quake", "building": "Building_A", "magnitude": 6.0, "distance_km": 30}'''
+                onset = data.get("onset", time.time())
+                self.generator.add_quake(data["building"], data["magnitude"], data["distance_km"], onset)
 
         except Exception as e:
             print(f"[ERROR][baseSensor] Failed to process Adjust message: {e}")
 
-    # Run a single sensor
-    def run_single_sensor(self, client_id, topic, running, interval):
-        mqtt_client = mqtt.Client(client_id)
-        mqtt_client.connect(self.mqtt_host, self.mqtt_port)
-        mqtt_client.loop_start()
+    # Called by the scheduler with every sensor that has a sample due at time t
+    def on_tick(self, due):
+        if not due:
+            return
+        # one vectorized call for all the due sensors -> (n, 3) array of x, y, z
+        values = self.generator.generate([sensor.building for sensor, t in due],
+                                         [t for sensor, t in due],
+                                         np.array([sensor.phase for sensor, t in due]))
+        values = values.round(3)
+        self.publish_summaries(due, values)
 
-        try:
-            while running["flag"]:
-                x = round(random.uniform(*self.DATA_RANGE[0]), 3) #ex. random.uniform(0,1,3) -> 0.342
-                y = round(random.uniform(*self.DATA_RANGE[1]), 3)
-                z = round(random.uniform(*self.DATA_RANGE[2]), 3)
-                reading = {
-                "bn": client_id,
-                "e": [
-                { "n": self.DATA_KEY, "u": self.UNIT, "t": time.time(), "v":{"x": x, "y": y, "z": z} }
-                ]
-                }
-                mqtt_client.publish(topic, json.dumps(reading), qos=0)
-                time.sleep(interval)
-        finally:    #A command that should always be executed, whether the program ends normally or not.
-            mqtt_client.loop_stop()
-            mqtt_client.disconnect()
-            print(f"[INFO][baseSensor] {self.SENSOR_TYPE} {client_id} stopped.")
+        for (sensor, t), (x, y, z) in zip(due, values.tolist()):
+            trigger = sensor.trigger
+            if trigger is None:
+                self.add_sample(sensor, t, x, y, z)
+                continue
+
+            was_triggered = trigger.triggered
+            # quiet -> nothing, just triggered -> pre-trigger buffer + sample, triggered -> sample
+            for sample in trigger.update(t, x, y, z):
+                self.add_sample(sensor, *sample)
+            if was_triggered and not trigger.triggered:
+                self.flush(sensor)      # back to quiet, do not keep the last samples waiting
+            heartbeat = trigger.take_heartbeat(t)
+            if heartbeat is not None:
+                peaks, rms = heartbeat
+                reading = {"bn": sensor.client_id, "e": [{"n": "heartbeat", "u": self.UNIT, "t": t, "v": peaks},
+                                                         {"n": "heartbeat_rms", "u": self.UNIT, "t": t, "v": rms}]}
+                self.publisher.publish(sensor.client_id, sensor.topic, self.codec.encode(reading), qos=0)
+
+    def add_sample(self, sensor, t, x, y, z):
+        if sensor.batch_start is None:
+            sensor.batch_start = t
+        sensor.entries.append({ "n": self.DATA_KEY, "u": self.UNIT, "t": t, "v":{"x": x, "y": y, "z": z} })
+
+        # publish when the batch is full or the time window is over
+        if len(sensor.entries) >= self.batch_size or t - sensor.batch_start >= self.batch_window > 0:
+            self.flush(sensor)
+
+    def publish_summaries(self, due, values):
+        rows = [i for i, (sensor, t) in enumerate(due) if sensor.slot is not None]
+        if not rows:
+            return
+        with self.summary_lock:
+            finished = self.summaries.update([due[i][0].slot for i in rows], [due[i][1] for i in rows], values[rows])
+        if not finished:
+            return
+        by_slot = {due[i][0].slot: due[i][0] for i in rows}
+        for slot, summary in finished:
+            sensor = by_slot[slot]
+            entry = {"n": f"{self.DATA_KEY}_summary", "u": self.UNIT}
+            entry.update(summary)
+            reading = {"bn": sensor.client_id, "e": [entry]}
+            self.publisher.publish(sensor.client_id, sensor.summary_topic, self.summary_codec.encode(reading), qos=0)
+
+    def flush(self, sensor):
+        if not sensor.entries:
+            return
+        reading = {"bn": sensor.client_id, "e": sensor.entries}
+        # All the sensors of this process publish through the shared pool of connections
+        self.publisher.publish(sensor.client_id, sensor.topic, self.codec.encode(reading), qos=0)
+        sensor.entries = []
+        sensor.batch_start = None
+
+    # Periodic report of the achieved sample rate and jitter of each sensor
+    def report_stats(self):
+        while True:
+            time.sleep(self.stats_interval)
+            stats = self.scheduler.stats()
+            if not stats:
+                continue
+            rates = [s["rate"] for s in stats.values()]
+            print(f"[STATS][baseSensor] {len(stats)} {self.SENSOR_TYPE}s | target {1 / self.sensor_interval:.0f} Hz | "
+                  f"rate min {min(rates)} Hz, mean {sum(rates) / len(rates):.2f} Hz")
+            # the sensors with the worst jitter (all of them are in self.scheduler.stats())
+            worst = sorted(stats.items(), key=lambda item: item[1]["jitter_max"], reverse=True)[:5]
+            for client_id, s in worst:
+                print(f"[STATS][baseSensor] {client_id} rate: {s['rate']} Hz "
+                      f"jitter mean: {s['jitter_mean'] * 1000:.2f} ms max: {s['jitter_max'] * 1000:.2f} ms missed: {s['missed']}")
 
     # Main run loop
     def run(self):
+        self.publisher = MqttPublisherPool(self.mqtt_host, self.mqtt_port,
+                                           name=self.SENSOR_TYPE, size=self.mqtt_connections)
+        self.scheduler.start()
+        # earthquake scenarios from system_config.json, relative to the start of this process
+        for quake in self.scenarios:
+            self.generator.add_quake(quake["building"], quake["magnitude"], quake["distance_km"],
+                                     time.time() + quake.get("start_after", 0))
+        if self.stats_interval:
+            threading.Thread(target=self.report_stats, daemon=True).start()
+        # one batched heartbeat for all the sensors of this process
+        if self.liveness_config.get("enabled", False):
+            HeartbeatSender(self.catalog_url, self.liveness_config.get("interval", 10),
+                            lambda: list(self.sensors), self.registrations.get, name=self.SENSOR_TYPE).start()
+
         self.mqtt_client = mqtt.Client(client_id=f"{self.SENSOR_TYPE}/AdjustListener")
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
         self.mqtt_client.connect(self.mqtt_host, self.mqtt_port)
-        self.mqtt_client.loop_forever()
\ No newline at end of file
+        self.mqtt_client.loop_forever()
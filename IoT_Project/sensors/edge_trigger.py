@@ -0,0 +1,114 @@
+# edge_trigger.py
+from collections import deque
+
+'''
+On-sensor trigger: a sensor streams at full rate only while something is happening.
+- quiet    : samples go into a pre-trigger buffer, and only a heartbeat with the peak |x|, |y|, |z|
+             and the RMS of x, y, z since the previous heartbeat is published every "heartbeat" seconds
+             (the RMS is the background level of the controller's STA/LTA while the sensor is quiet)
+- triggered: the pre-trigger buffer is published first, then every sample (full rate)
+Trigger when:
+- "amplitude": any |axis| >= gate (gate = fraction of the Warning threshold of the sensor), both polarities
+- "sta_lta"  : the amplitude gate, or STA/LTA of the signal energy >= "on"
+Detrigger when the trigger condition (STA/LTA <= "off" for sta_lta) is false for "hold" seconds.
+STA/LTA are exponential moving averages of the squared deviation from the long term mean: O(1) per sample.
+'''
+
+
+class EdgeTrigger:
+    __slots__ = ("mode", "gate", "on", "off", "hold", "heartbeat_interval",
+                 "sta_alpha", "lta_alpha", "mean", "sta", "lta", "warmup",
+                 "triggered", "quiet_since", "pre_buffer", "peak", "squares", "count", "last_heartbeat")
+
+    def __init__(self, interval, gate, mode="sta_lta", sta=0.5, lta=10.0, on=3.0, off=1.5,
+                 hold=2.0, pre_trigger=1.0, heartbeat=1.0):
+        self.mode = mode
+        self.gate = gate
+        self.on = on
+        self.off = off
+        self.hold = hold
+        self.heartbeat_interval = heartbeat
+        self.sta_alpha = min(1.0, interval / sta)
+        self.lta_alpha = min(1.0, interval / lta)
+        self.mean = None                # long term mean of x, y, z (the sensor offset)
+        self.sta = 0.0
+        self.lta = 0.0
+        self.warmup = int(lta / interval)   # samples before STA/LTA is trusted
+        self.triggered = False
+        self.quiet_since = None
+        self.pre_buffer = deque(maxlen=max(1, int(pre_trigger / interval)))
+        self.peak = [0.0, 0.0, 0.0]
+        self.squares = [0.0, 0.0, 0.0]
+        self.count = 0
+        self.last_heartbeat = None
+
+    def update(self, t, x, y, z):
+        """ Feed one sample, returns the samples that have to be published now (maybe none). """
+        if self.mean is None:
+            self.mean = [x, y, z]
+        mean = self.mean
+        energy = (x - mean[0]) ** 2 + (y - mean[1]) ** 2 + (z - mean[2]) ** 2
+        self.sta += self.sta_alpha * (energy - self.sta)
+        self.lta += self.lta_alpha * (energy - self.lta)
+        if not self.triggered:
+            # the offset and the LTA follow the background only while quiet
+            a = self.lta_alpha
+            mean[0] += a * (x - mean[0])
+            mean[1] += a * (y - mean[1])
+            mean[2] += a * (z - mean[2])
+        if self.warmup > 0:
+            self.warmup -= 1
+
+        gate = self.gate
+        excited = abs(x) >= gate or abs(y) >= gate or abs(z) >= gate
+        if self.mode == "sta_lta" and self.warmup == 0 and self.lta > 0:
+            ratio = self.sta / self.lta
+            excited = excited or ratio >= self.on or (self.triggered and ratio > self.off)
+
+        if self.triggered:
+            if excited:
+                self.quiet_since = None
+            elif self.quiet_since is None:
+                self.quiet_since = t
+            elif t - self.quiet_since >= self.hold:
+                self.triggered = False      # back to heartbeats after this sample
+                self.last_heartbeat = t
+            return [(t, x, y, z)]
+
+        if excited:
+            self.triggered = True
+            self.quiet_since = None
+            samples = list(self.pre_buffer)
+            samples.append((t, x, y, z))
+            self.pre_buffer.clear()
+            return samples
+
+        self.pre_buffer.append((t, x, y, z))
+        peak = self.peak
+        peak[0] = max(peak[0], abs(x))
+        peak[1] = max(peak[1], abs(y))
+        peak[2] = max(peak[2], abs(z))
+        squares = self.squares
+        squares[0] += x * x
+        squares[1] += y * y
+        squares[2] += z * z
+        self.count += 1
+        return []
+
+    def take_heartbeat(self, t):
+        """ (peak |x|, |y|, |z|, RMS x, y, z) since the last heartbeat when one is due (only while quiet),
+        otherwise None. """
+        if self.triggered:
+            return None
+        if self.last_heartbeat is None:
+            self.last_heartbeat = t
+        if t - self.last_heartbeat < self.heartbeat_interval:
+            return None
+        self.last_heartbeat = t
+        values = {"x": round(self.peak[0], 3), "y": round(self.peak[1], 3), "z": round(self.peak[2], 3)}
+        n = max(1, self.count)
+        rms = {axis: round((s / n) ** 0.5, 3) for axis, s in zip("xyz", self.squares)}
+        self.peak = [0.0, 0.0, 0.0]
+        self.squares = [0.0, 0.0, 0.0]
+        self.count = 0
+        return values, rms
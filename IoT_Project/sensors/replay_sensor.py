@@ -0,0 +1,190 @@
+# replay_sensor.py
+import paho.mqtt.client as mqtt
+import argparse
+import csv
+import json
+import os
+import time
+import requests
+from utils.config_loader import ConfigLoader
+from utils.device_registrar import DeviceRegistrar
+from utils.heartbeat import HeartbeatSender
+from utils.payload_codec import get_codec
+
+'''
+Replays recorded sensor data through the live pipeline (same topics, same SenML records as BaseSensor).
+Input files:
+- data/<sensor_id>.json or data/<sensor_id>.csv written by SensorStorage
+- an external recorded event: JSON list of SenML records [{"bn": ..., "e": [...]}, ...]
+  or a CSV file with the columns t (or timestamp), x, y, z and optionally unit
+Usage:
+    python -m sensors.replay_sensor data/Acc_xxx.json                 # 1x, on the topic of Acc_xxx
+    python -m sensors.replay_sensor event.csv --speed 10 --type Accelerometer_Sensor --building Building_A
+    python -m sensors.replay_sensor event.json --speed max
+The original inter-sample timing is kept: samples are sent at (t - t0) / speed after the start,
+and their "t" is the send time start + (t - t0) / speed (use --keep-timestamps to send the original "t";
+with --speed max the original spacing is kept after the start).
+Records are cut like BaseSensor does: "batch_size" samples or "batch_window" seconds, so a slow recording
+is not held back waiting for a full batch.
+'''
+
+UNIT_TO_TYPE = {"Gal": "Accelerometer_Sensor", "m/s": "Velocity_Sensor"}
+TYPE_TO_NAME = {"Accelerometer_Sensor": ("acceleration", "Gal"), "Velocity_Sensor": ("velocity", "m/s")}
+
+
+def load_samples(path):
+    """ Returns (sensor_id or None, unit or None, [(t, x, y, z), ...]) sorted by time. """
+    sensor_id, unit, samples = None, None, []
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                t = row.get("timestamp", row.get("t"))
+                samples.append((float(t), float(row["x"]), float(row["y"]), float(row["z"])))
+                unit = row.get("unit") or unit
+                sensor_id = row.get("name") or sensor_id
+    else:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = [data]
+        for item in data:
+            if "e" in item:                     # SenML record (maybe batched)
+                sensor_id = item.get("bn") or sensor_id
+                for e in item["e"]:
+                    v = e["v"]
+                    samples.append((e["t"], v.get("x", 0.0), v.get("y", 0.0), v.get("z", 0.0)))
+                    unit = e.get("u") or unit
+            else:                               # reading stored by SensorStorage
+                samples.append((item["t"], item.get("x", 0.0), item.get("y", 0.0), item.get("z", 0.0)))
+                unit = item.get("u") or unit
+                sensor_id = item.get("n") or sensor_id
+    samples.sort(key=lambda s: s[0])
+    return sensor_id, unit, samples
+
+
+class ReplaySensor:
+    def __init__(self, args):
+        cfg = ConfigLoader()
+        self.catalog_url = cfg.catalog_url
+        self.mqtt_host = cfg.mqtt_host
+        self.mqtt_port = cfg.mqtt_port
+        self.batch_size = max(1, int(cfg.sensor_batch_size))
+        self.batch_window = float(cfg.sensor_batch_window)
+        self.codec = get_codec(cfg.sensor_codec)
+        self.liveness_config = cfg.liveness_config
+
+        self.speed = None if args.speed == "max" else float(args.speed)
+        self.keep_timestamps = args.keep_timestamps
+        self.loops = args.loop
+
+        recorded_id, unit, self.samples = load_samples(args.file)
+        if not self.samples:
+            raise SystemExit(f"[ERROR][replay] No samples found in {args.file}")
+        if recorded_id is None:
+            recorded_id = os.path.splitext(os.path.basename(args.file))[0]
+
+        self.sensor_type = args.type or UNIT_TO_TYPE.get(unit, "Accelerometer_Sensor")
+        self.data_key, self.unit = TYPE_TO_NAME[self.sensor_type]
+        self.client_id, self.topic = self.resolve_device(recorded_id, args.building)
+
+    def resolve_device(self, recorded_id, building):
+        """ Replay on the topic of the recorded sensor if it is still in the catalog, otherwise register one. """
+        if building is None:
+            try:
+                # smallest client_id with this prefix: the recorded sensor itself when it exists
+                response = requests.get(f"{self.catalog_url}/get_devices", params={"prefix": recorded_id, "limit": 1})
+                response.raise_for_status()
+                info = response.json().get(recorded_id)
+                if info is not None:
+                    print(f"[INFO][replay] Replaying on the topic of {recorded_id}: {info['topic']}")
+                    self.registration = {"type": info.get("type", self.sensor_type), "building": info.get("building"),
+                                         "location": info.get("location", {}), "codec": self.codec.name,
+                                         "client_id": recorded_id}
+                    return recorded_id, info["topic"]
+            except Exception as e:
+                print(f"[WARN][replay] Could not fetch devices: {e}")
+
+        registrar = DeviceRegistrar(self.catalog_url)
+        self.registration = {
+            "type": self.sensor_type,
+            "building": building or "Virtual_Unit",
+            "location": {"latitude": "replay", "longitude": "replay"},
+            "codec": self.codec.name
+        }
+        client_id, topic = registrar.register(self.registration)
+        self.registration["client_id"] = client_id
+        return client_id, topic
+
+    def run(self):
+        client = mqtt.Client(f"{self.client_id}/replay")
+        client.connect(self.mqtt_host, self.mqtt_port)
+        client.loop_start()
+        # the replayed sensor stays alive in the catalog while it is replayed
+        heartbeat = None
+        if self.liveness_config.get("enabled", False):
+            heartbeat = HeartbeatSender(self.catalog_url, self.liveness_config.get("interval", 10),
+                                        lambda: [self.client_id], lambda client_id: self.registration,
+                                        name="replay")
+            heartbeat.start()
+
+        try:
+            for _ in range(self.loops):
+                self.replay_once(client)
+        except KeyboardInterrupt:
+            print("[INFO][replay] Stopped.")
+        finally:
+            if heartbeat is not None:
+                heartbeat.stop()
+            client.loop_stop()
+            client.disconnect()
+
+    def replay_once(self, client):
+        t0 = self.samples[0][0]
+        start = time.time()
+        entries = []
+        batch_start = None      # replay time of the first sample of the pending record
+        records = 0
+
+        def flush():
+            nonlocal entries, records
+            client.publish(self.topic, self.codec.encode({"bn": self.client_id, "e": entries}), qos=0)
+            records += 1
+            entries = []
+
+        for t, x, y, z in self.samples:
+            # replay time of this sample: the (scaled) original time after the start
+            at = start + (t - t0) / self.speed if self.speed else start + (t - t0)
+            # the batch window ends before this sample: the pending record does not wait for it
+            if entries and at - batch_start >= self.batch_window > 0:
+                flush()
+            if self.speed:
+                delay = at - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            if not entries:
+                batch_start = at
+            ts = t if self.keep_timestamps else at
+            entries.append({"n": self.data_key, "u": self.unit, "t": ts, "v": {"x": x, "y": y, "z": z}})
+            if len(entries) >= self.batch_size:
+                flush()
+
+        if entries:
+            flush()
+
+        elapsed = time.time() - start
+        print(f"[INFO][replay] {len(self.samples)} samples in {records} records, "
+              f"{self.samples[-1][0] - t0:.2f} s recorded replayed in {elapsed:.2f} s "
+              f"({len(self.samples) / elapsed if elapsed > 0 else float('inf'):.0f} samples/s) → {self.topic}")
+
+
+# ------------------- Main -------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded sensor data on the MQTT sensor topics.")
+    parser.add_argument("file", help="data/<sensor_id>.json|.csv or a recorded event file")
+    parser.add_argument("--speed", default="1", help="1 (real time), N (N times faster) or max")
+    parser.add_argument("--type", choices=list(TYPE_TO_NAME), help="sensor type (default: from the unit)")
+    parser.add_argument("--building", help="register a new replay sensor in this building")
+    parser.add_argument("--keep-timestamps", action="store_true", help="send the original \"t\" values")
+    parser.add_argument("--loop", type=int, default=1, help="how many times the file is replayed")
+    replay = ReplaySensor(parser.parse_args())
+    replay.run()
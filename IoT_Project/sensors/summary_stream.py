@@ -0,0 +1,125 @@
+# summary_stream.py
+import numpy as np
+
+'''
+Decimated summary stream: per sensor and per period (1 s) min / max / mean / peak (max |v|) of each axis.
+Published next to the raw topic, on <raw topic>/summary:
+payload = {
+"bn": "client_id",
+"e": [{ "n": "acceleration_summary", "u": "Gal", "t": start of the second, "dt": 1.0, "cnt": samples,
+        "v": {"x": {"min": .., "max": .., "mean": .., "peak": ..}, "y": {...}, "z": {...}} }]
+}
+Storage and dashboards use this stream, only the Controller takes the raw one.
+The accumulators are NumPy arrays indexed by a slot per sensor, updated for all the due sensors at once.
+A late scheduler tick may carry several samples of the same sensor (catch-up): they are accumulated with
+the unbuffered ufunc.at, and split into passes when they cross the end of a period.
+'''
+
+AXES = ("x", "y", "z")
+
+
+class SummaryAggregator:
+    def __init__(self, period=1.0, capacity=64):
+        self.period = period
+        self.free = []
+        self.size = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = self.size
+        mins, maxs, sums, peaks = (np.empty((capacity, 3)) for _ in range(4))
+        counts, window = np.zeros(capacity, dtype=np.int64), np.full(capacity, np.nan)
+        if old:
+            mins[:old], maxs[:old], sums[:old], peaks[:old] = self.mins, self.maxs, self.sums, self.peaks
+            counts[:old], window[:old] = self.counts, self.window
+        self.mins, self.maxs, self.sums, self.peaks = mins, maxs, sums, peaks
+        self.counts, self.window = counts, window
+        self._reset(np.arange(old, capacity))
+
+    def _reset(self, rows):
+        self.mins[rows] = np.inf
+        self.maxs[rows] = -np.inf
+        self.sums[rows] = 0.0
+        self.peaks[rows] = 0.0
+        self.counts[rows] = 0
+
+    def add_slot(self):
+        """ A row of accumulators for a new sensor. """
+        if self.free:
+            return self.free.pop()
+        if self.size == len(self.counts):
+            self._allocate(2 * len(self.counts))
+        self.size += 1
+        return self.size - 1
+
+    def release(self, slot):
+        self._reset([slot])
+        self.window[slot] = np.nan
+        self.free.append(slot)
+
+    def update(self, slots, times, values):
+        """
+        slots (n,), times (n,), values (n, 3) -> [(slot, summary entry)] of the periods that just ended.
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        window = np.floor(times / self.period) * self.period
+        if len(slots) > 1:
+            order = np.lexsort((times, slots))
+            sorted_slots = slots[order]
+            repeated = sorted_slots[1:] == sorted_slots[:-1]
+            if repeated.any():
+                return self._update_repeated(slots[order], window[order], values[order], repeated)
+        return self._update(slots, window, values)
+
+    def _update_repeated(self, slots, window, values, repeated):
+        """ Rows sorted by (slot, time), some slots more than once. """
+        # k-th period of a slot in this call -> pass k (one period per slot and pass)
+        first = np.concatenate(([True], ~repeated))
+        new_period = np.concatenate(([True], ~repeated | (window[1:] != window[:-1])))
+        period = np.cumsum(new_period)
+        passes = period - np.maximum.accumulate(np.where(first, period, 0))
+        finished = []
+        for k in range(int(passes.max()) + 1):
+            rows = passes == k
+            finished += self._update(slots[rows], window[rows], values[rows], repeated=True)
+        return finished
+
+    def _update(self, slots, window, values, repeated=False):
+        current = self.window[slots]
+
+        finished = []
+        ended = ~np.isnan(current) & (current != window)
+        if ended.any():
+            for slot in np.unique(slots[ended]):
+                finished.append((int(slot), self.summary(slot)))
+            self._reset(slots[ended])
+        self.window[slots] = window
+
+        if repeated:
+            np.minimum.at(self.mins, slots, values)
+            np.maximum.at(self.maxs, slots, values)
+            np.add.at(self.sums, slots, values)
+            np.maximum.at(self.peaks, slots, np.abs(values))
+            np.add.at(self.counts, slots, 1)
+            return finished
+        self.mins[slots] = np.minimum(self.mins[slots], values)
+        self.maxs[slots] = np.maximum(self.maxs[slots], values)
+        self.sums[slots] += values
+        self.peaks[slots] = np.maximum(self.peaks[slots], np.abs(values))
+        self.counts[slots] += 1
+        return finished
+
+    def summary(self, slot):
+        count = int(self.counts[slot])
+        mins, maxs, means, peaks = (self.mins[slot].tolist(), self.maxs[slot].tolist(),
+                                    (self.sums[slot] / max(count, 1)).tolist(), self.peaks[slot].tolist())
+        return {
+            "t": float(self.window[slot]),
+            "dt": self.period,
+            "cnt": count,
+            "v": {axis: {"min": round(mins[i], 3), "max": round(maxs[i], 3),
+                         "mean": round(means[i], 3), "peak": round(peaks[i], 3)}
+                  for i, axis in enumerate(AXES)}
+        }
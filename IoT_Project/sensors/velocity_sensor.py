@@ -6,6 +6,7 @@ class VelocitySensor(BaseSensor):
     DATA_KEY = "velocity"
     UNIT = "m/s"
     DATA_RANGE = ((0.0,5.0),(0.0,5.0),(0.0,5.0))
+    PEAK_SCALE = 0.5
 
 # ------------------- Main -------------------
 if __name__ == "__main__":
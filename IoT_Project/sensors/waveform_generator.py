@@ -0,0 +1,115 @@
+# waveform_generator.py
+import threading
+import numpy as np
+
+'''
+Synthetic seismic signal for the simulated sensors (NumPy, vectorized over all the sensors of a process).
+signal = background noise (uniform in DATA_RANGE, like before)
+       + P-wave: arrives at distance / VP, small, high frequency, mostly vertical (z)
+       + S-wave: arrives at distance / VS, strong, low frequency, mostly horizontal (x, y)
+Each wave has an envelope env(tau) = (tau / rise) * exp(1 - tau / rise), which is 1 at tau = rise.
+Peak amplitude from magnitude and distance (simple attenuation law, in Gal):
+log10(peak) = 0.5 * M - log10(R + 10) + 0.4      ex. M6 at 30 km -> ~63 Gal, M4 at 30 km -> ~6 Gal
+Quakes and sensors are added by the MQTT thread while the scheduler thread generates: the quakes and the
+random generator are only touched under "lock", generate() works on a snapshot of the quakes.
+'''
+
+VP = 6.0            # km/s
+VS = 3.5            # km/s
+P_FREQ = 4.0        # Hz
+S_FREQ = 1.0        # Hz
+P_RATIO = 0.3       # P-wave amplitude compared to the S-wave
+P_AXES = np.array([0.3, 0.3, 1.0])
+S_AXES = np.array([1.0, 0.8, 0.4])
+
+
+class Quake:
+    """ A scenario: one earthquake hitting one building. """
+    def __init__(self, building, magnitude, distance_km, onset):
+        self.building = building
+        self.magnitude = float(magnitude)
+        self.distance_km = float(distance_km)
+        self.onset = float(onset)       # origin time (epoch seconds)
+        self.peak = 10 ** (0.5 * self.magnitude - np.log10(self.distance_km + 10) + 0.4)
+        self.p_arrival = self.distance_km / VP
+        self.s_arrival = self.distance_km / VS
+        self.p_rise = 0.5
+        self.s_rise = 0.5 * 10 ** (0.25 * (self.magnitude - 4))
+        # after this many seconds the shaking is negligible
+        self.duration = self.s_arrival + 12 * self.s_rise
+
+    def as_dict(self):
+        return {"building": self.building, "magnitude": self.magnitude,
+                "distance_km": self.distance_km, "onset": self.onset}
+
+
+class SeismicWaveformGenerator:
+    def __init__(self, data_range, peak_scale=1.0, seed=None):
+        self.low = np.array([r[0] for r in data_range], dtype=float)
+        self.high = np.array([r[1] for r in data_range], dtype=float)
+        self.peak_scale = peak_scale    # ex. velocity sensors see a smaller number than Gal
+        self.rng = np.random.default_rng(seed)     # seeded -> repeatable scenarios
+        self.quakes = {}                # building -> Quake
+        self.lock = threading.Lock()
+
+    def new_phase(self):
+        """ Random phase per axis for a new sensor, so that sensors are not identical. """
+        with self.lock:
+            return self.rng.uniform(0, 2 * np.pi, 3)
+
+    def add_quake(self, building, magnitude, distance_km, onset):
+        quake = Quake(building, magnitude, distance_km, onset)
+        with self.lock:
+            self.quakes[building] = quake
+        print(f"[SIMULATION][waveform] M{quake.magnitude} at {quake.distance_km} km for {building} "
+              f"(peak ~{quake.peak * self.peak_scale:.1f})")
+        return quake
+
+    def generate(self, buildings, times, phases):
+        """
+        buildings: building of each sensor (n,)
+        times: sample times (n,) or a block of samples per sensor (n, k)
+        phases: (n, 3) from new_phase()
+        Returns the x, y, z values, shape times.shape + (3,)
+        """
+        times = np.asarray(times, dtype=float)
+        latest = times.max() if times.size else 0.0
+        with self.lock:
+            values = self.rng.uniform(self.low, self.high, size=times.shape + (3,))
+            # drop finished quakes, the rest of the tick uses this snapshot
+            for building in [b for b, q in self.quakes.items() if latest - q.onset > q.duration]:
+                del self.quakes[building]
+            quakes = dict(self.quakes)
+        if not quakes:
+            return values
+
+        # per sensor quake parameters (NaN onset -> no quake in that building)
+        n = times.shape[0]
+        params = np.full((n, 6), np.nan)
+        for i, building in enumerate(buildings):
+            q = quakes.get(building)
+            if q is not None:
+                params[i] = (q.onset, q.peak, q.p_arrival, q.s_arrival, q.p_rise, q.s_rise)
+        active = ~np.isnan(params[:, 0])
+        if not active.any():
+            return values
+
+        # broadcast (n,) parameters over the block dimension
+        extra = (1,) * (times.ndim - 1)
+        onset, peak, p_arr, s_arr, p_rise, s_rise = (params[active, j].reshape((-1,) + extra) for j in range(6))
+        t = times[active]
+        tau = t - onset
+
+        p_tau = np.clip(tau - p_arr, 0.0, None)
+        s_tau = np.clip(tau - s_arr, 0.0, None)
+        p_env = (p_tau / p_rise) * np.exp(1 - p_tau / p_rise)
+        s_env = (s_tau / s_rise) * np.exp(1 - s_tau / s_rise)
+
+        phase = phases[active].reshape((-1,) + extra + (3,))
+        t3 = t[..., None]
+        amp = (peak * self.peak_scale)[..., None]
+        p_wave = (P_RATIO * amp) * p_env[..., None] * P_AXES * np.sin(2 * np.pi * P_FREQ * t3 + phase)
+        s_wave = amp * s_env[..., None] * S_AXES * np.sin(2 * np.pi * S_FREQ * t3 + phase)
+
+        values[active] += p_wave + s_wave
+        return values
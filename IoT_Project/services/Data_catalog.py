@@ -1,11 +1,16 @@
 import cherrypy
-import json, uuid, os
+import paho.mqtt.client as mqtt
+import json, uuid, os, threading
+from collections import deque
+from itertools import islice
 from utils.config_loader import ConfigLoader
+from utils.payload_codec import CODECS, DEFAULT_CODEC
+from services.catalog_store import open_store
+from services.device_index import DeviceIndex
+from services.liveness import LivenessTracker
 
 class DataCatalog(object):
     def __init__(self, config_file=os.path.join("config", "system_config.json")):
-        self.devices = {}
-
         # Load config from JSON
         try:
             if os.path.exists(config_file):
@@ -22,6 +27,31 @@ class DataCatalog(object):
         catalog_host = cfg.catalog_host
         catalog_port = cfg.catalog_port
 
+        # Devices: in memory or SQLite (persistent, indexed), see services/catalog_store.py
+        self.store = open_store(**cfg.catalog_store)
+        # queries are served from in-memory indexes kept up to date with the store (plain lookups: store indexes)
+        self.index = DeviceIndex(self.store.all())
+        print(f"[INFO][catalog] {cfg.catalog_store.get('backend', 'memory')} store: {len(self.index)} devices")
+
+        # Versioning: every register / delete bumps the version and goes to the change log (delta sync,
+        # see utils/catalog_mirror.py). A new epoch on every start: clients of a previous run resync fully.
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.changelog = deque(maxlen=cfg.catalog_changelog)     # (version, client_id, info or None)
+        self.version_lock = threading.Lock()
+
+        # Liveness: devices with a "ttl" must POST /heartbeat within it or they are evicted (services/liveness.py)
+        liveness = cfg.liveness_config
+        self.liveness = None
+        self.liveness_types = liveness.get("types", [])
+        self.liveness_ttl = liveness.get("ttl", 30)
+        if liveness.get("enabled", False):
+            self.liveness = LivenessTracker(self.evict_devices, self.liveness_ttl)
+            for client_id, info in self.index.all().items():
+                self.watch_device(client_id, info)      # devices of the previous run get one TTL to show up
+            self.liveness.start()
+            print(f"[INFO][catalog] Liveness: {len(self.liveness)} devices tracked, default TTL {self.liveness_ttl} s")
+
         cherrypy.config.update({
             'server.socket_host': catalog_host,
             'server.socket_port': catalog_port
@@ -43,6 +73,24 @@ class DataCatalog(object):
             "Static_Web_Service": "Adjust/"
         }
 
+        self.sensor_types = ["Accelerometer_Sensor", "Velocity_Sensor"]
+
+        # Sharded controller: workers publish their decisions here, the coordinator merges them
+        self.decision_topic = "controller/decisions"
+        # sensor client_id -> worker shard (written by services.controller_coordinator)
+        self.partition_map = {"version": 0, "shards": 1, "assignments": {}}
+
+        # Change events: retained <catalog_topic>/<client_id> (empty payload = deleted), see utils/catalog_watcher.py
+        self.catalog_topic = "catalog/devices"
+        self.mqtt_client = mqtt.Client("Data_Catalog")
+        self.mqtt_client.on_connect = self.on_mqtt_connect
+        self.mqtt_client.message_callback_add(f"{self.catalog_topic}/+", self.on_retained_device)
+        try:
+            self.mqtt_client.connect_async(cfg.mqtt_host, cfg.mqtt_port)
+            self.mqtt_client.loop_start()
+        except Exception as e:
+            print(f"[WARN][catalog] MQTT unavailable, no change events: {e}")
+
         self.device_pref = {
             "Accelerometer_Sensor": "Acc",
             "Velocity_Sensor": "Vel",
@@ -67,38 +115,167 @@ class DataCatalog(object):
             cherrypy.response.status = 400
             return {"error": "Invalid JSON"}
 
+        try:
+            client_id, info, response = self.new_device(data)
+        except ValueError as e:
+            cherrypy.response.status = 400
+            return {"error": str(e)}
+
+        self.store.put(client_id, info)
+        self.index.add(client_id, info)
+        self.watch_device(client_id, info)
+        self.record_change(client_id, info)
+        return response
+
+    # POST /register_devices  {"devices": [<register_device payload>, ...]}
+    # all or nothing: one invalid device -> 400 and nothing registered; one store transaction
+    @cherrypy.expose
+    @cherrypy.tools.json_in()
+    @cherrypy.tools.json_out()
+    def register_devices(self):
+        data = cherrypy.request.json
+        payloads = data.get("devices") if isinstance(data, dict) else None
+        if not isinstance(payloads, list) or not payloads:
+            cherrypy.response.status = 400
+            return {"error": "Missing devices list"}
+
+        devices, responses = [], []
+        for i, payload in enumerate(payloads):
+            try:
+                client_id, info, response = self.new_device(payload if isinstance(payload, dict) else {})
+            except ValueError as e:
+                cherrypy.response.status = 400
+                return {"error": str(e), "index": i}
+            devices.append((client_id, info))
+            responses.append(response)
+
+        self.store.put_many(devices)
+        for client_id, info in devices:
+            self.index.add(client_id, info)
+            self.watch_device(client_id, info)
+        self.record_changes(devices)
+        return {"devices": responses}
+
+    # --- Validated device info of a registration payload (ValueError -> 400) ---
+    def new_device(self, data):
         device_type = data.get("type")
         building = data.get("building")
         location = data.get("location", {})
+        codec = data.get("codec", DEFAULT_CODEC)   # payload encoding advertised by the device
 
         if not device_type or device_type not in self.topic_map:
-            cherrypy.response.status = 400
-            return {"error": "Invalid or missing device type"}
+            raise ValueError("Invalid or missing device type")
 
         if not building or not isinstance(building, str):
-            cherrypy.response.status = 400
-            return {"error": "Invalid or missing building"}
+            raise ValueError("Invalid or missing building")
 
         latitude = location.get("latitude")
         longitude = location.get("longitude")
 
         if latitude is None or longitude is None:
-            cherrypy.response.status = 400
-            return {"error": "Missing latitude or longitude"}
+            raise ValueError("Missing latitude or longitude")
+
+        if codec not in CODECS:
+            raise ValueError("Unknown payload codec")
 
-        client_id = f"{self.device_pref[device_type]}_{uuid.uuid4()}"
+        # heartbeat TTL (s): the configured default of the liveness types, 0 = never expires
+        ttl = data.get("ttl", self.liveness_ttl if device_type in self.liveness_types else 0)
+        if not isinstance(ttl, (int, float)) or isinstance(ttl, bool) or ttl < 0:
+            raise ValueError("Invalid ttl")
+
+        # a restarted device may ask for its previous client_id (warm restart of the controller)
+        client_id = data.get("client_id")
+        if not isinstance(client_id, str) or not client_id.startswith(f"{self.device_pref[device_type]}_") \
+                or len(client_id) > 64 or "/" in client_id or "+" in client_id or "#" in client_id:
+            client_id = f"{self.device_pref[device_type]}_{uuid.uuid4()}"
         base_topic = self.topic_map[device_type]
         self_building = building.replace(" ", "_")
         topic = f"{base_topic}{self_building}/{client_id}"
 
-        self.devices[client_id] = {
+        info = {
             "type": device_type,
             "building": building,
             "location": {"latitude": latitude, "longitude": longitude},
-            "topic": topic
+            "topic": topic,
+            "codec": codec
         }
+        response = {"client_id": client_id, "topic": topic}
+        if ttl:
+            info["ttl"] = ttl
+            response["ttl"] = ttl
+
+        # Sensors also publish a decimated (per second) summary stream next to the raw one
+        if device_type in self.sensor_types:
+            summary_topic = f"{topic}/summary"
+            info["summary_topic"] = summary_topic
+            response["summary_topic"] = summary_topic
+        return client_id, info, response
+
+    # --- Liveness ---
+    def watch_device(self, client_id, info):
+        if self.liveness is None:
+            return
+        if info.get("ttl"):
+            self.liveness.track(client_id, info["ttl"])
+        else:
+            self.liveness.untrack(client_id)
 
-        return {"client_id": client_id, "topic": topic}
+    def evict_devices(self, client_ids):
+        """ Expired TTL (timer thread of the liveness tracker): delete like /delete_devices, with change events """
+        deleted = self.store.delete_many(client_ids)
+        for client_id in deleted:
+            self.index.remove(client_id)
+        self.record_changes([(client_id, None) for client_id in deleted])
+        if deleted:
+            print(f"[INFO][catalog] Evicted {len(deleted)} devices without heartbeat: {', '.join(deleted[:5])}"
+                  f"{' ...' if len(deleted) > 5 else ''}")
+
+    # POST /heartbeat  {"device_ids": [...]} -> {"unknown": ids the catalog does not know (evicted or deleted)}
+    @cherrypy.expose
+    @cherrypy.tools.json_in()
+    @cherrypy.tools.json_out()
+    def heartbeat(self):
+        data = cherrypy.request.json
+        device_ids = data.get("device_ids") if isinstance(data, dict) else None
+        if not isinstance(device_ids, list):
+            cherrypy.response.status = 400
+            return {"error": "Missing device_ids list"}
+        if self.liveness is None:
+            return {"unknown": [i for i in device_ids if i not in self.index]}
+        # devices without a ttl are not tracked, but they are not unknown
+        return {"unknown": [i for i in self.liveness.beat(device_ids) if i not in self.index]}
+
+    # --- New version + change log entry, then the push event ---
+    def record_change(self, client_id, info):
+        self.record_changes([(client_id, info)])
+
+    def record_changes(self, changes):
+        with self.version_lock:
+            for client_id, info in changes:
+                self.version += 1
+                self.changelog.append((self.version, client_id, info))
+        for client_id, info in changes:
+            self.publish_change(client_id, info)
+
+    def etag(self):
+        return f'"{self.epoch}-{self.version}"'
+
+    # --- Push change event (retained, so late subscribers get the current devices too) ---
+    def publish_change(self, client_id, info):
+        payload = json.dumps(info) if info is not None else ""
+        self.mqtt_client.publish(f"{self.catalog_topic}/{client_id}", payload, qos=1, retain=True)
+
+    def on_mqtt_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            # the retained devices of a previous catalog run are checked once
+            client.subscribe(f"{self.catalog_topic}/+", qos=1)
+        else:
+            print(f"[WARN][catalog] MQTT connection failed. Return code: {rc}")
+
+    def on_retained_device(self, client, userdata, msg):
+        client_id = msg.topic.rsplit("/", 1)[-1]
+        if msg.payload and client_id not in self.index:
+            self.publish_change(client_id, None)    # stale device (catalog restarted): clear it
 
     @cherrypy.expose
     @cherrypy.tools.json_out()
@@ -112,12 +289,44 @@ class DataCatalog(object):
         Adjust_topic = self.topic_map["Static_Web_Service"]     #Adjust/
         return {"Adjust_topic": Adjust_topic}
 
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def get_decision_topic(self):
+        return {"D_topic": self.decision_topic}      #controller/decisions
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def get_partition_map(self):
+        return self.partition_map
+
+    @cherrypy.expose
+    @cherrypy.tools.json_in()
+    @cherrypy.tools.json_out()
+    def set_partition_map(self):
+        data = cherrypy.request.json
+        shards = data.get("shards")
+        assignments = data.get("assignments")
+        if not isinstance(shards, int) or shards < 1 or not isinstance(assignments, dict):
+            cherrypy.response.status = 400
+            return {"error": "Invalid partition map"}
+        self.partition_map = {
+            "version": self.partition_map["version"] + 1,
+            "shards": shards,
+            "assignments": assignments
+        }
+        return {"result": "Partition map updated", "version": self.partition_map["version"]}
+
     @cherrypy.expose
     @cherrypy.tools.json_out()
     def get_tbot_topic(self):
         Tbot_topic = self.topic_map["Telegram_Bot"]     #Tbot/
         return {"Tbot_topic": Tbot_topic}
 
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def get_catalog_topic(self):
+        return {"C_topic": self.catalog_topic}      #catalog/devices
+
 
     @cherrypy.expose
     @cherrypy.tools.json_in()
@@ -125,16 +334,108 @@ class DataCatalog(object):
     def delete_device(self):
         input_json = cherrypy.request.json
         device_id = input_json.get("device_id")
-        if device_id in self.devices:
-            del self.devices[device_id]
+        if self.store.delete(device_id):
+            self.index.remove(device_id)
+            if self.liveness is not None:
+                self.liveness.untrack(device_id)
+            self.record_change(device_id, None)
             return {"result": "Device deleted from catalog"}
         else:
             return {"error": "Device not found"}
+
+    # POST /delete_devices  {"device_ids": [...]} -> deleted / not_found, one store transaction
+    @cherrypy.expose
+    @cherrypy.tools.json_in()
+    @cherrypy.tools.json_out()
+    def delete_devices(self):
+        input_json = cherrypy.request.json
+        device_ids = input_json.get("device_ids") if isinstance(input_json, dict) else None
+        if not isinstance(device_ids, list):
+            cherrypy.response.status = 400
+            return {"error": "Missing device_ids list"}
+
+        deleted = self.store.delete_many(device_ids)
+        for device_id in deleted:
+            self.index.remove(device_id)
+            if self.liveness is not None:
+                self.liveness.untrack(device_id)
+        self.record_changes([(device_id, None) for device_id in deleted])
+        deleted_set = set(deleted)
+        return {"deleted": deleted, "not_found": [i for i in device_ids if i not in deleted_set]}
         
     @cherrypy.expose
     @cherrypy.tools.json_out()
-    def get_devices(self):
-        return self.devices
+    def get_devices(self, type=None, building=None, topic=None, prefix=None, bbox=None, limit=None, cursor=None):
+        """
+        /get_devices                                    every device {client_id: info}
+        /get_devices?type=Accelerometer_Sensor,Velocity_Sensor&building=..&topic=..&prefix=Acc_
+                    &bbox=min_lat,min_lon,max_lat,max_lon&limit=100&cursor=<last client_id>
+        Same answer restricted to the matching devices (ordered by client_id); when a page is full,
+        the cursor of the next page is in the X-Next-Cursor header.
+        Conditional GET: ETag = catalog epoch + version, If-None-Match -> 304 when nothing changed.
+        """
+        # the version is read before the devices: a change in between is sent again by /changes (idempotent)
+        etag = self.etag()
+        if etag in cherrypy.request.headers.get("If-None-Match", ""):
+            raise cherrypy.HTTPRedirect([], 304)
+        cherrypy.response.headers["ETag"] = etag
+        if not any(p is not None for p in (type, building, topic, prefix, bbox, limit, cursor)):
+            return self.index.all()
+        lookup = {key: value for key, value in (("type", type), ("building", building), ("topic", topic))
+                  if value is not None}
+        if self.store.indexed and not any(p is not None for p in (prefix, bbox, limit, cursor)) \
+                and "," not in (type or "") and set(lookup) <= set(self.store.indexed):
+            return self.store.find(**lookup)     # plain lookup: straight from the store indexes
+        try:
+            types = type.split(",") if type else None
+            if bbox is not None:
+                bbox = tuple(float(v) for v in bbox.split(","))
+                if len(bbox) != 4:
+                    raise ValueError("bbox needs min_lat,min_lon,max_lat,max_lon")
+            if limit is not None:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError("limit must be positive")
+        except ValueError as e:
+            cherrypy.response.status = 400
+            return {"error": f"Invalid query: {e}"}
+
+        devices, next_cursor = self.index.query(types, building, topic, prefix, bbox, limit, cursor)
+        if next_cursor is not None:
+            cherrypy.response.headers["X-Next-Cursor"] = next_cursor
+        return devices
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def changes(self, since=0, epoch=None, type=None):
+        """
+        /changes?since=<version>&epoch=<epoch>[&type=A,B]
+        -> {"epoch", "version", "changes": [{"version", "client_id", "info"}]}   (info null = removed)
+        -> {"epoch", "version", "reset": true, "devices": {...}}   other epoch, or since older than the log
+        """
+        try:
+            since = int(since)
+        except ValueError:
+            cherrypy.response.status = 400
+            return {"error": "Invalid version"}
+        types = set(type.split(",")) if type else None
+
+        with self.version_lock:
+            version = self.version
+            oldest = self.changelog[0][0] if self.changelog else version + 1
+            reset = epoch != self.epoch or since > version or since < oldest - 1
+            if not reset:
+                log = list(islice(self.changelog, since - oldest + 1, None))
+        if reset:
+            devices, _ = self.index.query(types=list(types) if types else None)
+            return {"epoch": self.epoch, "version": version, "reset": True, "devices": devices}
+
+        changes = []
+        for v, client_id, info in log:
+            # removals do not carry the type: the client ignores the ones it does not know
+            if types is None or info is None or info.get("type") in types:
+                changes.append({"version": v, "client_id": client_id, "info": info})
+        return {"epoch": self.epoch, "version": version, "changes": changes}
 
 # ------------------- Main -------------------
 if __name__ == '__main__':
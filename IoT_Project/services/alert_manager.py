@@ -0,0 +1,109 @@
+# alert_manager.py
+import threading
+import time
+import uuid
+
+'''
+Alert state machine of the controller (or of the coordinator of a sharded controller).
+The triggers of the sensors of a building are coalesced into one incident of that building, with an id:
+    idle --trigger--> incident open at its level --no trigger of that level for "incident_timeout" s--> idle
+Within an incident the building only gets a warning when its level goes up (escalation):
+    ALARM (1) -> EARTHQUAKE (2)
+so a quake seen by 1000 sensors of a building publishes one ALARM and one EARTHQUAKE, not 1000.
+Only triggers of the level of the incident keep it open: ALARMs of a noisy building do not hold an
+EARTHQUAKE incident, and every building has its own incident, so one noisy building never blocks another.
+A new incident does not repeat an ALARM to a building within "rate_limit" seconds of the previous one
+(flapping sensors); an EARTHQUAKE is never rate limited.
+An operator REACTIVATE resets the buildings (reset()): the next quake cuts them off again.
+The warnings carry "incident" and "level"; the actuators act once per incident and level.
+'''
+
+LEVELS = {"ALARM": 1, "EARTHQUAKE": 2}
+
+
+class Incident:
+    __slots__ = ("id", "started", "held", "level", "triggers")
+
+    def __init__(self, now):
+        self.id = uuid.uuid4().hex[:8]
+        self.started = now
+        self.held = now         # last trigger at the level of the incident
+        self.level = 0          # highest level sent in this incident
+        self.triggers = 0
+
+
+class AlertManager:
+    def __init__(self, incident_timeout=10.0, rate_limit=30.0):
+        self.incident_timeout = incident_timeout
+        self.rate_limit = rate_limit
+        self.open = {}          # building -> Incident
+        self.last_alarm = {}    # building -> time of the last ALARM, across incidents
+        self.lock = threading.Lock()
+        self.incidents = 0
+        self.sent = 0
+        self.suppressed = 0
+
+    def submit(self, command, building, trigger=None, now=None):
+        """ A decision of the detectors -> the trigger to publish (with incident / level), or None. """
+        level = LEVELS[command]
+        now = time.time() if now is None else now
+        with self.lock:
+            incident = self.open.get(building)
+            if incident is not None and now - incident.held > self.incident_timeout:
+                self.close(building)
+                incident = None
+            if incident is None:
+                incident = self.open[building] = Incident(now)
+                self.incidents += 1
+                print(f"[INFO][alerts] Incident {incident.id} opened by {command} in {building}")
+            incident.triggers += 1
+
+            if level <= incident.level:
+                if level == incident.level:
+                    incident.held = now
+                self.suppressed += 1
+                return None
+            if command == "ALARM":
+                last = self.last_alarm.get(building)
+                if incident.level == 0 and last is not None and now - last < self.rate_limit:
+                    self.suppressed += 1
+                    return None
+                self.last_alarm[building] = now
+
+            incident.level = level
+            incident.held = now
+            self.sent += 1
+        trigger = dict(trigger or {})
+        trigger["incident"] = incident.id
+        trigger["level"] = level
+        return trigger
+
+    def close(self, building):
+        incident = self.open.pop(building, None)
+        if incident is not None:
+            print(f"[INFO][alerts] Incident {incident.id} of {building} closed: {incident.triggers} triggers")
+
+    def reset(self, building=None):
+        """ Operator REACTIVATE: forget the incidents (and ALARM rate limit) of a building, of all when None """
+        with self.lock:
+            for b in [building] if building is not None else list(self.open):
+                self.close(b)
+            if building is None:
+                self.last_alarm.clear()
+            else:
+                self.last_alarm.pop(building, None)
+
+    def on_command(self, payload):
+        """ Operator command seen on the broadcast warning topic """
+        if payload.get("command") == "REACTIVATE":
+            self.reset(payload.get("building"))
+            print(f"[INFO][alerts] REACTIVATE: cutoffs re-armed for {payload.get('building') or 'all buildings'}")
+
+    def stats(self):
+        now = time.time()
+        return {
+            "incidents": self.incidents,
+            "sent": self.sent,
+            "suppressed": self.suppressed,
+            "open": sum(1 for incident in list(self.open.values()) if now - incident.held <= self.incident_timeout),
+        }
@@ -0,0 +1,183 @@
+# catalog_store.py
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+'''
+Storage backend of the Data Catalog ("catalog_store" in system_config.json):
+    memory  - plain dict, the devices are lost when the catalog restarts
+    sqlite  - one table in a SQLite file (WAL journal): the devices survive a restart of the catalog,
+              secondary indexes on (type, building), building and topic serve the lookups (find)
+CherryPy serves every request on a pool thread: each thread gets its own SQLite connection, WAL lets
+the readers run while a registration commits (synchronous=NORMAL: no fsync per registration).
+Both backends store the device info as given and return plain dicts, so the REST answers do not change.
+"indexed": the fields find() serves from an index. The catalog sends the plain type / building / topic
+lookups of /get_devices to the sqlite indexes; the memory store has none, its lookups (and the prefix,
+bbox and paginated queries of both backends) go to the in-memory DeviceIndex (services/device_index.py).
+'''
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    client_id   TEXT PRIMARY KEY,
+    type        TEXT NOT NULL,
+    building    TEXT,
+    topic       TEXT,
+    info        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS devices_type ON devices (type, building);
+CREATE INDEX IF NOT EXISTS devices_building ON devices (building);
+CREATE INDEX IF NOT EXISTS devices_topic ON devices (topic);
+"""
+
+INDEXED = ("type", "building", "topic")
+
+PUT = "INSERT OR REPLACE INTO devices (client_id, type, building, topic, info) VALUES (?, ?, ?, ?, ?)"
+
+
+class MemoryStore:
+    indexed = ()
+
+    def __init__(self):
+        self.devices = {}
+        self.lock = threading.Lock()
+
+    def put(self, client_id, info):
+        with self.lock:
+            self.devices[client_id] = info
+
+    def put_many(self, devices):
+        """ devices: [(client_id, info)], stored together """
+        with self.lock:
+            self.devices.update(devices)
+
+    def delete(self, client_id):
+        with self.lock:
+            return self.devices.pop(client_id, None) is not None
+
+    def delete_many(self, client_ids):
+        """ -> the client_ids that were deleted """
+        with self.lock:
+            return [client_id for client_id in dict.fromkeys(client_ids)
+                    if self.devices.pop(client_id, None) is not None]
+
+    def get(self, client_id):
+        return self.devices.get(client_id)
+
+    def __contains__(self, client_id):
+        return client_id in self.devices
+
+    def __len__(self):
+        return len(self.devices)
+
+    def all(self):
+        with self.lock:
+            return dict(self.devices)
+
+    def find(self, **filters):
+        """ find(type=.., building=.., topic=..) -> {client_id: info} (full scan) """
+        with self.lock:
+            return {client_id: info for client_id, info in self.devices.items()
+                    if all(info.get(key) == value for key, value in filters.items())}
+
+    def close(self):
+        pass
+
+
+class SQLiteStore:
+    indexed = INDEXED
+
+    def __init__(self, path=os.path.join("data", "catalog.db")):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.local = threading.local()
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            # autocommit: a statement is its own transaction, "with conn" is not needed for single writes
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(client_id, info):
+        return client_id, info.get("type"), info.get("building"), info.get("topic"), json.dumps(info)
+
+    def put(self, client_id, info):
+        self.connection().execute(PUT, self._row(client_id, info))
+
+    def put_many(self, devices):
+        """ devices: [(client_id, info)], one transaction (all or nothing, one commit) """
+        with self.transaction() as conn:
+            conn.executemany(PUT, [self._row(client_id, info) for client_id, info in devices])
+
+    def delete(self, client_id):
+        cursor = self.connection().execute("DELETE FROM devices WHERE client_id = ?", (client_id,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, client_ids):
+        """ -> the client_ids that were deleted, one transaction """
+        deleted = []
+        with self.transaction() as conn:
+            for client_id in dict.fromkeys(client_ids):
+                if conn.execute("DELETE FROM devices WHERE client_id = ?", (client_id,)).rowcount > 0:
+                    deleted.append(client_id)
+        return deleted
+
+    @contextmanager
+    def transaction(self):
+        # autocommit connection: the batch writes open their transaction explicitly
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, client_id):
+        row = self.connection().execute("SELECT info FROM devices WHERE client_id = ?", (client_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __contains__(self, client_id):
+        return self.connection().execute(
+            "SELECT 1 FROM devices WHERE client_id = ?", (client_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection().execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+
+    def all(self):
+        rows = self.connection().execute("SELECT client_id, info FROM devices")
+        return {client_id: json.loads(info) for client_id, info in rows}
+
+    def find(self, **filters):
+        """ find(type=.., building=.., topic=..) -> {client_id: info}, through the indexes """
+        unknown = set(filters) - set(INDEXED)
+        if unknown:
+            raise ValueError(f"Not an indexed field: {', '.join(sorted(unknown))}")
+        where = " AND ".join(f"{key} = ?" for key in filters) or "1"
+        rows = self.connection().execute(f"SELECT client_id, info FROM devices WHERE {where} ORDER BY client_id",
+                                         tuple(filters.values()))
+        return {client_id: json.loads(info) for client_id, info in rows}
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+def open_store(backend="memory", **options):
+    if backend == "sqlite":
+        return SQLiteStore(**options)
+    if backend == "memory":
+        return MemoryStore()
+    raise ValueError(f"Unknown catalog store: {backend} (expected 'memory' or 'sqlite')")
@@ -0,0 +1,164 @@
+# consensus.py
+import math
+import threading
+from collections import deque
+
+'''
+Building level k-of-n consensus before the utilities are cut.
+The sensors of the catalog are indexed by building (group) and, inside a building, by location cell
+(a grid of "cell" degrees of latitude / longitude, ~100 m with the default 0.001):
+    building -> BuildingGroup -> cell -> sensors
+A sensor that detects an earthquake votes for its building; the cutoff is issued only when
+k distinct sensors of that building voted within "window" seconds:
+    k = min(n, max(k_min, ceil(fraction * n)))      (n = sensors of the building)
+and, with "min_cells" > 1, when those voters are spread over min(min_cells, cells of the building)
+distinct cells: sensors bumped together in one spot do not cut a whole building.
+Each building keeps a deque of its recent votes, a counter per voter and per voting cell, so a vote
+costs O(1) amortized and does not depend on the fleet size.
+A sensor that is not in the catalog (removed while its records were queued, unknown "bn") has no
+building: its votes are ignored, it can never cut the utilities on its own.
+The index is updated by the catalog thread and read by the detection: every method runs under "lock".
+'''
+
+
+def location_cell(location, cell):
+    """ Grid cell of a catalog location, None when it has no numeric latitude / longitude """
+    try:
+        latitude, longitude = float(location["latitude"]), float(location["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if math.isnan(latitude) or math.isnan(longitude):
+        return None
+    return math.floor(latitude / cell), math.floor(longitude / cell)
+
+
+class BuildingGroup:
+    __slots__ = ("building", "members", "cells", "votes", "voters", "voter_cells", "fired")
+
+    def __init__(self, building):
+        self.building = building
+        self.members = {}       # sensor_id -> cell
+        self.cells = {}         # cell -> sensors of the building in it
+        self.votes = deque()    # (timestamp, sensor_id) in the window
+        self.voters = {}        # sensor_id -> votes of this sensor in the window
+        self.voter_cells = {}   # cell -> voters of that cell in the window
+        self.fired = False      # cutoff already issued for the current event
+
+
+class BuildingConsensus:
+    def __init__(self, k=2, fraction=0.5, window=2.0, cell=0.001, min_cells=1):
+        self.k_min = k
+        self.fraction = fraction
+        self.window = window
+        self.cell = cell
+        self.min_cells = min_cells
+        self.groups = {}        # building -> BuildingGroup
+        self.sensor_group = {}  # sensor_id -> BuildingGroup
+        self.lock = threading.RLock()
+
+    def update_devices(self, devices_info, sensor_types=("Accelerometer_Sensor", "Velocity_Sensor")):
+        """ (Re)build the index from the catalog devices. Votes in progress are kept. """
+        with self.lock:
+            seen = set()
+            for sensor_id, info in devices_info.items():
+                if info.get("type") not in sensor_types:
+                    continue
+                self.add_sensor(sensor_id, info.get("building"), info.get("location"))
+                seen.add(sensor_id)
+            for sensor_id in list(self.sensor_group):
+                if sensor_id not in seen:
+                    self.remove_sensor(sensor_id)
+
+    def add_sensor(self, sensor_id, building, location=None):
+        cell = location_cell(location or {}, self.cell)
+        with self.lock:
+            group = self.sensor_group.get(sensor_id)
+            if group is not None and group.building == building and group.members[sensor_id] == cell:
+                return
+            if group is not None:
+                self.remove_sensor(sensor_id)
+            group = self.groups.get(building)
+            if group is None:
+                group = self.groups[building] = BuildingGroup(building)
+            group.members[sensor_id] = cell
+            group.cells[cell] = group.cells.get(cell, 0) + 1
+            self.sensor_group[sensor_id] = group
+
+    def remove_sensor(self, sensor_id):
+        with self.lock:
+            group = self.sensor_group.pop(sensor_id, None)
+            if group is None:
+                return
+            cell = group.members.pop(sensor_id)
+            count = group.cells[cell] - 1
+            if count > 0:
+                group.cells[cell] = count
+            else:
+                del group.cells[cell]
+            if group.voters.pop(sensor_id, None) is not None:
+                self._leave_cell(group, cell)
+            if not group.members:
+                del self.groups[group.building]
+
+    def building_of(self, sensor_id):
+        group = self.sensor_group.get(sensor_id)
+        return group.building if group is not None else None
+
+    def required(self, group):
+        n = max(1, len(group.members))
+        return min(n, max(self.k_min, math.ceil(self.fraction * n)))
+
+    def required_cells(self, group):
+        return max(1, min(self.min_cells, len(group.cells)))
+
+    @staticmethod
+    def _leave_cell(group, cell):
+        count = group.voter_cells.get(cell, 0) - 1
+        if count > 0:
+            group.voter_cells[cell] = count
+        else:
+            group.voter_cells.pop(cell, None)
+
+    def vote(self, sensor_id, timestamp):
+        """
+        An earthquake vote of one sensor. Returns the building when the quorum is reached
+        (once per event), otherwise None.
+        """
+        with self.lock:
+            group = self.sensor_group.get(sensor_id)
+            if group is None:
+                print(f"[WARN][consensus] Vote of {sensor_id} ignored: sensor not in the catalog")
+                return None
+
+            # drop the votes that left the window
+            votes, voters = group.votes, group.voters
+            while votes and votes[0][0] < timestamp - self.window:
+                _, old = votes.popleft()
+                count = voters.get(old, 0) - 1
+                if count > 0:
+                    voters[old] = count
+                elif voters.pop(old, None) is not None:
+                    self._leave_cell(group, group.members.get(old))
+            if not votes:
+                group.fired = False     # previous event is over
+
+            votes.append((timestamp, sensor_id))
+            count = voters.get(sensor_id, 0)
+            voters[sensor_id] = count + 1
+            if count == 0:
+                cell = group.members[sensor_id]
+                group.voter_cells[cell] = group.voter_cells.get(cell, 0) + 1
+
+            if not group.fired and len(voters) >= self.required(group) \
+                    and len(group.voter_cells) >= self.required_cells(group):
+                group.fired = True
+                return group.building
+            return None
+
+    def status(self, building):
+        with self.lock:
+            group = self.groups.get(building)
+            if group is None:
+                return None
+            return {"sensors": len(group.members), "voters": len(group.voters), "required": self.required(group),
+                    "cells": len(group.cells), "voting_cells": len(group.voter_cells)}
@@ -1,29 +1,69 @@
 # controller.py
 
 import paho.mqtt.client as mqtt
-import requests, json, time
+import requests, json, time, argparse, threading
 from utils.config_loader import ConfigLoader
 from utils.device_registrar import DeviceRegistrar
 from utils.topic_fetcher import TopicFetcher
+from utils.payload_codec import decode_payload
+from utils.catalog_watcher import CatalogWatcher
+from utils.catalog_mirror import CatalogMirror
+from utils.warning_topics import WarningTopics, warning_message
+from utils.latency_metrics import LatencyMetrics
+from services.detectors import StaLtaDetector, SustainedThresholdDetector
+from services.measurements import record_arrays, magnitudes, PeakTracker, COMPONENTS
+from services.controller_state import SensorStateTable
+from services.controller_snapshot import ControllerSnapshot
+from services.consensus import BuildingConsensus
+from services.alert_manager import AlertManager
+from services.ingest_pipeline import IngestPipeline
+from services.reorder_buffer import ReorderBuffer
+from utils.consistent_hash import HashRing
+
+# unit of a heartbeat -> data type of the sensor (heartbeats do not carry it)
+HEARTBEAT_TYPES = {"Gal": "acceleration", "m/s": "velocity"}
 
 class Controller:
-    def __init__(self):
-        self.sensor_topics = []
+    def __init__(self, shard=0, shards=1):
+        self.sensor_topics = set()
+        self.subscribed = set()     # sensor topics subscribed on the broker
+        self.topics_lock = threading.Lock()
+        self.topic_codecs = {}      # topic -> payload codec advertised in the catalog
         self.devices_info = {}
-        self.state = {}
+        self.assignments = {}       # partition map of the coordinator (sharded workers)
 
         # Load config
         cfg = ConfigLoader()
         self.catalog_url = cfg.catalog_url
+        self.mirror = CatalogMirror(self.catalog_url, types=["Velocity_Sensor", "Accelerometer_Sensor"])
         self.mqtt_host = cfg.mqtt_host
         self.mqtt_port = cfg.mqtt_port
-        self.Acc_thresholds = cfg.thresholds_Acc
-        self.V_thresholds = cfg.thresholds_Vel
-        self.EQ_time_check = cfg.EQ_time_check # 0.3 or 300 ms
-
-        # Fetch warning topic
+        # full catalog resync; new/deleted devices are pushed by the catalog in between
+        self.poll_interval = cfg.rebalance_interval if shards > 1 else cfg.catalog_resync_interval
+        self.setup_detection(cfg, shard, shards)
+
+        # Warm restart: last snapshot of this controller (same client_id, subscriptions, detection state)
+        snapshot_cfg = dict(cfg.snapshot_config)
+        self.snapshot = None
+        restored = None
+        if snapshot_cfg.pop("enabled", False):
+            self.snapshot = ControllerSnapshot(self.latency.name, **snapshot_cfg)
+            restored = self.snapshot.load(shard, shards)
+
+        # Ingest queue: the MQTT thread only enqueues, worker(s) decode and detect
+        ingest_cfg = dict(cfg.ingest_config)
+        self.ingest_stats_interval = ingest_cfg.pop("stats_interval", 0)
+        self.pipeline = None
+        if ingest_cfg.pop("enabled", False):
+            self.pipeline = IngestPipeline(self.handle_message, name="controller", **ingest_cfg)
+            self.latency.add_counters("ingest", lambda: self.pipeline.stats(reset=False))
+
+        # Fetch warning topic (sharded workers publish their decisions to the coordinator instead)
         fetcher = TopicFetcher(self.catalog_url)
         self.warning_topic = fetcher.get_warning_topic()
+        self.warning_topics = WarningTopics(self.warning_topic or "EQ_WARNING/", cfg.warning_regions)
+        self.decision_topic = fetcher.get_decision_topic() if shards > 1 else None
+        self.catalog_topic = fetcher.get_catalog_topic()
 
         # Register controller
         payload = {
@@ -31,39 +71,217 @@ class Controller:
             "building": "Central_Unit",
             "location": {"latitude": "Central_Unit", "longitude": "Central_Unit"}
         }
+        if restored is not None:
+            payload["client_id"] = restored[0]["client_id"]    # keep the identity of the previous run
         registrar = DeviceRegistrar(self.catalog_url)
         self.client_id, self.topic = registrar.register(payload)
         self.mqtt_client = mqtt.Client(self.client_id)
 
-    # --- Fetch sensors ---
+        self.restored = False
+        if restored is not None:
+            count = self.snapshot.restore(self, *restored)
+            self.restored = True
+            print(f"[INFO][controller] Warm restart: {len(self.sensor_topics)} sensor topics, "
+                  f"detection state of {count} sensors restored")
+
+    # --- Detection state and parameters (no network, also used by test/TEST_bench_controller.py) ---
+    def setup_detection(self, cfg, shard=0, shards=1):
+        self.Acc_thresholds = cfg.thresholds_Acc
+        self.V_thresholds = cfg.thresholds_Vel
+        self.EQ_time_check = cfg.EQ_time_check # 0.3 or 300 ms
+        self.type_thresholds = {
+            "velocity": (self.V_thresholds["Warning"], self.V_thresholds["EQ_Cutoff"]),
+            "acceleration": (self.Acc_thresholds["Warning"], self.Acc_thresholds["EQ_Cutoff"])
+        }
+        self.states = SensorStateTable()    # (sensor_type, sensor_id) -> slot + state
+        self.latency = LatencyMetrics("controller" if shards == 1 else f"controller_{shard}",
+                                      cfg.latency_dir, cfg.latency_dump_interval)
+
+        # Measurement: vector magnitude + sliding peak (PGA / PGV) of every micro-batch
+        self.components = cfg.measurement_components
+        self.axes = ["xyz"[i] for i in COMPONENTS[self.components]]
+        self.peaks = PeakTracker(float(cfg.sensor_interval), cfg.peak_window)
+
+        # Detection: "threshold" (sustained thresholds), "sta_lta" or "both"
+        detector_cfg = dict(cfg.detector_config)
+        self.detector_mode = detector_cfg.pop("mode", "threshold")
+        self.threshold = None
+        if self.detector_mode in ["threshold", "both"]:
+            self.threshold = SustainedThresholdDetector(self.EQ_time_check)
+        self.sta_lta = None
+        if self.detector_mode in ["sta_lta", "both"]:
+            self.sta_lta = StaLtaDetector(float(cfg.sensor_interval), **detector_cfg)
+        # samples a heartbeat of a quiet sensor stands for (background level of the STA/LTA)
+        self.heartbeat_samples = max(1, int(round(cfg.edge_trigger.get("heartbeat", 1.0) / float(cfg.sensor_interval))))
+
+        # Reorder stage: detectors see the samples of a sensor in timestamp order (bounded lateness)
+        reorder_cfg = dict(cfg.reorder_config)
+        self.reorder = None
+        if reorder_cfg.pop("enabled", False):
+            self.reorder = ReorderBuffer(**reorder_cfg)
+            self.latency.add_counters("reorder", self.reorder.stats)
+            # push (ingest worker) and flush (timer) of a sensor run under the same lock
+            self.reorder_locks = [threading.Lock() for _ in range(64)]
+
+        # k-of-n agreement of the sensors of a building before the cutoff
+        # (a sharded worker only sees part of a building: the coordinator runs the consensus)
+        consensus_cfg = dict(cfg.consensus_config)
+        self.consensus = None
+        if consensus_cfg.pop("enabled", False) and shards == 1:
+            self.consensus = BuildingConsensus(**consensus_cfg)
+
+        # Incidents: one warning per building and level instead of one per sensor trigger
+        # (sharded: the coordinator merges the decisions of the workers)
+        alerts_cfg = dict(cfg.alerts_config)
+        self.alerts = None
+        if alerts_cfg.pop("enabled", False) and shards == 1:
+            self.alerts = AlertManager(**alerts_cfg)
+            self.latency.add_counters("alerts", self.alerts.stats)
+
+        # Sharding: this worker only owns the sensors that hash to its shard
+        self.shard = shard
+        self.shards = shards
+        self.ring = HashRing(shards) if shards > 1 else None
+
+    # --- Fetch sensors (delta since the previous poll, nothing to do when the catalog did not change) ---
     def get_devices(self):
-        url = f"{self.catalog_url}/get_devices"
-        self.sensor_topics = []
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            self.devices_info = response.json()
-            for client_id, info in self.devices_info.items():
+            changed = self.mirror.sync()
+            assignments = self.get_partition_map()
+            if not changed and assignments == self.assignments:
+                return
+            devices_info = dict(self.mirror.devices)
+            self.assignments = assignments
+            sensor_topics = set()
+            for client_id, info in devices_info.items():
                 dev_type = info.get("type")
                 topic = info.get("topic")
-                if dev_type in ["Velocity_Sensor", "Accelerometer_Sensor"]:
-                    self.sensor_topics.append(topic)
+                if dev_type in ["Velocity_Sensor", "Accelerometer_Sensor"] and self.owns(client_id):
+                    sensor_topics.add(topic)
+                    self.topic_codecs[topic] = info.get("codec")
+            self.peaks.reserve(len(sensor_topics))
+            if self.sta_lta is not None:
+                self.sta_lta.reserve(len(sensor_topics))
+            with self.topics_lock:
+                gone = [client_id for client_id, info in self.devices_info.items()
+                        if info.get("topic") in self.sensor_topics and info.get("topic") not in sensor_topics]
+                self.devices_info = devices_info
+                self.sensor_topics = sensor_topics
+                if self.consensus is not None:
+                    self.consensus.update_devices(devices_info)
+            # sensors removed or moved to another worker: their detection slots are reused
+            for client_id in gone:
+                if self.reorder is not None:
+                    self.reorder.remove(client_id)
+                self.states.remove(client_id, self.clear_slot)
         except Exception as e:
             print(f"[WARN][controller] Could not fetch devices: {e}")
-            self.sensor_topics = []
+
+    def owns(self, client_id):
+        """ False when the sensor belongs to another worker of a sharded controller. """
+        if self.ring is None:
+            return True
+        return self.assignments.get(client_id, self.ring.shard_for(client_id)) == self.shard
+
+    def clear_slot(self, slot):
+        self.peaks.clear(slot)
+        if self.sta_lta is not None:
+            self.sta_lta.clear(slot)
+
+    # --- Device change pushed by the catalog (see utils/catalog_watcher.py) ---
+    def on_device_change(self, client_id, info):
+        unsubscribe, subscribe = None, None
+        with self.topics_lock:
+            if self.devices_info.get(client_id) == info:
+                return      # already known (retained devices on every connect)
+            old = self.devices_info.pop(client_id, None)
+            if old is not None and old.get("topic") in self.sensor_topics:
+                unsubscribe = old["topic"]
+                self.sensor_topics.discard(unsubscribe)
+                if self.consensus is not None:
+                    self.consensus.remove_sensor(client_id)
+                if self.reorder is not None:
+                    self.reorder.remove(client_id)
+                self.states.remove(client_id, self.clear_slot)
+            if info is not None:
+                self.devices_info[client_id] = info
+                if info.get("type") in ["Velocity_Sensor", "Accelerometer_Sensor"] and self.owns(client_id):
+                    subscribe = info["topic"]
+                    self.sensor_topics.add(subscribe)
+                    self.topic_codecs[subscribe] = info.get("codec")
+                    if self.consensus is not None:
+                        self.consensus.add_sensor(client_id, info.get("building"), info.get("location"))
+            if unsubscribe == subscribe:
+                return
+            # incremental: only the topic of this device changes
+            if unsubscribe is not None and unsubscribe in self.subscribed:
+                self.subscribed.discard(unsubscribe)
+            else:
+                unsubscribe = None
+            if subscribe is not None and subscribe not in self.subscribed:
+                self.subscribed.add(subscribe)
+            else:
+                subscribe = None
+
+        if unsubscribe is not None:
+            self.mqtt_client.unsubscribe(unsubscribe)
+            print(f"[INFO][controller] Unsubscribed from topic: {unsubscribe}")
+        if subscribe is not None:
+            self.mqtt_client.subscribe(subscribe)
+            print(f"[INFO][controller] Subscribed to new topic: {subscribe}")
+
+    # --- Subscribe / unsubscribe the difference with the current sensor topics ---
+    def sync_subscriptions(self):
+        with self.topics_lock:
+            topics_to_unsubscribe = self.subscribed - self.sensor_topics
+            topics_to_subscribe = self.sensor_topics - self.subscribed
+            self.subscribed = set(self.sensor_topics)
+
+        for topic in topics_to_unsubscribe:
+            self.mqtt_client.unsubscribe(topic)
+            print(f"[INFO][controller] Unsubscribed from topic: {topic}")
+
+        for topic in topics_to_subscribe:
+            self.mqtt_client.subscribe(topic)
+            print(f"[INFO][controller] Subscribed to new topic: {topic}")
+
+    # --- Partition map of the coordinator (the same consistent hashing if it is not published yet) ---
+    def get_partition_map(self):
+        if self.ring is None:
+            return {}
+        try:
+            response = requests.get(f"{self.catalog_url}/get_partition_map")
+            response.raise_for_status()
+            partition = response.json()
+            if partition.get("shards") == self.shards:
+                return partition.get("assignments", {})
+        except Exception as e:
+            print(f"[WARN][controller] Could not fetch partition map: {e}")
+        return {}
 
     # --- MQTT setup ---
     def setup_mqtt(self):
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
+        self.watcher = None
+        if self.catalog_topic:
+            self.watcher = CatalogWatcher(self.mqtt_client, self.catalog_topic, self.on_device_change)
+        if self.alerts is not None:
+            self.mqtt_client.message_callback_add(self.warning_topics.base, self.on_operator_command)
         self.mqtt_client.connect(self.mqtt_host, self.mqtt_port)
         self.mqtt_client.loop_start()  
 
     def on_connect(self, client, userdata, flags, rc,properties=None):
         if rc == 0:
             print("[MQTT][controller] Connected to broker.")
-            for topic in set(self.sensor_topics):
+            with self.topics_lock:
+                self.subscribed = set(self.sensor_topics)
+            for topic in self.subscribed:
                 client.subscribe(topic, qos=0)
+            if self.watcher is not None:
+                self.watcher.subscribe()
+            if self.alerts is not None:
+                client.subscribe(self.warning_topics.base, qos=1)   # operator REACTIVATE
         else:
             print(f"[ERROR][controller] MQTT connection failed. Return code: {rc}")
 
@@ -74,126 +292,282 @@ class Controller:
             print(f"[INFO][controller] Subscribed to sensor topic: {topic}")
 
 
-    # --- Message callback (check the thresholds on recieved message) ---
+    # --- Message callback (network thread: only enqueue when the ingest pipeline is on) ---
     def on_message(self, client, userdata, msg):
-        try:
-            data = json.loads(msg.payload.decode('utf-8'))
-            sensor_id = data.get("bn")
-            timestamp = data["e"][0]["t"]
-            sensor_type = data["e"][0]["n"]
-            if sensor_id is None or timestamp is None:
-                print("[WARN][controller] Missing sensor_topic or timestamp.")
-                return
-
-            if sensor_type == "velocity":
-                values = data["e"][0]["v"]
-                warning_Thr = self.V_thresholds["Warning"]
-                EQCuttoff_Thr = self.V_thresholds["EQ_Cutoff"]
+        if self.pipeline is not None:
+            self.pipeline.put(msg.topic, msg.payload)
+        else:
+            self.handle_message(msg.topic, msg.payload)
 
-            elif sensor_type == "acceleration":
-                values = data["e"][0]["v"]
-                warning_Thr = self.Acc_thresholds["Warning"]
-                EQCuttoff_Thr = self.Acc_thresholds["EQ_Cutoff"]
+    # --- Decode and check the thresholds on recieved message ---
+    def handle_message(self, topic, payload):
+        try:
+            data = decode_payload(payload, self.topic_codecs.get(topic))
+            self.process_record(data)
+        except Exception as e:
+            print(f"[ERROR][controler] Failed to process incoming message: {e}")
 
-            else:
+    def process_record(self, data):
+        sensor_id = data.get("bn")
+        if sensor_id is None:
+            print("[WARN][controller] Missing sensor_topic or timestamp.")
+            return
+
+        # A record carries a micro-batch of samples (each with its own timestamp), checked at once
+        entries, heartbeat_t = [], None
+        for entry in data["e"]:
+            sensor_type = entry.get("n")
+            if sensor_type == "heartbeat":
+                heartbeat_t = entry.get("t")    # quiet sensor (edge trigger), nothing above the thresholds
+                continue
+            if sensor_type == "heartbeat_rms":
+                self.seed_background(sensor_id, entry)
+                continue
+            if sensor_type not in self.type_thresholds:
                 print(f"[WARN][controller] Unknown data format received: {sensor_type}")
-                return
-
-            x = values.get("x", 0.0) #if no value -> 0.0
-            y = values.get("y", 0.0)
-
-            # --- State init ---
-            if sensor_id not in self.state:
-                self.state[sensor_id] = {}
-
-            if sensor_type not in self.state[sensor_id]:
-                self.state[sensor_id][sensor_type] = {
-                    "warn_start": None,
-                    "eq_start": None,
-                    "alarm_sent": False,
-                    "eq_sent": False
-                }
-            st = self.state[sensor_id][sensor_type]
-
-            # --- Reset below threshold ---
-            if x < warning_Thr and y< warning_Thr:
-                self.state[sensor_id][sensor_type] ={
-                    "warn_start": None, "eq_start": None,
-                    "alarm_sent": False, "eq_sent": False}
-                return
-
-            # --- Above thresholds ---
-            if (x >= warning_Thr or y>= warning_Thr) and st["warn_start"] is None:
-                st["warn_start"] = timestamp
-
-            if (x >= EQCuttoff_Thr or y>= EQCuttoff_Thr):
-                if st["eq_start"] is None:
-                    st["eq_start"] = timestamp
+                continue
+            if entry.get("t") is None:
+                print("[WARN][controller] Missing sensor_topic or timestamp.")
+                continue
+            entries.append(entry)
+
+        # timestamp order: late / out of order samples of QoS 0 and several connections
+        if self.reorder is None:
+            self.check_entries(sensor_id, entries)
+            return
+        with self.reorder_lock(sensor_id):
+            self.check_entries(sensor_id, self.reorder.push(sensor_id, entries, heartbeat_t))
+
+    def check_entries(self, sensor_id, entries):
+        batch, batch_type = [], None
+        for entry in entries:
+            sensor_type = entry["n"]
+            # the entries of one record normally have the same type: one batch per record
+            if sensor_type != batch_type and batch:
+                self.check_batch(sensor_id, batch_type, batch)
+                batch = []
+            batch_type = sensor_type
+            batch.append(entry)
+        if batch:
+            self.check_batch(sensor_id, batch_type, batch)
+
+    # --- Reorder: samples of a sensor that went quiet are released after "max_hold" s at most ---
+    def reorder_lock(self, sensor_id):
+        return self.reorder_locks[hash(sensor_id) % len(self.reorder_locks)]
+
+    def flush_reorder(self, everything=False):
+        for sensor_id in self.reorder.pending():
+            with self.reorder_lock(sensor_id):
+                entries = self.reorder.flush(sensor_id, everything)
+                if entries:
+                    self.check_entries(sensor_id, entries)
+
+    def run_reorder_flush(self):
+        while True:
+            time.sleep(self.reorder.max_hold / 2)
+            try:
+                self.flush_reorder()
+            except Exception as e:
+                print(f"[ERROR][controller] Reorder flush failed: {e}")
+
+    # --- Quiet sensor: its RMS since the previous heartbeat is the background of the STA/LTA ---
+    def seed_background(self, sensor_id, entry):
+        sensor_type = HEARTBEAT_TYPES.get(entry.get("u"))
+        if self.sta_lta is None or sensor_type is None:
+            return
+        st = self.states.get(sensor_id, sensor_type)
+        rms = entry["v"]
+        level = sum(rms.get(axis, 0.0) ** 2 for axis in self.axes) ** 0.5
+        self.sta_lta.seed(st.slot, level, self.heartbeat_samples)
+
+    # --- Measurement (|v| of x, y, z + PGA/PGV peak) and detectors over the batch ---
+    def check_batch(self, sensor_id, sensor_type, entries):
+        st = self.states.get(sensor_id, sensor_type)
+        warning_Thr, EQCuttoff_Thr = self.type_thresholds[sensor_type]
+        if len(entries) == 1:
+            self.check_sample(st, entries[0], warning_Thr, EQCuttoff_Thr)
+            return
+        times, values = record_arrays(entries)
+        mags = magnitudes(values, self.components)
+        peaks = self.peaks.update(st.slot, mags)
+
+        events = []
+        if self.threshold is not None:
+            events += [(i, "threshold", event) for i, event in
+                       self.threshold.update(st, times, mags, warning_Thr, EQCuttoff_Thr)]
+        if self.sta_lta is not None:
+            events += [(i, "sta_lta", event) for i, event in
+                       self.sta_lta.update_batch(st.slot, mags, EQCuttoff_Thr)]
+        if events:
+            events.sort(key=lambda e: e[0])     # sample order (stable: thresholds first)
+            for i, detector, event in events:
+                self.on_event(st, detector, event, float(times[i]), float(peaks[i]))
+
+    # --- Single sample record: same measurement and detectors without NumPy ---
+    def check_sample(self, st, entry, warning_Thr, EQCuttoff_Thr):
+        values, timestamp = entry["v"], entry["t"]
+        mag = sum(values.get(axis, 0.0) ** 2 for axis in self.axes) ** 0.5
+        peak = self.peaks.update_sample(st.slot, mag)
+        if self.threshold is not None:
+            for _, event in self.threshold.update_sample(st, timestamp, mag, warning_Thr, EQCuttoff_Thr):
+                self.on_event(st, "threshold", event, timestamp, peak)
+        if self.sta_lta is not None:
+            event = self.sta_lta.update(st.slot, mag, EQCuttoff_Thr)
+            if event is not None:
+                self.on_event(st, "sta_lta", event, timestamp, peak)
+
+    def on_event(self, st, detector, event, timestamp, peak):
+        if detector == "threshold":
+            if event == "earthquake":
+                print(f"[EARTHQUAKE][controller] {st.sensor_id} ({st.sensor_type}) peak {peak:.2f}")
+                self.confirm_earthquake(st, timestamp, peak)
             else:
-                st["eq_start"] = None
-
-            # EQ check (300ms)
-            if st["eq_start"] is not None and not st["eq_sent"]:
-                if timestamp - st["eq_start"] >= self.EQ_time_check:
-                    print(f"[EARTHQUAKE][controller] {sensor_id} ({sensor_type})")
-                    self.send_EQCutoff()
-                    st["eq_sent"] = True
-                    st["alarm_sent"] = True
-
-            # Warning check (300ms)
-            if st["warn_start"] is not None and not st["alarm_sent"]:
-                if timestamp - st["warn_start"] >= self.EQ_time_check:
-                    print(f"[controller][ALARM] {sensor_id} ({sensor_type})")
-                    self.send_alert()
-                    st["alarm_sent"] = True
-
+                print(f"[controller][ALARM] {st.sensor_id} ({st.sensor_type}) peak {peak:.2f}")
+                self.raise_alarm(st, timestamp, peak)
+        elif event == "trigger":
+            print(f"[controller][ALARM] STA/LTA trigger {st.sensor_id} ({st.sensor_type}) ratio {self.sta_lta.ratio(st.slot):.1f}")
+            self.raise_alarm(st, timestamp, peak)
+        elif event == "earthquake":
+            print(f"[EARTHQUAKE][controller] STA/LTA {st.sensor_id} ({st.sensor_type}) peak {peak:.2f}")
+            self.confirm_earthquake(st, timestamp, peak)
+        elif event == "detrigger":
+            print(f"[INFO][controller] STA/LTA detrigger {st.sensor_id} ({st.sensor_type})")
+
+    def raise_alarm(self, st, timestamp, peak=None):
+        trigger = self.decided("ALARM", st, timestamp, peak)
+        if self.shards > 1:
+            self.send_decision("ALARM", st, trigger)
+            return
+        self.emit("ALARM", self.building_of(st.sensor_id), trigger)
+
+    # --- Cutoff only when k of the n sensors of the building agree ---
+    def confirm_earthquake(self, st, timestamp, peak=None):
+        if self.shards > 1:
+            self.send_decision("EARTHQUAKE", st, self.decided("EARTHQUAKE", st, timestamp, peak))
+            return
+        building = self.building_of(st.sensor_id)
+        if self.consensus is None:
+            self.emit("EARTHQUAKE", building, self.decided("EARTHQUAKE", st, timestamp, peak))
+            return
+        group = self.consensus.vote(st.sensor_id, timestamp)
+        if group is None:
+            return
+        status = self.consensus.status(group)
+        print(f"[EARTHQUAKE][controller] {group}: {status['voters']}/{status['sensors']} sensors agree "
+              f"(k = {status['required']})")
+        self.emit("EARTHQUAKE", building, self.decided("EARTHQUAKE", st, timestamp, peak))
+
+    # --- REACTIVATE of the operator (web service, broadcast warning topic): the cutoffs are re-armed ---
+    def on_operator_command(self, client, userdata, msg):
+        try:
+            self.alerts.on_command(json.loads(msg.payload.decode("utf-8")))
         except Exception as e:
-            print(f"[ERROR][controler] Failed to process incoming message: {e}")
-
-    def send_alert(self):
-        msg = json.dumps({"command": "ALARM"})
-        self.mqtt_client.publish(self.warning_topic, msg, qos=1)
-        print(f"[ALERT][controller] Sent ALARM → {self.warning_topic}")
-
-    def send_EQCutoff(self):
-        msg = json.dumps({"command": "EARTHQUAKE"})
-        self.mqtt_client.publish(self.warning_topic, msg, qos=1)
-        print(f"[ALERT][controller] Sent EARTHQUAKE → {self.warning_topic}")
+            print(f"[ERROR][controller] Failed to process operator command: {e}")
 
-    # --- Main run loop with 30-min polling ---
+    # --- Coalesce into the current incident: only escalations of a building are published ---
+    def emit(self, command, building, trigger):
+        if self.alerts is not None:
+            trigger = self.alerts.submit(command, building, trigger)
+            if trigger is None:
+                return
+        if command == "EARTHQUAKE":
+            self.send_EQCutoff(building, trigger)
+        else:
+            self.send_alert(building, trigger)
+
+    # --- Start of the alert path: timestamps carried by the warning message (correlation id) ---
+    def decided(self, command, st, timestamp, peak=None):
+        t_decision = time.time()
+        self.latency.record_between(f"{command} sample->decision", timestamp, t_decision)
+        trigger = {"sensor_id": st.sensor_id, "t_sample": timestamp, "t_decision": t_decision}
+        if peak is not None:
+            trigger["peak"] = round(peak, 3)    # PGA (Gal) or PGV of the triggering sensor
+        return trigger
+
+    def building_of(self, sensor_id):
+        """ Building of a sensor in the catalog (None -> broadcast warning). """
+        info = self.devices_info.get(sensor_id)
+        return info.get("building") if info is not None else None
+
+    # --- Warnings only go to the actuators of the building (EQ_WARNING/<region>/<building>) ---
+    def send_alert(self, building=None, trigger=None):
+        topic = self.warning_topics.for_building(building)
+        msg = warning_message("ALARM", building, trigger)
+        self.mqtt_client.publish(topic, json.dumps(msg), qos=1)
+        self.latency.record_between("ALARM decision->publish", msg.get("t_decision"), msg["t_publish"])
+        print(f"[ALERT][controller] Sent ALARM {msg['id']} → {topic}")
+
+    def send_EQCutoff(self, building=None, trigger=None):
+        topic = self.warning_topics.for_building(building)
+        msg = warning_message("EARTHQUAKE", building, trigger)
+        self.mqtt_client.publish(topic, json.dumps(msg), qos=1)
+        self.latency.record_between("EARTHQUAKE decision->publish", msg.get("t_decision"), msg["t_publish"])
+        print(f"[ALERT][controller] Sent EARTHQUAKE {msg['id']} → {topic}")
+
+    # --- Sharded worker: the coordinator merges the decisions into alerts ---
+    def send_decision(self, command, st, trigger):
+        msg = json.dumps({"command": command, "sensor_id": st.sensor_id, "sensor_type": st.sensor_type,
+                          "t": trigger["t_sample"], "t_decision": trigger["t_decision"], "peak": trigger.get("peak"),
+                          "shard": self.shard})
+        self.mqtt_client.publish(self.decision_topic, msg, qos=1)
+
+    # --- Main run loop: changes are pushed, slow full resync (sharded workers: rebalance interval) ---
     def run(self):
-        self.get_devices()
+        if not self.restored:
+            self.get_devices()
+        self.latency.start_dump()
+        if self.pipeline is not None:
+            self.pipeline.start()
+        if self.reorder is not None and self.reorder.max_hold:
+            threading.Thread(target=self.run_reorder_flush, name="reorder-flush", daemon=True).start()
+        if self.ingest_stats_interval and (self.pipeline is not None or self.reorder is not None):
+            threading.Thread(target=self.report_stats, daemon=True).start()
         self.setup_mqtt()
+        if self.restored:
+            # already subscribed to the saved topics (on_connect): the catalog only corrects them
+            self.get_devices()
+            self.sync_subscriptions()
+        if self.snapshot is not None:
+            self.snapshot.start(self)
         print("[INFO] Controller is now running...")
 
-        previous_topics = set(self.sensor_topics)
-
         try:
             while True:
-                # Wait 1 minutes
-                time.sleep(60)
+                time.sleep(self.poll_interval)
                 self.get_devices()
-                new_topics = set(self.sensor_topics)
-
-                topics_to_unsubscribe = previous_topics - new_topics
-                topics_to_subscribe = new_topics - previous_topics
-
-                for topic in topics_to_unsubscribe:
-                    self.mqtt_client.unsubscribe(topic)
-                    print(f"[INFO][controller] Unsubscribed from topic: {topic}")
-
-                for topic in topics_to_subscribe:
-                    self.mqtt_client.subscribe(topic)
-                    print(f"[INFO][controller] Subscribed to new topic: {topic}")
-
-                previous_topics = new_topics
+                self.sync_subscriptions()
 
         except KeyboardInterrupt:
             print("[INFO] Controller shutting down...")
             self.mqtt_client.loop_stop()
             self.mqtt_client.disconnect()
+            if self.pipeline is not None:
+                self.pipeline.stop()
+            if self.snapshot is not None:
+                self.snapshot.save(self)
+
+    # --- Periodic ingest / reorder counters (also in the latency dump: GET /latency of the web service) ---
+    def report_stats(self):
+        while True:
+            time.sleep(self.ingest_stats_interval)
+            if self.reorder is not None:
+                r = self.reorder.stats()
+                print(f"[STATS][controller] reorder: received {r['received']} | reordered {r['reordered']} | "
+                      f"late dropped {r['late']} | buffered {r['buffered']} | flushed {r['flushed']} "
+                      f"(lateness {self.reorder.lateness} s, max hold {self.reorder.max_hold} s)")
+            if self.pipeline is None:
+                continue
+            s = self.pipeline.stats()
+            print(f"[STATS][controller] ingest: received {s['received']} | processed {s['processed']} | "
+                  f"dropped {s['dropped']} ({self.pipeline.policy}) | depth {s['depth']} (max {s['max_depth']}) | "
+                  f"lag avg {s['lag_avg'] * 1000:.1f} ms, max {s['lag_max'] * 1000:.1f} ms")
 
 
 if __name__ == "__main__":
-    controller = Controller()
+    parser = argparse.ArgumentParser(description="Controller (or one worker of a sharded controller)")
+    parser.add_argument("--shard", type=int, default=0, help="index of this worker")
+    parser.add_argument("--shards", type=int, default=1, help="number of workers (the coordinator must run when > 1)")
+    args = parser.parse_args()
+
+    controller = Controller(args.shard, args.shards)
     controller.run()
\ No newline at end of file
@@ -0,0 +1,220 @@
+# controller_coordinator.py
+
+import paho.mqtt.client as mqtt
+import requests, json, time
+from utils.config_loader import ConfigLoader
+from utils.device_registrar import DeviceRegistrar
+from utils.topic_fetcher import TopicFetcher
+from utils.catalog_mirror import CatalogMirror
+from utils.consistent_hash import HashRing
+from utils.warning_topics import WarningTopics, warning_message
+from utils.latency_metrics import LatencyMetrics
+from services.consensus import BuildingConsensus
+from services.alert_manager import AlertManager
+
+'''
+Coordinator of the sharded controller ("sharding" -> "shards" > 1 in system_config.json):
+    python -m services.controller_coordinator
+    python -m services.controller --shard 0 --shards N    (... one per shard)
+- splits the sensors between the workers by consistent hashing of client_id and stores the
+  partition map in the Data Catalog (workers read it on every poll -> rebalance when devices change)
+- merges the decisions the workers publish on the decision topic into the alerts of the warning topic:
+  EARTHQUAKE votes go through the building consensus, then the alerts are coalesced into incidents
+  (services/alert_manager.py; without it ALARMs are forwarded once per window and building)
+'''
+
+
+class ControllerCoordinator:
+    def __init__(self):
+        # Load config
+        cfg = ConfigLoader()
+        self.catalog_url = cfg.catalog_url
+        self.mirror = CatalogMirror(self.catalog_url, types=["Velocity_Sensor", "Accelerometer_Sensor"])
+        self.mqtt_host = cfg.mqtt_host
+        self.mqtt_port = cfg.mqtt_port
+        self.shards = cfg.controller_shards
+        self.rebalance_interval = cfg.rebalance_interval
+        self.ring = HashRing(self.shards)
+        self.assignments = {}   # last partition map stored in the catalog
+        self.map_stale = False  # the last POST /set_partition_map failed: retried at every rebalance
+        self.devices_info = {}
+
+        consensus_cfg = dict(cfg.consensus_config)
+        self.consensus = None
+        if consensus_cfg.pop("enabled", False):
+            self.consensus = BuildingConsensus(**consensus_cfg)
+        self.alarm_window = consensus_cfg.get("window", 2.0)
+        self.last_alarm = {}    # building -> time of the last forwarded ALARM
+        self.latency = LatencyMetrics("controller_coordinator", cfg.latency_dir, cfg.latency_dump_interval)
+        alerts_cfg = dict(cfg.alerts_config)
+        self.alerts = None
+        if alerts_cfg.pop("enabled", False):
+            self.alerts = AlertManager(**alerts_cfg)
+            self.latency.add_counters("alerts", self.alerts.stats)
+
+        # Fetch topics
+        fetcher = TopicFetcher(self.catalog_url)
+        self.warning_topic = fetcher.get_warning_topic()
+        self.warning_topics = WarningTopics(self.warning_topic or "EQ_WARNING/", cfg.warning_regions)
+        self.decision_topic = fetcher.get_decision_topic()
+
+        # Register coordinator
+        payload = {
+            "type": "Controller",
+            "building": "Central_Unit",
+            "location": {"latitude": "Central_Unit", "longitude": "Central_Unit"}
+        }
+        registrar = DeviceRegistrar(self.catalog_url)
+        self.client_id, self.topic = registrar.register(payload)
+        self.mqtt_client = mqtt.Client(self.client_id)
+
+    # --- Partition map: sensor client_id -> worker shard ---
+    def rebalance(self):
+        try:
+            if not self.mirror.sync() and not self.map_stale:
+                return      # same sensors: same partition map
+        except Exception as e:
+            print(f"[WARN][coordinator] Could not fetch devices: {e}")
+            return
+
+        devices_info = self.devices_info = dict(self.mirror.devices)
+        if self.consensus is not None:
+            self.consensus.update_devices(devices_info)
+
+        sensors = [client_id for client_id, info in devices_info.items()
+                   if info.get("type") in ["Velocity_Sensor", "Accelerometer_Sensor"]]
+        assignments = self.ring.partition(sensors)
+        if assignments == self.assignments:
+            return
+
+        moved = sum(1 for client_id, shard in assignments.items()
+                    if client_id in self.assignments and self.assignments[client_id] != shard)
+        added = len(set(assignments) - set(self.assignments))
+        removed = len(set(self.assignments) - set(assignments))
+        try:
+            response = requests.post(f"{self.catalog_url}/set_partition_map",
+                                     json={"shards": self.shards, "assignments": assignments})
+            response.raise_for_status()
+            self.assignments = assignments
+            self.map_stale = False
+            print(f"[INFO][coordinator] Partition map v{response.json().get('version')}: {len(assignments)} sensors "
+                  f"on {self.shards} workers (+{added} / -{removed} / moved {moved})")
+        except Exception as e:
+            self.map_stale = True
+            print(f"[WARN][coordinator] Could not store partition map (retried in {self.rebalance_interval} s): {e}")
+
+    # --- MQTT setup ---
+    def setup_mqtt(self):
+        self.mqtt_client.on_connect = self.on_connect
+        self.mqtt_client.on_message = self.on_message
+        if self.alerts is not None:
+            self.mqtt_client.message_callback_add(self.warning_topics.base, self.on_operator_command)
+        self.mqtt_client.connect(self.mqtt_host, self.mqtt_port)
+        self.mqtt_client.loop_start()
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            print("[MQTT][coordinator] Connected to broker.")
+            client.subscribe(self.decision_topic, qos=1)
+            if self.alerts is not None:
+                client.subscribe(self.warning_topics.base, qos=1)   # operator REACTIVATE
+        else:
+            print(f"[ERROR][coordinator] MQTT connection failed. Return code: {rc}")
+
+    # --- Decisions of the workers ---
+    def on_message(self, client, userdata, msg):
+        try:
+            decision = json.loads(msg.payload.decode())
+            self.process_decision(decision)
+        except Exception as e:
+            print(f"[ERROR][coordinator] Failed to process decision: {e}")
+
+    # --- REACTIVATE of the operator (broadcast warning topic): the cutoffs are re-armed ---
+    def on_operator_command(self, client, userdata, msg):
+        try:
+            self.alerts.on_command(json.loads(msg.payload.decode("utf-8")))
+        except Exception as e:
+            print(f"[ERROR][coordinator] Failed to process operator command: {e}")
+
+    def process_decision(self, decision):
+        command = decision.get("command")
+        sensor_id = decision.get("sensor_id")
+        timestamp = decision.get("t", time.time())
+        building = self.devices_info.get(sensor_id, {}).get("building")
+
+        # the alert is decided here: the worker hop is measured separately
+        t_decision = time.time()
+        self.latency.record_between(f"{command} worker->coordinator", decision.get("t_decision"), t_decision)
+        self.latency.record_between(f"{command} sample->decision", decision.get("t"), t_decision)
+        trigger = {"sensor_id": sensor_id, "t_sample": decision.get("t"), "t_decision": t_decision,
+                   "peak": decision.get("peak")}
+
+        if command == "ALARM" and self.alerts is not None:
+            print(f"[coordinator][ALARM] {sensor_id} (shard {decision.get('shard')})")
+            self.emit(command, building, trigger)
+
+        elif command == "ALARM":
+            # one ALARM per building for all the sensors (and workers) that trigger in the same window
+            last = self.last_alarm.get(building)
+            if last is None or timestamp - last >= self.alarm_window:
+                print(f"[coordinator][ALARM] {sensor_id} (shard {decision.get('shard')})")
+                self.send_alert(building, trigger)
+            self.last_alarm[building] = timestamp if last is None else max(last, timestamp)
+
+        elif command == "EARTHQUAKE":
+            print(f"[EARTHQUAKE][coordinator] {sensor_id} (shard {decision.get('shard')})")
+            if self.consensus is None:
+                self.emit(command, building, trigger)
+                return
+            group = self.consensus.vote(sensor_id, timestamp)
+            if group is not None:
+                status = self.consensus.status(group)
+                print(f"[EARTHQUAKE][coordinator] {group}: {status['voters']}/{status['sensors']} sensors agree "
+                      f"(k = {status['required']})")
+                self.emit(command, building, trigger)
+        else:
+            print(f"[WARN][coordinator] Unknown decision: {command}")
+
+    def emit(self, command, building, trigger):
+        if self.alerts is not None:
+            trigger = self.alerts.submit(command, building, trigger)
+            if trigger is None:
+                return
+        if command == "EARTHQUAKE":
+            self.send_EQCutoff(building, trigger)
+        else:
+            self.send_alert(building, trigger)
+
+    def send_alert(self, building=None, trigger=None):
+        topic = self.warning_topics.for_building(building)
+        msg = warning_message("ALARM", building, trigger)
+        self.mqtt_client.publish(topic, json.dumps(msg), qos=1)
+        self.latency.record_between("ALARM decision->publish", msg.get("t_decision"), msg["t_publish"])
+        print(f"[ALERT][coordinator] Sent ALARM {msg['id']} → {topic}")
+
+    def send_EQCutoff(self, building=None, trigger=None):
+        topic = self.warning_topics.for_building(building)
+        msg = warning_message("EARTHQUAKE", building, trigger)
+        self.mqtt_client.publish(topic, json.dumps(msg), qos=1)
+        self.latency.record_between("EARTHQUAKE decision->publish", msg.get("t_decision"), msg["t_publish"])
+        print(f"[ALERT][coordinator] Sent EARTHQUAKE {msg['id']} → {topic}")
+
+    # --- Main loop: rebalance when devices are added or removed ---
+    def run(self):
+        self.rebalance()
+        self.latency.start_dump()
+        self.setup_mqtt()
+        print(f"[INFO] Controller coordinator is now running ({self.shards} workers)...")
+        try:
+            while True:
+                time.sleep(self.rebalance_interval)
+                self.rebalance()
+        except KeyboardInterrupt:
+            print("[INFO] Controller coordinator shutting down...")
+            self.mqtt_client.loop_stop()
+            self.mqtt_client.disconnect()
+
+
+if __name__ == "__main__":
+    coordinator = ControllerCoordinator()
+    coordinator.run()
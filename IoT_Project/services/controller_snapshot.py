@@ -0,0 +1,198 @@
+# controller_snapshot.py
+import glob
+import json
+import math
+import os
+import threading
+import time
+import numpy as np
+
+'''
+Warm restart of the Controller.
+Every "interval" seconds the state of the controller is written to
+    <dir>/<name>.json               meta: client_id / topic of the registration, shard, the owned sensors
+                                    (info + topic + codec, i.e. the subscriptions), window lengths
+    <dir>/<name>.<generation>.npy   one structured row per sensor: id, type, sustained threshold state,
+                                    STA/LTA ring buffers, sums, counters and flags, PGA/PGV peak history
+The .npy is written first, then the meta is replaced atomically (os.replace) and points to it:
+a crash while writing leaves the previous snapshot intact. The .npy is opened with mmap_mode="r".
+On startup the Controller registers again with the same client_id and subscribes to the saved topics
+right away (the catalog is fetched afterwards); detection state older than "max_age" seconds is not restored
+(a sustained run would span the gap).
+'''
+
+ID_LEN = 64     # "Acc_<uuid4>" is 40 characters
+
+
+def state_dtype(sta_len=0, lta_len=0, peak_len=0):
+    fields = [("sensor_id", f"U{ID_LEN}"), ("sensor_type", "U16"),
+              ("warn_start", "f8"), ("eq_start", "f8"),     # NaN = None
+              ("alarm_sent", "?"), ("eq_sent", "?")]
+    if sta_len:
+        fields += [("sta_buf", "f8", (sta_len,)), ("lta_buf", "f8", (lta_len,)),
+                   ("sums", "f8", (2,)), ("counters", "i8", (3,)), ("flags", "?", (2,))]
+    if peak_len:
+        fields += [("peaks", "f8", (peak_len,))]
+    return np.dtype(fields)
+
+
+def _time(value):
+    return math.nan if value is None else value
+
+
+def _untime(value):
+    return None if math.isnan(value) else float(value)
+
+
+class ControllerSnapshot:
+    def __init__(self, name, dir=os.path.join("data", "snapshot"), interval=5, max_age=60):
+        self.name = name
+        self.dir = dir
+        self.interval = interval
+        self.max_age = max_age
+        self.meta_path = os.path.join(dir, f"{name}.json")
+
+    # --- Write ---
+    def capture(self, controller):
+        """ -> (meta, rows) of the current state (detectors keep running: a sensor may be one sample ahead). """
+        with controller.topics_lock:
+            devices = {client_id: controller.devices_info[client_id]
+                       for client_id in controller.devices_info
+                       if controller.devices_info[client_id].get("topic") in controller.sensor_topics}
+        states = controller.states.live()
+        slots = [st.slot for st in states]
+
+        sta_lta, peaks = controller.sta_lta, controller.peaks
+        sta_len = sta_lta.sta_len if sta_lta is not None else 0
+        lta_len = sta_lta.lta_len if sta_lta is not None else 0
+        peak_len = peaks.length - 1
+        rows = np.zeros(len(states), dtype=state_dtype(sta_len, lta_len, peak_len))
+        rows["sensor_id"] = [st.sensor_id for st in states]
+        rows["sensor_type"] = [st.sensor_type for st in states]
+        rows["warn_start"] = [_time(st.warn_start) for st in states]
+        rows["eq_start"] = [_time(st.eq_start) for st in states]
+        rows["alarm_sent"] = [st.alarm_sent for st in states]
+        rows["eq_sent"] = [st.eq_sent for st in states]
+        if sta_len:
+            sta_lta.reserve(max(slots, default=-1) + 1)
+            with sta_lta.lock:
+                for field in ("sta_buf", "lta_buf", "sums", "counters", "flags"):
+                    rows[field] = getattr(sta_lta, field)[slots]
+        if peak_len:
+            peaks.reserve(max(slots, default=-1) + 1)
+            with peaks.lock:
+                rows["peaks"] = peaks.history[slots]
+
+        meta = {
+            "time": time.time(),
+            "client_id": controller.client_id,
+            "topic": controller.topic,
+            "shard": controller.shard,
+            "shards": controller.shards,
+            "devices": devices,
+            "sta_len": sta_len,
+            "lta_len": lta_len,
+            "peak_len": peak_len,
+        }
+        return meta, rows
+
+    def save(self, controller):
+        meta, rows = self.capture(controller)
+        os.makedirs(self.dir, exist_ok=True)
+        states_file = f"{self.name}.{int(meta['time'] * 1000)}.npy"
+        states_path = os.path.join(self.dir, states_file)
+        with open(f"{states_path}.tmp", "wb") as f:
+            np.save(f, rows)
+        os.replace(f"{states_path}.tmp", states_path)
+
+        meta["states"] = states_file
+        meta["count"] = len(rows)
+        with open(f"{self.meta_path}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{self.meta_path}.tmp", self.meta_path)
+
+        # the previous generations are no longer referenced
+        for path in glob.glob(os.path.join(self.dir, f"{self.name}.*.npy")):
+            if os.path.basename(path) != states_file:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return meta
+
+    def start(self, controller):
+        """ Periodic snapshot thread (interval 0 = only on shutdown). """
+        if not self.interval:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.save(controller)
+                except Exception as e:
+                    print(f"[WARN][snapshot] Could not write {self.name} snapshot: {e}")
+
+        threading.Thread(target=loop, name=f"{self.name}-snapshot", daemon=True).start()
+
+    # --- Read ---
+    def load(self, shard=0, shards=1):
+        """ -> (meta, rows) of the last snapshot of this controller, rows is None when too old or unusable. """
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if meta.get("shard") != shard or meta.get("shards") != shards:
+            print(f"[WARN][snapshot] {self.name} snapshot is of shard {meta.get('shard')}/{meta.get('shards')}, ignored")
+            return None
+
+        rows = None
+        age = time.time() - meta["time"]
+        if age <= self.max_age:
+            try:
+                rows = np.load(os.path.join(self.dir, meta["states"]), mmap_mode="r")
+                if len(rows) != meta["count"]:
+                    rows = None
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[WARN][snapshot] Could not read {self.name} detection state: {e}")
+        else:
+            print(f"[INFO][snapshot] Detection state is {age:.0f} s old (max_age {self.max_age} s), not restored")
+        return meta, rows
+
+    def restore(self, controller, meta, rows):
+        """ Subscriptions (always) and detection state (rows) into a freshly set up controller. """
+        devices = meta.get("devices", {})
+        with controller.topics_lock:
+            controller.devices_info = dict(devices)
+            for info in devices.values():
+                controller.sensor_topics.add(info["topic"])
+                controller.topic_codecs[info["topic"]] = info.get("codec")
+            if controller.consensus is not None:
+                controller.consensus.update_devices(devices)
+        if rows is None:
+            return 0
+
+        slots = []
+        for row in rows:
+            st = controller.states.get(str(row["sensor_id"]), str(row["sensor_type"]))
+            st.warn_start = _untime(row["warn_start"])
+            st.eq_start = _untime(row["eq_start"])
+            st.alarm_sent = bool(row["alarm_sent"])
+            st.eq_sent = bool(row["eq_sent"])
+            slots.append(st.slot)
+
+        n = len(rows)
+        sta_lta, peaks = controller.sta_lta, controller.peaks
+        if sta_lta is not None and meta["sta_len"] == sta_lta.sta_len and meta["lta_len"] == sta_lta.lta_len:
+            sta_lta.reserve(max(slots, default=-1) + 1)
+            with sta_lta.lock:
+                for field in ("sta_buf", "lta_buf", "sums", "counters", "flags"):
+                    getattr(sta_lta, field)[slots] = rows[field]
+        elif sta_lta is not None:
+            print("[WARN][snapshot] STA/LTA windows changed since the snapshot, STA/LTA state not restored")
+        if meta["peak_len"] and meta["peak_len"] == peaks.length - 1:
+            peaks.reserve(max(slots, default=-1) + 1)
+            with peaks.lock:
+                peaks.history[slots] = rows["peaks"]
+        return n
@@ -0,0 +1,75 @@
+# controller_state.py
+
+'''
+Per sensor detection state of the Controller.
+Every (sensor_type, sensor_id) is interned once to an integer slot and a SensorState object
+(__slots__, no per-instance dict). Messages only look the state up and update its fields in place:
+the "reset below threshold" path does not allocate anything.
+The slot is also the row of the sensor in the NumPy buffers of the detectors.
+New states are created under a lock (several ingest workers may see new sensors at the same time).
+The slots of removed sensors are cleared and reused, so the buffers do not grow as sensors come and go.
+'''
+
+import threading
+
+
+class SensorState:
+    __slots__ = ("slot", "sensor_id", "sensor_type", "warn_start", "eq_start", "alarm_sent", "eq_sent")
+
+    def __init__(self, slot, sensor_id, sensor_type):
+        self.slot = slot
+        self.sensor_id = sensor_id
+        self.sensor_type = sensor_type
+        self.reset()
+
+    def reset(self):
+        self.warn_start = None
+        self.eq_start = None
+        self.alarm_sent = False
+        self.eq_sent = False
+
+
+class SensorStateTable:
+    def __init__(self):
+        self.index = {}     # sensor_type -> {sensor_id -> SensorState}
+        self.states = []    # slot -> SensorState (None: free slot)
+        self.free = []      # slots of removed sensors
+        self.lock = threading.Lock()
+
+    def get(self, sensor_id, sensor_type):
+        by_id = self.index.get(sensor_type)
+        state = by_id.get(sensor_id) if by_id is not None else None
+        if state is not None:
+            return state
+        with self.lock:
+            by_id = self.index.setdefault(sensor_type, {})
+            state = by_id.get(sensor_id)
+            if state is None:
+                if self.free:
+                    state = SensorState(self.free.pop(), sensor_id, sensor_type)
+                    self.states[state.slot] = state
+                else:
+                    state = SensorState(len(self.states), sensor_id, sensor_type)
+                    self.states.append(state)
+                by_id[sensor_id] = state
+            return state
+
+    def remove(self, sensor_id, clear=None):
+        """ Free the slots of a removed sensor; clear(slot) resets its rows before the slot can be reused """
+        with self.lock:
+            for by_id in self.index.values():
+                state = by_id.pop(sensor_id, None)
+                if state is None:
+                    continue
+                self.states[state.slot] = None
+                if clear is not None:
+                    clear(state.slot)
+                self.free.append(state.slot)
+
+    def live(self):
+        """ -> the SensorStates in use """
+        with self.lock:
+            return [state for state in self.states if state is not None]
+
+    def __len__(self):
+        return len(self.states) - len(self.free)
@@ -0,0 +1,287 @@
+# detectors.py
+import threading
+import numpy as np
+
+'''
+Detectors of the controller. They consume the vector magnitudes of a micro-batch (one record) of a sensor,
+see services/measurements.py.
+
+Sustained thresholds (mode "threshold"): |v| >= Warning for EQ_time_check seconds -> ALARM,
+|v| >= EQ_Cutoff for EQ_time_check seconds -> EARTHQUAKE; everything is reset when |v| < Warning.
+The runs above the thresholds are found with NumPy over the whole batch, the state between the records
+is in the SensorState of the sensor (at most one ALARM and one EARTHQUAKE per record).
+Records of a single sample use the scalar update_sample (NumPy call overhead > work).
+
+STA/LTA earthquake detector (selected with "detector" -> "mode" in system_config.json).
+For each sensor the vector magnitude |v| = sqrt(x^2 + y^2 + z^2) goes into two preallocated ring buffers:
+- STA: short term average (sta_window seconds)
+- LTA: long term average (lta_window seconds)
+The running sums are updated incrementally, so every sample costs O(1) whatever the windows are
+(update_batch: cumulative sums over the LTA history + the batch, the state machine only loops when triggered).
+Rows are the sensor slots of the controller's SensorStateTable. The arrays are reallocated when they grow,
+so the updates (ingest workers), the growth and the snapshots all hold self.lock.
+- ratio = STA / LTA >= trigger_ratio   -> "trigger"   (ALARM)
+- triggered and STA >= EQ_Cutoff       -> "earthquake" (strong shaking sustained over the STA window)
+- ratio <= detrigger_ratio             -> "detrigger"
+An edge-triggered sensor only streams its pre-trigger buffer and the event itself, which alone would
+cap STA/LTA near (pre_trigger + event) / event. While it is quiet its heartbeats carry the RMS of the
+signal: seed() fills the windows with that level, so the LTA holds the background of the last
+lta_window seconds when the sensor starts streaming again.
+'''
+
+
+class SustainedThresholdDetector:
+    def __init__(self, time_check):
+        self.time_check = time_check
+
+    @staticmethod
+    def run_starts(times, above, carried):
+        """ Start time of the run above the threshold each sample belongs to (+ index of the last sample below). """
+        n = len(times)
+        idx = np.arange(n)
+        last_below = np.maximum.accumulate(np.where(above, -1, idx))
+        first = carried if carried is not None else times[0]
+        return np.where(last_below >= 0, times[np.minimum(last_below + 1, n - 1)], first), last_below
+
+    def update_sample(self, st, timestamp, mag, warning, cutoff):
+        """ One sample -> [(0, "earthquake" | "alarm")], same rules as update(). """
+        # --- Reset below threshold (in place, nothing is allocated) ---
+        if mag < warning:
+            if st.warn_start is not None or st.alarm_sent:
+                st.reset()
+            return []
+
+        # --- Above thresholds ---
+        if st.warn_start is None:
+            st.warn_start = timestamp
+        if mag >= cutoff:
+            if st.eq_start is None:
+                st.eq_start = timestamp
+        else:
+            st.eq_start = None
+
+        events = []
+        if st.eq_start is not None and not st.eq_sent and timestamp - st.eq_start >= self.time_check:
+            st.eq_sent = st.alarm_sent = True
+            events.append((0, "earthquake"))
+        if not st.alarm_sent and timestamp - st.warn_start >= self.time_check:
+            st.alarm_sent = True
+            events.append((0, "alarm"))
+        return events
+
+    def update(self, st, times, mags, warning, cutoff):
+        """ -> [(index, "earthquake" | "alarm")] of the batch, st is updated in place. """
+        above_warn = mags >= warning
+        if not above_warn.any():
+            # --- Reset below threshold ---
+            if st.warn_start is not None or st.alarm_sent:
+                st.reset()
+            return []
+
+        above_eq = mags >= cutoff
+        warn_start, last_below = self.run_starts(times, above_warn, st.warn_start)
+        eq_start, _ = self.run_starts(times, above_eq, st.eq_start)
+        reset = last_below >= 0     # a sample below Warning at or before i: sent flags cleared
+
+        events = []
+        eq_ok = above_eq & (times - eq_start >= self.time_check) & (reset | (not st.eq_sent))
+        eq_i = int(eq_ok.argmax()) if eq_ok.any() else None
+        alarm_ok = above_warn & (times - warn_start >= self.time_check) & (reset | (not st.alarm_sent))
+        if eq_i is not None:
+            alarm_ok[eq_i:] = False     # the EARTHQUAKE also counts as the ALARM
+            events.append((eq_i, "earthquake"))
+        alarm_i = int(alarm_ok.argmax()) if alarm_ok.any() else None
+        if alarm_i is not None:
+            events.append((alarm_i, "alarm"))
+
+        # --- State after the last sample ---
+        if not above_warn[-1]:
+            st.reset()
+            return events
+        last_reset = last_below[-1]
+        st.warn_start = float(warn_start[-1])
+        st.eq_start = float(eq_start[-1]) if above_eq[-1] else None
+        st.eq_sent = (eq_i is not None and eq_i > last_reset) or (st.eq_sent and last_reset < 0)
+        st.alarm_sent = (st.eq_sent or (alarm_i is not None and alarm_i > last_reset)
+                         or (st.alarm_sent and last_reset < 0))
+        return events
+
+
+class StaLtaDetector:
+    def __init__(self, interval, sta_window=0.5, lta_window=10.0, trigger_ratio=4.0,
+                 detrigger_ratio=1.5, capacity=1024):
+        self.sta_len = max(1, int(round(sta_window / interval)))
+        self.lta_len = max(self.sta_len + 1, int(round(lta_window / interval)))
+        self.min_fill = 2 * self.sta_len    # samples needed before the ratio is trusted
+        self.trigger_ratio = trigger_ratio
+        self.detrigger_ratio = detrigger_ratio
+        self.capacity = 0
+        self.lock = threading.Lock()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = self.capacity
+        sta_buf = np.zeros((capacity, self.sta_len))
+        lta_buf = np.zeros((capacity, self.lta_len))
+        sums = np.zeros((capacity, 2))                    # STA sum, LTA sum
+        counters = np.zeros((capacity, 3), dtype=np.int64)  # STA position, LTA position, samples seen
+        flags = np.zeros((capacity, 2), dtype=bool)       # triggered, earthquake reported
+        if old:
+            sta_buf[:old], lta_buf[:old] = self.sta_buf[:old], self.lta_buf[:old]
+            sums[:old], counters[:old], flags[:old] = self.sums[:old], self.counters[:old], self.flags[:old]
+        self.sta_buf, self.lta_buf = sta_buf, lta_buf
+        self.sums, self.counters, self.flags = sums, counters, flags
+        self.capacity = capacity
+
+    def reserve(self, count):
+        """ Room for "count" sensors up front (the buffers are not reallocated while samples arrive). """
+        with self.lock:
+            if count > self.capacity:
+                self._allocate(max(2 * self.capacity, count))
+
+    def clear(self, slot):
+        """ Slot of a removed sensor, before it is given to another one """
+        with self.lock:
+            if slot < self.capacity:
+                self.sta_buf[slot] = self.lta_buf[slot] = self.sums[slot] = 0.0
+                self.counters[slot] = 0
+                self.flags[slot] = False
+
+    def ratio(self, slot):
+        seen = self.counters[slot, 2]
+        if seen < self.min_fill:
+            return 0.0
+        lta = self.sums[slot, 1] / min(seen, self.lta_len)
+        sta = self.sums[slot, 0] / self.sta_len
+        return sta / lta if lta > 0 else 0.0
+
+    def sta(self, slot):
+        return self.sums[slot, 0] / self.sta_len
+
+    def update_batch(self, slot, mags, eq_cutoff):
+        """ Magnitudes (n,) of one sensor -> [(index, "trigger" | "earthquake" | "detrigger")] """
+        with self.lock:
+            if slot >= self.capacity:
+                self._allocate(max(2 * self.capacity, slot + 1))
+            return self._update_batch(slot, mags, eq_cutoff)
+
+    def _update_batch(self, slot, mags, eq_cutoff):
+        n = len(mags)
+        S, L = self.sta_len, self.lta_len
+        counters, sums = self.counters[slot], self.sums[slot]
+        p_sta, p_lta, seen0 = counters.tolist()
+        sta_total, lta_total = sums.tolist()
+
+        if n <= S:
+            # usual case: the samples leaving the windows are all in the ring buffers
+            # (slices when the batch does not wrap around the end of a ring, index arrays otherwise)
+            sta_buf, lta_buf = self.sta_buf[slot], self.lta_buf[slot]
+            sta_pos = slice(p_sta, p_sta + n) if p_sta + n <= S else np.arange(p_sta, p_sta + n) % S
+            lta_pos = slice(p_lta, p_lta + n) if p_lta + n <= L else np.arange(p_lta, p_lta + n) % L
+            sta_sum = np.cumsum(mags - sta_buf[sta_pos])
+            sta_sum += sta_total
+            lta_sum = np.cumsum(mags - lta_buf[lta_pos])
+            lta_sum += lta_total
+            sta_buf[sta_pos] = mags
+            lta_buf[lta_pos] = mags
+            counters[0], counters[1] = (p_sta + n) % S, (p_lta + n) % L
+            if p_lta + n >= L:
+                # once per LTA window: exact sums, so rounding errors do not pile up
+                sums[0], sums[1] = sta_buf.sum(), lta_buf.sum()
+            else:
+                sums[0], sums[1] = sta_sum[-1], lta_sum[-1]
+        else:
+            # long batch: LTA history (oldest first) + the batch, windows from the cumulative sums
+            history = np.concatenate((np.roll(self.lta_buf[slot], -p_lta), mags))
+            csum = np.concatenate(([0.0], np.cumsum(history)))
+            end = np.arange(L + 1, L + n + 1)
+            sta_sum = csum[end] - csum[end - S]
+            lta_sum = csum[end] - csum[end - L]
+            self.sta_buf[slot] = history[-S:]
+            self.lta_buf[slot] = history[-L:]
+            counters[0] = counters[1] = 0
+            sums[0], sums[1] = sta_sum[-1], lta_sum[-1]
+        counters[2] = seen0 + n
+
+        flags = self.flags[slot]
+        triggered, reported = flags.tolist()
+        if seen0 + n < self.min_fill:
+            return []
+        sta = sta_sum / S
+        if seen0 >= L:
+            lta = lta_sum / L
+        else:
+            lta = lta_sum / np.minimum(np.arange(seen0 + 1, seen0 + n + 1), L)
+        if not triggered and (sta < self.trigger_ratio * lta).all():
+            return []   # quiet sensor: no ratio to compute
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(lta > 0, sta / lta, 0.0)
+        if seen0 < self.min_fill:
+            ratio[:self.min_fill - seen0 - 1] = 0.0     # samples before the windows were filled
+        events = []
+        for i, (r, s) in enumerate(zip(ratio.tolist(), sta.tolist())):
+            if not triggered:
+                if r >= self.trigger_ratio:
+                    triggered = True
+                    events.append((i, "trigger"))
+                continue
+            if r <= self.detrigger_ratio:
+                triggered = reported = False
+                events.append((i, "detrigger"))
+            elif not reported and s >= eq_cutoff:
+                reported = True
+                events.append((i, "earthquake"))
+        flags[0], flags[1] = triggered, reported
+        return events
+
+    def seed(self, slot, level, count):
+        """ Background level of a quiet sensor (heartbeat RMS of the last "count" samples) -> the windows.
+        A quiet sensor is not triggered: no events, the trigger state is cleared. """
+        with self.lock:
+            if slot >= self.capacity:
+                self._allocate(max(2 * self.capacity, slot + 1))
+            self._update_batch(slot, np.full(min(count, self.lta_len), level), np.inf)
+            self.flags[slot] = False
+
+    def update(self, slot, magnitude, eq_cutoff):
+        """ Feed the vector magnitude of one sample, returns None, "trigger", "earthquake" or "detrigger".
+        (single sample records; batches go through update_batch) """
+        with self.lock:
+            if slot >= self.capacity:
+                self._allocate(max(2 * self.capacity, slot + 1))
+            return self._update(slot, magnitude, eq_cutoff)
+
+    def _update(self, slot, magnitude, eq_cutoff):
+        sums, counters = self.sums[slot], self.counters[slot]
+
+        i = counters[0]
+        sums[0] += magnitude - self.sta_buf[slot, i]
+        self.sta_buf[slot, i] = magnitude
+        counters[0] = (i + 1) % self.sta_len
+
+        j = counters[1]
+        sums[1] += magnitude - self.lta_buf[slot, j]
+        self.lta_buf[slot, j] = magnitude
+        counters[1] = (j + 1) % self.lta_len
+        counters[2] += 1
+        if counters[1] == 0:
+            # once per LTA window: recompute the sums, so rounding errors do not pile up
+            sums[0] = self.sta_buf[slot].sum()
+            sums[1] = self.lta_buf[slot].sum()
+
+        flags = self.flags[slot]
+        ratio = self.ratio(slot)
+        if not flags[0]:
+            if ratio >= self.trigger_ratio:
+                flags[0] = True
+                return "trigger"
+            return None
+
+        if ratio <= self.detrigger_ratio:
+            flags[0] = False
+            flags[1] = False
+            return "detrigger"
+        if not flags[1] and self.sta(slot) >= eq_cutoff:
+            flags[1] = True
+            return "earthquake"
+        return None
@@ -0,0 +1,149 @@
+# device_index.py
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+'''
+In-memory indexes of the Data Catalog devices, updated on every register / delete:
+    by_type, by_building, by_topic      exact match -> client_ids
+    by_type_building                    (type, building) -> client_ids (devices of a type in a building)
+    ids                                 sorted client_ids: id prefix ranges and the pagination cursor
+    latitudes                           sorted (latitude, client_id) of the numeric locations: bounding boxes
+query() starts from the smallest candidate set of the given filters and checks the other filters on it,
+so the cost follows the size of the result, not the size of the fleet.
+Results are ordered by client_id; "cursor" is the last client_id of the previous page.
+'''
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None     # ex. "Central_Unit" of the services
+
+
+class DeviceIndex:
+    def __init__(self, devices=None):
+        self.devices = {}
+        self.by_type = {}
+        self.by_building = {}
+        self.by_topic = {}
+        self.by_type_building = {}
+        self.ids = []
+        self.latitudes = []
+        self.lock = threading.Lock()
+        for client_id, info in (devices or {}).items():
+            self.add(client_id, info)
+
+    @staticmethod
+    def _location(info):
+        location = info.get("location") or {}
+        return _number(location.get("latitude")), _number(location.get("longitude"))
+
+    def add(self, client_id, info):
+        with self.lock:
+            if client_id in self.devices:
+                self._remove(client_id)
+            self.devices[client_id] = info
+            self.by_type.setdefault(info.get("type"), set()).add(client_id)
+            self.by_building.setdefault(info.get("building"), set()).add(client_id)
+            self.by_type_building.setdefault((info.get("type"), info.get("building")), set()).add(client_id)
+            if info.get("topic"):
+                self.by_topic[info["topic"]] = client_id
+            insort(self.ids, client_id)
+            latitude, longitude = self._location(info)
+            if latitude is not None and longitude is not None:
+                insort(self.latitudes, (latitude, client_id))
+
+    def remove(self, client_id):
+        with self.lock:
+            return self._remove(client_id)
+
+    def _remove(self, client_id):
+        info = self.devices.pop(client_id, None)
+        if info is None:
+            return False
+        for index, key in ((self.by_type, info.get("type")), (self.by_building, info.get("building")),
+                           (self.by_type_building, (info.get("type"), info.get("building")))):
+            members = index.get(key)
+            if members is not None:
+                members.discard(client_id)
+                if not members:
+                    del index[key]
+        if self.by_topic.get(info.get("topic")) == client_id:
+            del self.by_topic[info["topic"]]
+        del self.ids[bisect_left(self.ids, client_id)]
+        latitude, longitude = self._location(info)
+        if latitude is not None and longitude is not None:
+            del self.latitudes[bisect_left(self.latitudes, (latitude, client_id))]
+        return True
+
+    def __contains__(self, client_id):
+        return client_id in self.devices
+
+    def __len__(self):
+        return len(self.devices)
+
+    def all(self):
+        with self.lock:
+            return dict(self.devices)
+
+    def query(self, types=None, building=None, topic=None, prefix=None, bbox=None, limit=None, cursor=None):
+        """
+        types: list of device types, bbox: (min_lat, min_lon, max_lat, max_lon), limit/cursor: pagination
+        -> ({client_id: info} ordered by client_id, next cursor or None)
+        """
+        with self.lock:
+            # (size, ids of the filter) for every filter; only the smallest one is materialized and scanned
+            candidates = []
+            if types is not None:
+                if building is not None:
+                    sets = [self.by_type_building.get((t, building), ()) for t in types]
+                else:
+                    sets = [self.by_type.get(t, ()) for t in types]
+                candidates.append((sum(len(s) for s in sets), lambda: [i for s in sets for i in s]))
+            if building is not None:
+                members = self.by_building.get(building, ())
+                candidates.append((len(members), lambda: members))
+            if topic is not None:
+                client_id = self.by_topic.get(topic)
+                candidates.append((1 if client_id else 0, lambda: [client_id] if client_id else []))
+            if prefix:
+                p_lo = bisect_left(self.ids, prefix)
+                p_hi = bisect_left(self.ids, prefix + "\U0010ffff", p_lo)
+                candidates.append((p_hi - p_lo, lambda: self.ids[p_lo:p_hi]))
+            if bbox is not None:
+                min_lat, min_lon, max_lat, max_lon = bbox
+                b_lo = bisect_left(self.latitudes, (min_lat,))
+                b_hi = bisect_right(self.latitudes, (max_lat, "\U0010ffff"), b_lo)
+                candidates.append((b_hi - b_lo, lambda: [i for _, i in self.latitudes[b_lo:b_hi]]))
+
+            if candidates:
+                ids = sorted(min(candidates, key=lambda c: c[0])[1]())
+            else:
+                ids = self.ids      # already sorted
+            start = bisect_right(ids, cursor) if cursor else 0
+
+            type_set = set(types) if types is not None else None
+            result = {}
+            next_cursor = last = None
+            for client_id in ids[start:] if start else ids:
+                info = self.devices[client_id]
+                if type_set is not None and info.get("type") not in type_set:
+                    continue
+                if building is not None and info.get("building") != building:
+                    continue
+                if topic is not None and info.get("topic") != topic:
+                    continue
+                if prefix and not client_id.startswith(prefix):
+                    continue
+                if bbox is not None:
+                    latitude, longitude = self._location(info)
+                    if latitude is None or longitude is None or not (
+                            min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon):
+                        continue
+                if limit is not None and len(result) >= limit:
+                    next_cursor = last      # more results after this page
+                    break
+                result[client_id] = info
+                last = client_id
+            return result, next_cursor
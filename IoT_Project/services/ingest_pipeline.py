@@ -0,0 +1,165 @@
+# ingest_pipeline.py
+import threading
+import time
+import zlib
+from collections import deque
+
+'''
+Ingest stage between the MQTT network thread and the detection:
+- the paho callback only calls put(topic, payload): O(1), no decoding
+- each worker thread owns a bounded ring queue; a topic always goes to the same worker
+  (crc32 of the topic), so the samples of one sensor are processed in order
+- workers take up to "batch" messages per lock and call handler(topic, payload) for each
+Overflow policy when a queue is full:
+    drop_oldest  - the oldest queued message is dropped (fresh data wins, default)
+    drop_newest  - the incoming message is dropped
+    block        - the network thread waits for space (backpressure to the broker)
+Counters: received, processed, dropped, queue depth (current / max) and lag (enqueue -> processing).
+Each partition keeps its own counters under its lock (workers never share one); stats() sums them.
+'''
+
+POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+class _Partition:
+    __slots__ = ("queue", "lock", "not_empty", "not_full", "drained",
+                 "received", "processed", "dropped", "max_depth", "lag_sum", "lag_max")
+
+    def __init__(self):
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.drained = threading.Condition(self.lock)     # a batch was processed (join)
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+
+    def done(self):
+        return not self.queue and self.processed + self.dropped >= self.received
+
+
+class IngestPipeline:
+    def __init__(self, handler, capacity=10000, policy="drop_oldest", workers=1, batch=64, name="ingest"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy} (expected one of {POLICIES})")
+        self.handler = handler
+        self.policy = policy
+        self.batch = batch
+        self.name = name
+        self.capacity = max(1, capacity // workers)     # per worker
+        self.partitions = [_Partition() for _ in range(workers)]
+        self.running = False
+        self.threads = []
+        self.last = (0, 0.0)    # processed, lag_sum at the previous stats()
+
+    # --- Network thread ---
+    def put(self, topic, payload):
+        part = self.partitions[zlib.crc32(topic.encode()) % len(self.partitions)] \
+            if len(self.partitions) > 1 else self.partitions[0]
+        with part.lock:
+            part.received += 1
+            queue = part.queue
+            if len(queue) >= self.capacity:
+                if self.policy == "drop_newest":
+                    part.dropped += 1
+                    return False
+                if self.policy == "drop_oldest":
+                    queue.popleft()
+                    part.dropped += 1
+                else:
+                    while len(queue) >= self.capacity and self.running:
+                        part.not_full.wait(0.5)
+            queue.append((time.monotonic(), topic, payload))
+            if len(queue) > part.max_depth:
+                part.max_depth = len(queue)
+            part.not_empty.notify()
+        return True
+
+    # --- Workers ---
+    def start(self):
+        self.running = True
+        for i, part in enumerate(self.partitions):
+            t = threading.Thread(target=self.work, args=(part,), name=f"{self.name}-worker-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def stop(self):
+        self.running = False
+        for part in self.partitions:
+            with part.lock:
+                part.not_empty.notify_all()
+                part.not_full.notify_all()
+        for t in self.threads:
+            t.join()
+        self.threads = []
+
+    def work(self, part):
+        queue = part.queue
+        while True:
+            with part.lock:
+                while not queue and self.running:
+                    part.not_empty.wait()
+                if not queue:
+                    return      # stopped and drained
+                items = [queue.popleft() for _ in range(min(self.batch, len(queue)))]
+                part.not_full.notify_all()
+
+            now = time.monotonic()
+            lag_sum, lag_max = 0.0, 0.0
+            for enqueued, topic, payload in items:
+                lag = now - enqueued
+                lag_sum += lag
+                if lag > lag_max:
+                    lag_max = lag
+                try:
+                    self.handler(topic, payload)
+                except Exception as e:
+                    print(f"[ERROR][{self.name}] Failed to process message from {topic}: {e}")
+            with part.lock:
+                part.processed += len(items)
+                part.lag_sum += lag_sum
+                if lag_max > part.lag_max:
+                    part.lag_max = lag_max
+                part.drained.notify_all()
+
+    def join(self, timeout=None):
+        """ Wait until every queued message is processed (tests and benchmarks). """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for part in self.partitions:
+            with part.lock:
+                while not part.done():
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    part.drained.wait(remaining)
+        return True
+
+    # --- Counters ---
+    def depth(self):
+        return sum(len(part.queue) for part in self.partitions)
+
+    def stats(self, reset=True):
+        """ Totals since the start; max depth and lag since the previous stats(reset=True). """
+        totals = {"received": 0, "processed": 0, "dropped": 0, "depth": 0, "max_depth": 0, "lag_max": 0.0}
+        lag_sum = 0.0
+        for part in self.partitions:
+            with part.lock:
+                totals["received"] += part.received
+                totals["processed"] += part.processed
+                totals["dropped"] += part.dropped
+                totals["depth"] += len(part.queue)
+                totals["max_depth"] = max(totals["max_depth"], part.max_depth)
+                totals["lag_max"] = max(totals["lag_max"], part.lag_max)
+                lag_sum += part.lag_sum
+                if reset:
+                    part.max_depth = len(part.queue)
+                    part.lag_max = 0.0
+        count = totals["processed"] - self.last[0]
+        totals["lag_avg"] = (lag_sum - self.last[1]) / count if count else 0.0
+        if reset:
+            self.last = (totals["processed"], lag_sum)
+        return totals
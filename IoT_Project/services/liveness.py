@@ -0,0 +1,121 @@
+# liveness.py
+import heapq
+import threading
+import time
+
+'''
+Liveness of the Data Catalog devices: every tracked device must send a heartbeat within its TTL,
+otherwise it is expired (its process crashed or lost the network) and the catalog evicts it.
+    deadlines   client_id -> time of expiry, moved forward by every heartbeat (O(1), no heap push)
+    heap        (deadline, generation, client_id), one live entry per device, the next expiry on top
+The timer thread sleeps until the top deadline. An entry whose device got a heartbeat since is pushed
+back with its current deadline, a removed device is dropped (lazy deletion): a device costs one
+O(log n) heap operation per TTL, whatever its heartbeat rate, and nothing ever scans all the devices.
+Every track() of an untracked device gets a new generation: the entry left by an untrack() of the same
+id (deleted, then registered again) is stale and dropped when it comes up, never pushed back.
+'''
+
+
+class LivenessTracker:
+    def __init__(self, on_expire, ttl=30.0):
+        """ on_expire(client_ids): called from the timer thread with the expired devices """
+        self.on_expire = on_expire
+        self.ttl = ttl
+        self.deadlines = {}
+        self.ttls = {}
+        self.generations = {}   # client_id -> generation of its live heap entry
+        self.generation = 0
+        self.heap = []
+        self.cond = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.beats = 0
+        self.expired = 0
+
+    def track(self, client_id, ttl=None, now=None):
+        """ Start (or restart) the TTL of a device; ttl None -> the default one """
+        ttl = self.ttl if ttl is None else ttl
+        deadline = (time.time() if now is None else now) + ttl
+        with self.cond:
+            known = client_id in self.deadlines
+            self.deadlines[client_id] = deadline
+            self.ttls[client_id] = ttl
+            if not known:
+                self.generation += 1
+                self.generations[client_id] = self.generation
+                heapq.heappush(self.heap, (deadline, self.generation, client_id))
+                if self.heap[0][2] == client_id:
+                    self.cond.notify()      # earlier than the deadline the timer waits for
+
+    def untrack(self, client_id):
+        with self.cond:
+            self.ttls.pop(client_id, None)
+            self.generations.pop(client_id, None)
+            return self.deadlines.pop(client_id, None) is not None    # heap entry dropped when popped
+
+    def beat(self, client_ids, now=None):
+        """ Heartbeat of a batch of devices -> the ids that are not tracked (unknown or already expired) """
+        now = time.time() if now is None else now
+        unknown = []
+        with self.cond:
+            for client_id in client_ids:
+                if client_id in self.deadlines:
+                    self.deadlines[client_id] = now + self.ttls[client_id]
+                else:
+                    unknown.append(client_id)
+            self.beats += len(client_ids) - len(unknown)
+        return unknown
+
+    def __contains__(self, client_id):
+        return client_id in self.deadlines
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def pop_expired(self, now=None):
+        """ Remove and return the devices whose deadline has passed """
+        now = time.time() if now is None else now
+        expired = []
+        with self.cond:
+            heap = self.heap
+            while heap and heap[0][0] <= now:
+                _, generation, client_id = heapq.heappop(heap)
+                if self.generations.get(client_id) != generation:
+                    continue                    # untracked (maybe tracked again since): lazy deletion
+                deadline = self.deadlines[client_id]
+                if deadline > now:
+                    heapq.heappush(heap, (deadline, generation, client_id))     # got heartbeats since
+                    continue
+                del self.deadlines[client_id]
+                del self.ttls[client_id]
+                del self.generations[client_id]
+                expired.append(client_id)
+            self.expired += len(expired)
+        return expired
+
+    def _run(self):
+        while self.running:
+            with self.cond:
+                delay = self.heap[0][0] - time.time() if self.heap else self.ttl
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+            expired = self.pop_expired()
+            if expired:
+                try:
+                    self.on_expire(expired)
+                except Exception as e:
+                    print(f"[ERROR][liveness] Eviction failed: {e}")
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="liveness", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    def stats(self):
+        return {"tracked": len(self.deadlines), "heap": len(self.heap), "beats": self.beats, "expired": self.expired}
@@ -0,0 +1,94 @@
+# measurements.py
+import threading
+import numpy as np
+
+'''
+Measurement stage of the Controller: the samples of one record (micro-batch of a sensor) are turned into
+NumPy arrays once, then
+- vector magnitude of each sample:  |v| = sqrt(x^2 + y^2 + z^2)   ("components": "xyz")
+                                    or the horizontal one sqrt(x^2 + y^2)  ("xy")
+- sliding-window peak of |v| over the last "peak_window" seconds (PGA for accelerometers, PGV for velocity
+  sensors), the window continues across the records of the sensor.
+The detectors consume the magnitudes, the peak goes with the decisions (warning messages).
+'''
+
+COMPONENTS = {"xyz": [0, 1, 2], "xy": [0, 1]}
+
+
+def record_arrays(entries):
+    """ SenML entries -> times (n,), values (n, 3); a missing axis is 0.0 """
+    flat = []
+    for entry in entries:
+        v = entry["v"]
+        flat += (entry["t"], v.get("x", 0.0), v.get("y", 0.0), v.get("z", 0.0))
+    rows = np.array(flat).reshape(len(entries), 4)     # one conversion for the whole batch
+    return rows[:, 0], rows[:, 1:]
+
+
+def magnitudes(values, components="xyz"):
+    if components != "xyz":
+        values = values[:, COMPONENTS[components]]
+    return np.sqrt(np.einsum("ij,ij->i", values, values))
+
+
+class PeakTracker:
+    # the rows of all the sensors are one array that is reallocated when it grows: every access to it
+    # (updates of the ingest workers, growth, snapshots) holds self.lock
+    def __init__(self, interval, peak_window=0.3, capacity=1024):
+        self.length = max(1, int(round(peak_window / interval)))
+        self.capacity = 0
+        self.lock = threading.Lock()
+        self._allocate(capacity)
+
+    def reserve(self, count):
+        with self.lock:
+            if count > self.capacity:
+                self._allocate(max(2 * self.capacity, count))
+
+    def _allocate(self, capacity):
+        # last (length - 1) magnitudes of each sensor slot, oldest first
+        history = np.zeros((capacity, self.length - 1))
+        if self.capacity:
+            history[:self.capacity] = self.history
+        self.history = history
+        self.capacity = capacity
+
+    def clear(self, slot):
+        """ Slot of a removed sensor, before it is given to another one """
+        with self.lock:
+            if slot < self.capacity:
+                self.history[slot] = 0.0
+
+    def update_sample(self, slot, mag):
+        """ Single sample record -> peak of the window ending at it. """
+        if self.length == 1:
+            return mag
+        with self.lock:
+            if slot >= self.capacity:
+                self._allocate(max(2 * self.capacity, slot + 1))
+            history = self.history[slot]
+            peak = max(mag, history.max())
+            history[:-1] = history[1:]
+            history[-1] = mag
+            return peak
+
+    def update(self, slot, mags):
+        """ mags (n,) of one sensor -> peak of the window ending at each sample (n,) """
+        if self.length == 1:
+            return mags
+        with self.lock:
+            if slot >= self.capacity:
+                self._allocate(max(2 * self.capacity, slot + 1))
+            history = self.history[slot]
+            n = len(mags)
+            if n < self.length:
+                # window of sample i = history[i:] + mags[:i + 1] (the usual case: batch shorter than the window)
+                suffix_max = np.maximum.accumulate(history[::-1])[::-1]
+                peaks = np.maximum(suffix_max[:n], np.maximum.accumulate(mags))
+                history[:-n] = history[n:]
+                history[-n:] = mags
+                return peaks
+            window = np.concatenate((history, mags))
+            peaks = np.lib.stride_tricks.sliding_window_view(window, self.length).max(axis=1)
+            history[:] = window[-(self.length - 1):]
+            return peaks
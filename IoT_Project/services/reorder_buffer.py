@@ -0,0 +1,103 @@
+# reorder_buffer.py
+from bisect import bisect_right
+
+'''
+Reorder stage of the Controller: samples of a sensor reach the detectors in timestamp ("t") order.
+QoS 0 and several MQTT connections per sensor process deliver records out of order under load.
+Per sensor, samples wait in a sorted list until the watermark passes them (in order records, the usual
+case, are only appended; an out of order sample is inserted with bisect):
+    watermark = newest sample t - lateness
+Samples older than the last released one are dropped (counted as late): the detectors never go back in time.
+Heartbeats of quiet edge-triggered sensors advance the watermark too (the last samples of a trigger
+do not wait for the next one); a sensor never holds more than "capacity" samples.
+lateness = 0 only drops the late samples (no extra detection delay).
+A sensor that stops sending (few records, edge trigger without heartbeats) would hold its last samples
+forever: flush() runs every max_hold / 2 seconds (wall clock) and releases the samples that were already
+held at the previous flush, so no sample waits more than about "max_hold" seconds for a newer one.
+Counters: received, reordered (accepted out of order), late (dropped), buffered, flushed.
+Each sensor is fed by a single ingest worker (topic -> worker); the Controller calls push() and flush() of
+a sensor under the same lock, so the released samples of a sensor reach the detectors in order.
+'''
+
+
+class _SensorBuffer:
+    __slots__ = ("times", "entries", "max_t", "released_t", "flush_t", "received", "reordered", "late", "flushed")
+
+    def __init__(self):
+        self.times = []                     # sorted; equal timestamps keep their arrival order
+        self.entries = []
+        self.max_t = float("-inf")          # newest sample seen
+        self.released_t = float("-inf")     # newest sample given to the detectors
+        self.flush_t = float("-inf")        # newest sample seen at the previous flush
+        self.received = 0
+        self.reordered = 0
+        self.late = 0
+        self.flushed = 0
+
+
+class ReorderBuffer:
+    def __init__(self, lateness=0.1, capacity=1000, max_hold=1.0):
+        self.lateness = lateness
+        self.capacity = capacity
+        self.max_hold = max_hold
+        self.buffers = {}       # sensor_id -> _SensorBuffer
+
+    def push(self, sensor_id, entries, heartbeat_t=None):
+        """ SenML entries of one record -> the entries released by the watermark, in timestamp order. """
+        buf = self.buffers.get(sensor_id)
+        if buf is None:
+            buf = self.buffers.setdefault(sensor_id, _SensorBuffer())
+        times, held = buf.times, buf.entries
+        buf.received += len(entries)
+        for entry in entries:
+            t = entry["t"]
+            if t >= buf.max_t:
+                buf.max_t = t
+                times.append(t)
+                held.append(entry)
+            elif t < buf.released_t:
+                buf.late += 1
+            else:
+                buf.reordered += 1
+                i = bisect_right(times, t)
+                times.insert(i, t)
+                held.insert(i, entry)
+
+        watermark = buf.max_t if heartbeat_t is None else max(buf.max_t, heartbeat_t)
+        return self._release(buf, max(bisect_right(times, watermark - self.lateness), len(times) - self.capacity))
+
+    @staticmethod
+    def _release(buf, cut):
+        if cut <= 0:
+            return []
+        released = buf.entries[:cut]
+        buf.released_t = buf.times[cut - 1]
+        del buf.times[:cut], buf.entries[:cut]
+        return released
+
+    def pending(self):
+        """ sensor_ids holding samples """
+        return [sensor_id for sensor_id, buf in list(self.buffers.items()) if buf.times]
+
+    def flush(self, sensor_id, everything=False):
+        """ Samples of the sensor held since the previous flush (all of them: everything=True), in order """
+        buf = self.buffers.get(sensor_id)
+        if buf is None:
+            return []
+        cut = len(buf.times) if everything else bisect_right(buf.times, buf.flush_t)
+        buf.flush_t = buf.max_t
+        buf.flushed += max(cut, 0)
+        return self._release(buf, cut)
+
+    def remove(self, sensor_id):
+        self.buffers.pop(sensor_id, None)
+
+    def stats(self):
+        buffers = list(self.buffers.values())
+        return {
+            "received": sum(b.received for b in buffers),
+            "reordered": sum(b.reordered for b in buffers),
+            "late": sum(b.late for b in buffers),
+            "buffered": sum(len(b.times) for b in buffers),
+            "flushed": sum(b.flushed for b in buffers),
+        }
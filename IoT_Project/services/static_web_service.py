@@ -8,10 +8,15 @@ from utils.device_registrar import DeviceRegistrar
 from utils.topic_fetcher import TopicFetcher
 from utils.device_manager import DeviceManager
 from utils.sensor_storage import SensorStorage
+from utils.payload_codec import decode_payload
+from utils.catalog_watcher import CatalogWatcher
+from utils.catalog_mirror import CatalogMirror
+from utils.latency_metrics import load_dumps
 
 class StaticWebService:
     def __init__(self):
         self.sensor_storage = SensorStorage()
+        self.topic_codecs = {}      # topic -> payload codec advertised in the catalog
         # --- FILE PATHS ---
         self.dC_file = os.path.join("config", "Data_Catalogue.json")
         
@@ -36,15 +41,19 @@ class StaticWebService:
         # Load config from file
         cfg = ConfigLoader()
         self.catalog_url = cfg.catalog_url
+        self.mirror = CatalogMirror(self.catalog_url)
         self.static_web_url = cfg.static_web_url
         self.mqtt_host = cfg.mqtt_host
         self.mqtt_port = cfg.mqtt_port
         self.config_data["thresholds"] = cfg.thresholds_config
+        self.catalog_resync_interval = cfg.catalog_resync_interval
+        self.latency_dir = cfg.latency_dir
     
         #Fetch topics.
         fetcher = TopicFetcher(self.catalog_url)
         self.adjust_topic = fetcher.get_adjust_topic()
         self.warning_topic = fetcher.get_warning_topic()
+        self.catalog_topic = fetcher.get_catalog_topic()
 
         # Register the Static_Web_Service on the Data Catalog
         registrar = DeviceRegistrar(self.catalog_url)
@@ -57,40 +66,72 @@ class StaticWebService:
         self.mqtt_client = mqtt.Client(self.client_id)
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
+        # devices registered / deleted are pushed by the catalog
+        self.watcher = None
+        if self.catalog_topic:
+            self.watcher = CatalogWatcher(self.mqtt_client, self.catalog_topic, self.on_device_change)
 
     # --- Save JSON files ---
-    def save_json_file(self):
-        self.get_devices()
+    def save_json_file(self, refresh=True):
+        if refresh:
+            self.get_devices()
         with open(self.dC_file, "w") as f:
             json.dump(self.config_data, f, indent=2)
 
-    # --- Load device list and topics from the catalog ---  
+    # --- Load device list and topics from the catalog (only the changes since the last call) ---  
     def get_devices(self):
-        url = f"{self.catalog_url}/get_devices"
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            devices = response.json()
-            self.config_data["devices"] = devices #with all information exists in catalog for each device.
-
-            buildings = set()
-            topics = set()
-            for device_id, info in devices.items():
-                buildings.add(info["building"])
-                topics.add(info["topic"])
-
-            self.config_data["Buildings"] = list(buildings)
-            self.config_data["topics"] = list(topics)
+            if not self.mirror.sync():
+                return
+            self.config_data["devices"] = dict(self.mirror.devices) #with all information exists in catalog for each device.
+            self.update_topics()
 
             print("[INFO][static_web_service] Devices and topics loaded.")
         except Exception as e:
             print(f"[ERROR][static_web_service] Failed to fetch devices: {e}")
             exit(1)
 
+    # --- Filtered query on the catalog: only the matching devices are sent (see services/device_index.py) ---
+    def query_devices(self, **params):
+        response = requests.get(f"{self.catalog_url}/get_devices", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def update_topics(self):
+        buildings = set()
+        topics = set()
+        for device_id, info in self.config_data["devices"].items():
+            buildings.add(info["building"])
+            topics.add(info["topic"])
+            self.topic_codecs[info["topic"]] = info.get("codec")
+
+        self.config_data["Buildings"] = list(buildings)
+        self.config_data["topics"] = list(topics)
+
+    # --- Device change pushed by the catalog (see utils/catalog_watcher.py) ---
+    def on_device_change(self, device_id, info):
+        devices = self.config_data["devices"]
+        if devices.get(device_id) == info:
+            return      # already known (retained devices on every connect)
+        old = devices.pop(device_id, None)
+        if old is not None and old.get("type") in ["Velocity_Sensor", "Accelerometer_Sensor"]:
+            self.mqtt_client.unsubscribe(old.get("summary_topic") or old.get("topic", ""))
+        if info is not None:
+            devices[device_id] = info
+            if info.get("type") in ["Velocity_Sensor", "Accelerometer_Sensor"]:
+                topic = info.get("summary_topic") or info.get("topic", "")
+                self.mqtt_client.subscribe(topic)
+                print(f"[MQTT][static_web_service] Subscribed to topic: {topic} ({info.get('type')})")
+        else:
+            print(f"[INFO][static_web_service] Device removed: {device_id}")
+        self.update_topics()
+        self.save_json_file(refresh=False)
+
     def subscribe_all_devices(self):  
         for device_id, info in self.config_data["devices"].items():  
             device_type = info.get("type", "")  
-            topic = info.get("topic", "")  
+            # the per second summary stream is enough for storage (raw topic only for sensors without it)
+            topic = info.get("summary_topic") or info.get("topic", "")  
             if device_type in ["Velocity_Sensor", "Accelerometer_Sensor"]:  
                 self.mqtt_client.subscribe(topic)  
                 print(f"[MQTT][static_web_service] Subscribed to topic: {topic} ({device_type})")  
@@ -100,16 +141,20 @@ class StaticWebService:
         if rc == 0:
             print("[MQTT][static_web_service] Connected successfully.")
             # Subscribe to all existing devices' topics
-            self.mqtt_client.subscribe(self.warning_topic)
-            print(f"[MQTT][static_web_service] Subscribed to WARNING topic: {self.warning_topic}")
+            # warnings of every building: EQ_WARNING/<region>/<building> (and the EQ_WARNING/ broadcast)
+            warning_filter = f"{self.warning_topic}#"
+            self.mqtt_client.subscribe(warning_filter)
+            print(f"[MQTT][static_web_service] Subscribed to WARNING topic: {warning_filter}")
             self.subscribe_all_devices()  
+            if self.watcher is not None:
+                self.watcher.subscribe()
         else:
             print(f"[MQTT][static_web_service] Connection failed with code {rc}")
 
 
     def on_message(self, client, userdata, msg):
         try:
-            payload = json.loads(msg.payload.decode('utf-8'))
+            payload = decode_payload(msg.payload, self.topic_codecs.get(msg.topic))
 
             # Manage controller messages
             if "command" in payload:
@@ -149,40 +194,19 @@ class StaticWebService:
     @cherrypy.expose
     @cherrypy.tools.json_out()
     def sensors(self):
-        # Refresh device data before responding
-        self.get_devices()
-        sensors = {}
-        for device_id, info in self.config_data["devices"].items():
-            if info.get("type") in ["Accelerometer_Sensor", "Velocity_Sensor"]:
-                sensors[device_id] = info
-        return sensors
+        return self.query_devices(type="Accelerometer_Sensor,Velocity_Sensor")
     
     # GET /sensors - Return only active actuators. (buzzer, light, cutoffs)
     @cherrypy.expose
     @cherrypy.tools.json_out()
     def actuators(self):
-        # Refresh device data before responding
-        self.get_devices()
-        actuators = {}
-        for device_id, info in self.config_data["devices"].items():
-            if info.get("type") in ["Buzzer","FlashingLight","ElectricityCutoff",
-                                     "GasCutoff","WaterCutoff"]:
-                actuators[device_id] = info
-        return actuators
+        return self.query_devices(type="Buzzer,FlashingLight,ElectricityCutoff,GasCutoff,WaterCutoff")
     
     # GET /devices_building?type=Accelerometer_Sensor&building=Building1
     @cherrypy.expose
     @cherrypy.tools.json_out()
     def devices_building(self, type, building):
-        # Refresh device data before responding
-        self.get_devices()
-        device_ids = []
-
-        for device_id, device_info in self.config_data["devices"].items():
-            if device_info.get("type") == type and device_info.get("building") == building:
-                device_ids.append(device_id)
-
-        return {"matching_devices": device_ids}
+        return {"matching_devices": list(self.query_devices(type=type, building=building))}
 
     # GET /status - Return system status
     @cherrypy.expose
@@ -192,6 +216,12 @@ class StaticWebService:
             "system_status": self.config_data["System_Status"]
         }
     
+    # GET /latency - Alert latency histograms (p50/p99/max per hop) dumped by the controller and actuators
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def latency(self):
+        return load_dumps(self.latency_dir)
+
     # GET / sensors' outputs - for drawing charts and tables
     @cherrypy.expose
     @cherrypy.tools.json_out()
@@ -291,11 +321,11 @@ if __name__ == "__main__":
     cherrypy.tree.mount(service, '/', conf)
     cherrypy.engine.start()
 
-    # ----------------- Periodic device check (simple loop) -----------------
+    # ----------------- Periodic device check (slow resync, changes are pushed by the catalog) -----------------
     old_devices = set(service.config_data["devices"].keys())
     try:
         while True:
-            time.sleep(60)  # wait 60 seconds
+            time.sleep(service.catalog_resync_interval)
             service.get_devices()
             new_devices = set(service.config_data["devices"].keys()) - old_devices
             if new_devices:
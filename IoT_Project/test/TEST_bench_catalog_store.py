@@ -0,0 +1,84 @@
+# TEST_bench_catalog_store.py
+# Benchmark: registrations per second of the Data Catalog store with concurrent threads
+# (like the CherryPy thread pool), then indexed lookups. No catalog process or broker needed.
+#   python -m test.TEST_bench_catalog_store --backend sqlite --devices 20000 --threads 10
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from services.catalog_store import open_store
+
+TYPES = ["Accelerometer_Sensor", "Velocity_Sensor", "Buzzer", "FlashingLight", "GasCutoff"]
+
+
+def device(i):
+    building = f"Building_{i % 50}"
+    dev_type = TYPES[i % len(TYPES)]
+    client_id = f"{dev_type[:3]}_{uuid.uuid4()}"
+    return client_id, {"type": dev_type, "building": building,
+                       "location": {"latitude": 45.0, "longitude": 7.0},
+                       "topic": f"devices/{building}/{client_id}", "codec": "senml+json"}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "memory"])
+    parser.add_argument("--devices", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--bulk", type=int, default=100, help="devices per register_devices batch")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "catalog.db")
+    store = open_store(args.backend, path=path) if args.backend == "sqlite" else open_store(args.backend)
+    devices = [device(i) for i in range(args.devices)]
+    chunks = [devices[i::args.threads] for i in range(args.threads)]
+
+    def register(chunk):
+        for client_id, info in chunk:
+            store.put(client_id, info)
+
+    threads = [threading.Thread(target=register, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(f"[BENCH] {args.backend}: {len(store)} devices registered by {args.threads} threads in {elapsed:.2f} s "
+          f"-> {args.devices / elapsed:,.0f} registrations/s")
+
+    start = time.perf_counter()
+    found = 0
+    for i in range(args.lookups):
+        found += len(store.find(type="Buzzer", building=f"Building_{i % 50}"))
+    elapsed = time.perf_counter() - start
+    print(f"[BENCH] {args.lookups} lookups (type + building, {found // args.lookups} devices each): "
+          f"{elapsed / args.lookups * 1e6:.0f} µs/lookup")
+
+    # bulk registration / deletion (register_devices / delete_devices): one transaction per batch
+    bulk = [device(i) for i in range(args.devices)]
+    start = time.perf_counter()
+    for i in range(0, len(bulk), args.bulk):
+        store.put_many(bulk[i:i + args.bulk])
+    elapsed = time.perf_counter() - start
+    print(f"[BENCH] {args.devices} devices registered in batches of {args.bulk}: {elapsed:.2f} s "
+          f"-> {args.devices / elapsed:,.0f} registrations/s")
+    start = time.perf_counter()
+    ids = [client_id for client_id, _ in bulk]
+    for i in range(0, len(ids), args.bulk):
+        store.delete_many(ids[i:i + args.bulk])
+    elapsed = time.perf_counter() - start
+    print(f"[BENCH] {args.devices} devices deleted in batches of {args.bulk}: {elapsed:.2f} s "
+          f"-> {args.devices / elapsed:,.0f} deletions/s")
+
+    start = time.perf_counter()
+    all_devices = store.all()
+    print(f"[BENCH] full get_devices ({len(all_devices)} devices): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
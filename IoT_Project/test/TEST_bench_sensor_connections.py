@@ -0,0 +1,111 @@
+# TEST_bench_sensor_connections.py
+# Benchmark: memory and thread count per added virtual sensor,
+# one paho client per sensor (old BaseSensor) vs. the shared MqttPublisherPool.
+#   python -m test.TEST_bench_sensor_connections --sensors 200 --seconds 5
+import paho.mqtt.client as mqtt
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+from utils.config_loader import ConfigLoader
+from utils.mqtt_publisher import MqttPublisherPool
+
+cfg = ConfigLoader()
+mqtt_host = cfg.mqtt_host
+mqtt_port = cfg.mqtt_port
+interval = float(cfg.sensor_interval)
+
+BENCH_TOPIC = "sensors/bench/Virtual_Unit/"
+
+
+def rss_kb():
+    """ Resident memory of this process (kB), read from /proc on Linux. """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reading(sensor_id):
+    return json.dumps({"bn": sensor_id, "e": [{"n": "acceleration", "u": "Gal", "t": time.time(),
+                       "v": {"x": random.random(), "y": random.random(), "z": random.random()}}]})
+
+
+# --- old behaviour: every sensor thread owns a client (+ its network thread) ---
+def per_client_sensor(sensor_id, running):
+    client = mqtt.Client(sensor_id)
+    client.connect(mqtt_host, mqtt_port)
+    client.loop_start()
+    try:
+        while running["flag"]:
+            client.publish(BENCH_TOPIC + sensor_id, reading(sensor_id), qos=0)
+            time.sleep(interval)
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+
+# --- new behaviour: every sensor thread publishes through the shared pool ---
+def shared_sensor(sensor_id, running, pool):
+    while running["flag"]:
+        pool.publish(sensor_id, BENCH_TOPIC + sensor_id, reading(sensor_id), qos=0)
+        time.sleep(interval)
+
+
+def bench(mode, n_sensors, seconds):
+    threads_before = threading.active_count()
+    rss_before = rss_kb()
+
+    pool = MqttPublisherPool(mqtt_host, mqtt_port, name=f"bench_{uuid.uuid4().hex[:6]}",
+                             size=cfg.sensor_mqtt_connections) if mode == "shared" else None
+    running = {"flag": True}
+    threads = []
+    for _ in range(n_sensors):
+        sensor_id = f"Bench_{uuid.uuid4()}"
+        if mode == "shared":
+            t = threading.Thread(target=shared_sensor, args=(sensor_id, running, pool))
+        else:
+            t = threading.Thread(target=per_client_sensor, args=(sensor_id, running))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    time.sleep(seconds)
+    threads_after = threading.active_count()
+    rss_after = rss_kb()
+
+    running["flag"] = False
+    for t in threads:
+        t.join()
+    if pool:
+        pool.close()
+
+    added_threads = threads_after - threads_before
+    added_kb = rss_after - rss_before
+    print(f"[BENCH] {mode:>10} | sensors: {n_sensors} | threads: +{added_threads} "
+          f"({added_threads / n_sensors:.2f}/sensor) | RSS: +{added_kb} kB ({added_kb / n_sensors:.1f} kB/sensor)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--mode", choices=["per_client", "shared", "both"], default="both")
+    args = parser.parse_args()
+
+    if args.mode in ("per_client", "both"):
+        bench("per_client", args.sensors, args.seconds)
+    if args.mode in ("shared", "both"):
+        bench("shared", args.sensors, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
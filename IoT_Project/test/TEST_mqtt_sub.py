@@ -2,6 +2,7 @@
 import paho.mqtt.client as mqtt
 from utils.topic_fetcher import TopicFetcher
 from utils.config_loader import ConfigLoader
+from utils.payload_codec import decode_payload
 
 catalog_url = "http://127.0.0.1:8081"
 static_web_url = "http://127.0.0.1:8080"
@@ -23,7 +24,16 @@ def on_connect(client, userdata, flags, rc):
     client.subscribe(TOPIC)  
 
 def on_message(client, userdata, msg):
-    print(f"[{msg.topic}] {msg.payload.decode()}")
+    try:
+        payload = decode_payload(msg.payload)     # SenML JSON or binary records
+    except Exception:
+        print(f"[{msg.topic}] {msg.payload!r}")
+        return
+    # batched SenML records carry several samples, print one line per sample
+    for entry in payload.get("e", []):
+        print(f"[{msg.topic}] {payload.get('bn')} t={entry.get('t')} {entry.get('n')}={entry.get('v')} {entry.get('u')}")
+    if "e" not in payload:
+        print(f"[{msg.topic}] {payload}")
 
 client = mqtt.Client()
 client.on_connect = on_connect
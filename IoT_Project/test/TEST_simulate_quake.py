@@ -0,0 +1,38 @@
+# TEST_simulate_quake.py
+# Sends an earthquake scenario to the simulated sensors (through the Adjust topic).
+#   python -m test.TEST_simulate_quake Building_A 6.0 30
+import paho.mqtt.client as mqtt
+import json
+import sys
+import time
+
+from utils.config_loader import ConfigLoader
+from utils.topic_fetcher import TopicFetcher
+
+cfg = ConfigLoader()
+catalog_url = cfg.catalog_url
+mqtt_host = cfg.mqtt_host
+mqtt_port = cfg.mqtt_port
+
+fetcher = TopicFetcher(catalog_url)
+adjust_topic = fetcher.get_adjust_topic()
+
+BUILDING = sys.argv[1] if len(sys.argv) > 1 else "Building_A"
+MAGNITUDE = float(sys.argv[2]) if len(sys.argv) > 2 else 6.0
+DISTANCE_KM = float(sys.argv[3]) if len(sys.argv) > 3 else 30
+
+payload = {
+    "action": "simulate_quake",
+    "building": BUILDING,
+    "magnitude": MAGNITUDE,
+    "distance_km": DISTANCE_KM,
+    "onset": time.time()
+}
+
+client = mqtt.Client()
+client.connect(mqtt_host, mqtt_port, 60)
+client.loop_start()
+client.publish(adjust_topic, json.dumps(payload), qos=1).wait_for_publish()
+print(f"🌍 Quake scenario sent to {adjust_topic}: {payload}")
+client.loop_stop()
+client.disconnect()
@@ -0,0 +1,44 @@
+# catalog_mirror.py
+import requests
+
+'''
+Local copy of the Data Catalog devices, patched with the deltas of /changes?since=<version>:
+a poll where nothing changed costs one small request, a change costs its own entries only.
+The first sync, a restart of the catalog (new epoch) or a client too far behind the change log
+get the full map again ("reset").
+    mirror = CatalogMirror(catalog_url, types=["Accelerometer_Sensor", "Velocity_Sensor"])
+    if mirror.sync():       # True when the devices changed
+        use(mirror.devices)
+'''
+
+
+class CatalogMirror:
+    def __init__(self, catalog_url, types=None, timeout=10):
+        self.catalog_url = catalog_url
+        self.params = {"type": ",".join(types)} if types else {}
+        self.timeout = timeout
+        self.devices = {}
+        self.epoch = None
+        self.version = 0
+
+    def sync(self):
+        """ Fetch the changes since the last sync -> True when the mirror changed (raises on HTTP errors). """
+        response = requests.get(f"{self.catalog_url}/changes", timeout=self.timeout,
+                                params=dict(self.params, since=self.version, epoch=self.epoch or ""))
+        response.raise_for_status()
+        data = response.json()
+
+        if data.get("reset"):
+            changed = data["devices"] != self.devices
+            self.devices = data["devices"]
+        else:
+            changed = False
+            for change in data["changes"]:
+                client_id, info = change["client_id"], change["info"]
+                if info is None:
+                    changed |= self.devices.pop(client_id, None) is not None
+                elif self.devices.get(client_id) != info:
+                    self.devices[client_id] = info
+                    changed = True
+        self.epoch, self.version = data["epoch"], data["version"]
+        return changed
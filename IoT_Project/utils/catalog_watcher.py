@@ -0,0 +1,31 @@
+# catalog_watcher.py
+import json
+
+'''
+Push discovery of devices: the Data Catalog publishes a retained message for every device on
+    <catalog topic>/<client_id>    payload = device info (JSON), empty payload = device deleted
+Subscribing to <catalog topic>/+ first delivers all the retained devices, then every change
+as soon as it happens (no need to refetch /get_devices).
+The watcher gets its own paho callback, so the service's on_message only sees sensor data.
+'''
+
+
+class CatalogWatcher:
+    def __init__(self, mqtt_client, catalog_topic, on_change):
+        """ on_change(client_id, info) - info is None when the device was deleted. """
+        self.mqtt_client = mqtt_client
+        self.subscription = f"{catalog_topic.rstrip('/')}/+"
+        self.on_change = on_change
+        mqtt_client.message_callback_add(self.subscription, self.on_message)
+
+    def subscribe(self):
+        """ Call from on_connect (the retained devices arrive again after every reconnect). """
+        self.mqtt_client.subscribe(self.subscription, qos=1)
+
+    def on_message(self, client, userdata, msg):
+        client_id = msg.topic.rsplit("/", 1)[-1]
+        try:
+            info = json.loads(msg.payload.decode()) if msg.payload else None
+            self.on_change(client_id, info)
+        except Exception as e:
+            print(f"[ERROR][catalog_watcher] Failed to process change of {client_id}: {e}")
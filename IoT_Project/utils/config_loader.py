@@ -33,8 +33,82 @@ class ConfigLoader:
         # sensor interval (the time that sensors read)
         self.sensor_interval = config["sensor_interval"]
 
+        # sensor batching (how many samples / how many seconds are packed in one SenML record)
+        batch_config = config.get("sensor_batch", {})
+        self.sensor_batch_size = batch_config.get("size", 1)
+        self.sensor_batch_window = batch_config.get("window", 0.0)
+
+        # broker connections shared by all the virtual sensors of one process
+        self.sensor_mqtt_connections = config.get("sensor_mqtt_connections", 1)
+
+        # payload encoding of the sensor records ("senml+json" or "senml+bin")
+        self.sensor_codec = config.get("sensor_codec", "senml+json")
+
+        # period (s) of the min/max/mean/peak summary stream of each sensor
+        self.summary_period = config.get("summary_period", 1.0)
+
+        # how often (s) sensors print their achieved sample rate and jitter (0 = never)
+        self.sensor_stats_interval = config.get("sensor_stats_interval", 0)
+
+        # simulated earthquakes for the virtual sensors
+        # ex. "quakes": [{"building": "Building_A", "magnitude": 6.0, "distance_km": 30, "start_after": 60}]
+        simulation_config = config.get("simulation", {})
+        self.simulation_seed = simulation_config.get("seed")
+        self.simulation_quakes = simulation_config.get("quakes", [])
+
+        # on-sensor trigger (heartbeats while quiet, full rate when excited)
+        self.edge_trigger = config.get("edge_trigger", {"enabled": False})
+
         # Earthquake time that we will check. (like if the acc is above thr. for 30 ms it will be Eq.)
         self.EQ_time_check = config["EQ_time_check"]
 
+        # vector magnitude ("xyz" or horizontal "xy") and window (s) of the PGA/PGV peak of the controller
+        measurement_config = config.get("measurement", {})
+        self.measurement_components = measurement_config.get("components", "xyz")
+        self.peak_window = measurement_config.get("peak_window", self.EQ_time_check)
+
+        # detector of the controller: "threshold", "sta_lta" or "both" (+ STA/LTA parameters)
+        self.detector_config = config.get("detector", {"mode": "threshold"})
+
+        # per sensor reorder stage of the controller: samples wait "lateness" s (sample time) for older ones,
+        # "max_hold" s (wall clock) at most when no newer sample comes
+        self.reorder_config = config.get("reorder", {"enabled": False})
+
+        # k-of-n agreement of the sensors of a building before the cutoff
+        self.consensus_config = config.get("consensus", {"enabled": False})
+
+        # devices of the Data Catalog: "memory" or "sqlite" (persistent, indexed on type / building / topic)
+        self.catalog_store = config.get("catalog_store", {"backend": "memory"})
+        # registrations / deletions kept for /changes?since= (older clients get the full map again)
+        self.catalog_changelog = config.get("catalog_changelog", 10000)
+        # heartbeats: devices of "types" not heard for "ttl" s are evicted, processes beat every "interval" s
+        self.liveness_config = config.get("liveness", {"enabled": False})
+
+        # incidents of the controller: warnings only on escalation, "rate_limit" s per building
+        self.alerts_config = config.get("alerts", {"enabled": False})
+
+        # controller worker processes (sensors split by consistent hashing of client_id) + coordinator
+        sharding_config = config.get("sharding", {})
+        self.controller_shards = sharding_config.get("shards", 1)
+        self.rebalance_interval = sharding_config.get("rebalance_interval", 10)
+
+        # full /get_devices refetch (s); device changes are pushed by the catalog in between
+        self.catalog_resync_interval = config.get("catalog_resync_interval", 60)
+
+        # region of the per building warning topics EQ_WARNING/<region>/<building> ({"North": ["Building_A"]})
+        self.warning_regions = config.get("warning_regions", {})
+
+        # controller ingest queue between the MQTT thread and the detection workers
+        # policy: "drop_oldest", "drop_newest" or "block"
+        self.ingest_config = config.get("ingest", {"enabled": False})
+
+        # alert latency histograms, dumped by every process to <dir>/<name>.json
+        latency_config = config.get("latency", {})
+        self.latency_dump_interval = latency_config.get("dump_interval", 60)
+        self.latency_dir = latency_config.get("dir", os.path.join("data", "latency"))
+
+        # warm restart of the controller: periodic snapshot of its subscriptions and detection state
+        self.snapshot_config = config.get("snapshot", {"enabled": False})
+
         # Telegram Token
         self.Token_config = config["TOKEN"]
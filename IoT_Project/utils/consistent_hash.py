@@ -0,0 +1,32 @@
+# consistent_hash.py
+import bisect
+import hashlib
+
+'''
+Consistent hash ring: maps a key (sensor client_id) to one of the shards 0..N-1.
+Every shard owns "vnodes" points of the ring, a key goes to the first point after its hash.
+When the number of shards changes only ~1/N of the keys move to another shard.
+The hash is the first 8 bytes of md5 (stable between processes, unlike hash()).
+'''
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, shards, vnodes=160):
+        self.shards = shards
+        self.vnodes = vnodes
+        points = sorted((_hash(f"shard-{shard}#{v}"), shard)
+                        for shard in range(shards) for v in range(vnodes))
+        self.hashes = [h for h, _ in points]
+        self.owners = [shard for _, shard in points]
+
+    def shard_for(self, key):
+        i = bisect.bisect(self.hashes, _hash(key))
+        return self.owners[i % len(self.owners)]
+
+    def partition(self, keys):
+        """ keys -> {key: shard} """
+        return {key: self.shard_for(key) for key in keys}
@@ -23,11 +23,12 @@ class DeviceManager:
         self.adjust_topic = fetcher.get_adjust_topic()
 
     def add_device(self, data: dict):
-        """ publishes MQTT message to add new device. """
+        """ publishes MQTT message to add new device ("count": N devices with one message). """
         data["action"] = "add"
         device_type = data.get("type")
         building = data.get("building")
         location = data.get("location", {})
+        count = data.get("count", 1)
 
         # Validation
         if not device_type or device_type not in self.all_devices:
@@ -36,6 +37,8 @@ class DeviceManager:
             return {"error": "Invalid or missing building"}
         if location.get("latitude") is None or location.get("longitude") is None:
             return {"error": "Missing latitude or longitude"}
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            return {"error": "Invalid count"}
 
         try:
             payload = json.dumps(data)
@@ -44,15 +47,17 @@ class DeviceManager:
             return {"error": f"Failed to publish MQTT message: {str(e)}"}
 
         return {
-            "message": f"One {device_type} adjustment message sent!",
+            "message": f"One {device_type} adjustment message sent for {count} device(s)!",
             "MQTT topic": self.adjust_topic,
             "payload": data
         }
 
 
     def remove_device(self, data: dict):
+        """ "device_id", or "device_ids": [...] to stop and delete a batch with one message and one request. """
         data["action"] = "remove"
         device_id = data.get("device_id")
+        device_ids = data.get("device_ids")
         try:
             payload = json.dumps(data)
             self.mqtt_client.publish(self.adjust_topic, payload, qos=1)
@@ -60,11 +65,16 @@ class DeviceManager:
             return {"error": f"Failed to publish MQTT message: {str(e)}"}
 
         try:
-            response = requests.post(f"{self.catalog_url}/delete_device", json={"device_id": device_id})
-            if response.status_code == 200:
-                catalog_deleted = True
+            if device_ids is not None:
+                response = requests.post(f"{self.catalog_url}/delete_devices", json={"device_ids": device_ids})
+                # deleted only if all of them were in the catalog
+                catalog_deleted = response.status_code == 200 and not response.json().get("not_found")
             else:
-                catalog_deleted = False
+                response = requests.post(f"{self.catalog_url}/delete_device", json={"device_id": device_id})
+                if response.status_code == 200:
+                    catalog_deleted = True
+                else:
+                    catalog_deleted = False
         except Exception as e:
             catalog_deleted = False
 
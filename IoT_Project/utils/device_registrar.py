@@ -4,6 +4,7 @@ import requests
 class DeviceRegistrar:
     def __init__(self, catalog_url):
         self.catalog_url = catalog_url
+        self.info = {}      # full answer of the last registration (ex. "summary_topic" of sensors)
 
     def register(self, payload):
         """
@@ -17,10 +18,29 @@ class DeviceRegistrar:
             response = requests.post(f"{self.catalog_url}/register_device", json=payload)
             response.raise_for_status()
             data = response.json()
+            self.info = data
             client_id = data["client_id"]
             topic = data["topic"]
             print(f"[REGISTER] registered with ID: {client_id}, Topic: {topic}")
             return client_id, topic
         except Exception as e:
             print(f"[ERROR] Failed to register: {e}")
-            exit(1)
\ No newline at end of file
+            exit(1)
+
+    def register_many(self, payloads):
+        """
+        Registers a batch of devices in one request (all or nothing in the catalog).
+        payloads (list):
+                        device infos, as for register()
+        Returns:
+                        the catalog answers in the same order ({"client_id", "topic", ...}), [] on failure
+        """
+        try:
+            response = requests.post(f"{self.catalog_url}/register_devices", json={"devices": payloads})
+            response.raise_for_status()
+            answers = response.json()["devices"]
+            print(f"[REGISTER] registered {len(answers)} devices")
+            return answers
+        except Exception as e:
+            print(f"[ERROR] Failed to register {len(payloads)} devices: {e}")
+            return []
\ No newline at end of file
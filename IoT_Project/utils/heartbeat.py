@@ -0,0 +1,72 @@
+# heartbeat.py
+import threading
+import requests
+from utils.device_registrar import DeviceRegistrar
+
+'''
+Liveness heartbeats of the devices of one process: every "interval" seconds all of them go to the
+Data Catalog in one POST /heartbeat (not one request per device). A running device the catalog no
+longer knows was evicted after a missed TTL (network outage, catalog down): it registers again with
+the same client_id, so it keeps its topic and the Controller subscribes to it again.
+    heartbeat = HeartbeatSender(catalog_url, 10, lambda: list(self.sensors), self.registrations.get,
+                                name="Accelerometer_Sensor")
+    heartbeat.start()
+'''
+
+
+class HeartbeatSender:
+    def __init__(self, catalog_url, interval, device_ids, registration=None, name="devices", timeout=5):
+        """
+        device_ids: callable -> ids of the running devices (read at every beat)
+        registration: callable client_id -> its registration payload (with "client_id"), None: not re-registered
+        """
+        self.catalog_url = catalog_url
+        self.interval = interval
+        self.device_ids = device_ids
+        self.registration = registration
+        self.name = name
+        self.timeout = timeout
+        self.unknown = set()
+        self.stopped = threading.Event()
+
+    def beat(self):
+        """ One batched heartbeat -> the ids unknown to the catalog (registered again when possible) """
+        device_ids = list(self.device_ids())
+        if not device_ids:
+            return []
+        response = requests.post(f"{self.catalog_url}/heartbeat", json={"device_ids": device_ids},
+                                 timeout=self.timeout)
+        response.raise_for_status()
+        unknown = response.json().get("unknown", [])
+        new = set(unknown) - self.unknown
+        if new:
+            print(f"[WARN][{self.name}] {len(new)} devices unknown to the catalog (evicted?): "
+                  f"{', '.join(sorted(new)[:5])}")
+        if unknown:
+            self.register_again(unknown)
+        self.unknown = set(unknown)
+        return unknown
+
+    def register_again(self, client_ids):
+        payloads = [p for p in map(self.registration or (lambda client_id: None), client_ids) if p is not None]
+        if not payloads:
+            return
+        answers = DeviceRegistrar(self.catalog_url).register_many(payloads)
+        again = [answer["client_id"] for answer in answers]
+        lost = [p["client_id"] for p in payloads if p["client_id"] not in again]
+        print(f"[INFO][{self.name}] {len(again)} devices registered again with their client_id")
+        if lost:
+            print(f"[WARN][{self.name}] {len(lost)} devices got another client_id: {', '.join(lost[:5])}")
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as e:
+                print(f"[WARN][{self.name}] Heartbeat failed: {e}")
+
+    def start(self):
+        threading.Thread(target=self._run, name="heartbeat", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,134 @@
+# latency_metrics.py
+import json
+import math
+import os
+import threading
+import time
+
+'''
+Latency histograms of the alert path, one per hop:
+    sample->decision     SenML "t" of the triggering sample -> controller decision
+    decision->publish    controller decision -> warning published
+    publish->receive     warning published -> received by the actuator
+    receive->act         received -> the actuator acted (ex. GasCutoffActuator.cut_gas)
+    sample->act          end to end
+Warning messages carry a correlation "id" and the timestamps of the previous hops.
+Buckets are logarithmic (10% wide from 0.1 ms to ~100 s): recording is O(1), memory is fixed,
+percentiles are accurate to one bucket; max is exact.
+Each process dumps its histograms to <dir>/<name>.json every "dump_interval" seconds, with the counters
+registered by add_counters (ex. ingest queue, reorder stage); the static web service serves them on GET /latency.
+'''
+
+MIN_LATENCY = 1e-4      # s, first bucket
+GROWTH = 1.1
+BUCKETS = 150
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (BUCKETS + 1)     # last bucket: above the range
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        seconds = max(seconds, 0.0)
+        if seconds <= MIN_LATENCY:
+            i = 0
+        else:
+            i = min(BUCKETS, 1 + int(math.log(seconds / MIN_LATENCY) / math.log(GROWTH)))
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """ Upper bound of the bucket that holds the p-th percentile (seconds). """
+        if not self.count:
+            return 0.0
+        rank = math.ceil(p / 100.0 * self.count)
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(MIN_LATENCY * GROWTH ** i, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3)
+        }
+
+
+class LatencyMetrics:
+    def __init__(self, name, dump_dir=os.path.join("data", "latency"), dump_interval=60):
+        self.name = name
+        self.dump_dir = dump_dir
+        self.dump_interval = dump_interval
+        self.hops = {}      # hop -> LatencyHistogram
+        self.counters = {}  # name -> function returning a dict of counters
+        self.lock = threading.Lock()
+
+    def record(self, hop, seconds):
+        with self.lock:
+            hist = self.hops.get(hop)
+            if hist is None:
+                hist = self.hops[hop] = LatencyHistogram()
+            hist.record(seconds)
+
+    def record_between(self, hop, start, end):
+        """ start/end are wall clock timestamps (time.time()); missing -> nothing recorded. """
+        if start is not None and end is not None:
+            self.record(hop, end - start)
+
+    def add_counters(self, name, stats):
+        self.counters[name] = stats
+
+    def snapshot(self):
+        with self.lock:
+            return {hop: hist.summary() for hop, hist in self.hops.items()}
+
+    def dump(self):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        path = os.path.join(self.dump_dir, f"{self.name}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"name": self.name, "time": time.time(), "hops": self.snapshot(),
+                       "counters": {name: stats() for name, stats in self.counters.items()}}, f, indent=2)
+        os.replace(tmp, path)
+
+    def start_dump(self):
+        """ Periodic dump thread (0 = never). """
+        if not self.dump_interval:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.dump_interval)
+                try:
+                    self.dump()
+                except OSError as e:
+                    print(f"[WARN][latency] Could not write {self.name} latency: {e}")
+
+        threading.Thread(target=loop, name=f"{self.name}-latency", daemon=True).start()
+
+
+def load_dumps(dump_dir=os.path.join("data", "latency")):
+    """ All the dumps of the processes -> {name: {...}} """
+    dumps = {}
+    if not os.path.isdir(dump_dir):
+        return dumps
+    for file in sorted(os.listdir(dump_dir)):
+        if file.endswith(".json"):
+            try:
+                with open(os.path.join(dump_dir, file)) as f:
+                    data = json.load(f)
+                dumps[data.get("name", file[:-5])] = data
+            except (OSError, json.JSONDecodeError):
+                continue
+    return dumps
@@ -0,0 +1,45 @@
+# mqtt_publisher.py
+import paho.mqtt.client as mqtt
+import uuid
+import zlib
+
+class MqttPublisherPool:
+    """
+    A small pool of broker connections shared by all the virtual devices of one process.
+    Every device keeps publishing on its own topic, but instead of opening one
+    TCP connection (and one network thread) per device, it is mapped to one of
+    the pool connections by a stable hash of its client_id.
+    The connection ids get a random suffix: two processes of the same sensor type on one
+    broker must not take over each other's connections.
+    """
+    def __init__(self, host, port, name, size=1):
+        self.host = host
+        self.port = port
+        self.clients = []
+
+        suffix = uuid.uuid4().hex[:8]
+        for i in range(max(1, int(size))):
+            client = mqtt.Client(client_id=f"{name}/publisher_{suffix}_{i}")
+            client.on_connect = self.on_connect
+            client.connect(self.host, self.port)
+            client.loop_start()
+            self.clients.append(client)
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            print("[MQTT][publisher] Shared publisher connected.")
+        else:
+            print(f"[MQTT][publisher] Connection failed with code {rc}")
+
+    def client_for(self, device_id):
+        """ The same device is always published through the same connection (keeps its order). """
+        return self.clients[zlib.crc32(device_id.encode("utf-8")) % len(self.clients)]
+
+    def publish(self, device_id, topic, payload, qos=0):
+        return self.client_for(device_id).publish(topic, payload, qos=qos)
+
+    def close(self):
+        for client in self.clients:
+            client.loop_stop()
+            client.disconnect()
+        self.clients = []
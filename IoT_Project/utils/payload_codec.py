@@ -0,0 +1,113 @@
+# payload_codec.py
+import json
+import struct
+
+'''
+Codecs for the sensor records (same SenML fields, different encodings on the wire).
+Every device advertises its codec in the Data Catalog ("codec" field of the device),
+so consumers know how to decode each topic and mixed fleets keep working.
+
+"senml+json": the usual SenML JSON record
+"senml+bin" : compact binary record (little-endian)
+    header : magic (B) | version (B) | name code (B) | unit code (B) | count (H) | bn length (B) | bn (utf-8)
+    entries: count x [ t (double) | x (float) | y (float) | z (float) ]   -> 20 bytes per sample
+    (name/unit code 255 means the string follows inline: length (B) + utf-8)
+'''
+
+DEFAULT_CODEC = "senml+json"
+
+
+class JsonCodec:
+    name = "senml+json"
+
+    def encode(self, record):
+        return json.dumps(record).encode("utf-8")
+
+    def decode(self, payload):
+        return json.loads(payload.decode("utf-8") if isinstance(payload, (bytes, bytearray)) else payload)
+
+
+class BinaryCodec:
+    name = "senml+bin"
+    MAGIC = 0xB5
+    VERSION = 1
+    NAMES = ["acceleration", "velocity"]
+    UNITS = ["Gal", "m/s"]
+    INLINE = 255
+    HEADER = struct.Struct("<BBBBHB")
+    ENTRY = struct.Struct("<dfff")
+
+    def encode(self, record):
+        entries = record["e"]
+        name = entries[0]["n"]
+        unit = entries[0].get("u", "")
+        # one name/unit per record, mixed records stay in JSON
+        if any(e["n"] != name or e.get("u", "") != unit for e in entries):
+            return JsonCodec().encode(record)
+
+        bn = record["bn"].encode("utf-8")
+        name_code = self.NAMES.index(name) if name in self.NAMES else self.INLINE
+        unit_code = self.UNITS.index(unit) if unit in self.UNITS else self.INLINE
+        parts = [self.HEADER.pack(self.MAGIC, self.VERSION, name_code, unit_code, len(entries), len(bn)), bn]
+        if name_code == self.INLINE:
+            parts.append(self._inline(name))
+        if unit_code == self.INLINE:
+            parts.append(self._inline(unit))
+
+        values = []
+        for e in entries:
+            v = e["v"]
+            values.extend((e["t"], v.get("x", 0.0), v.get("y", 0.0), v.get("z", 0.0)))
+        parts.append(struct.pack("<" + "dfff" * len(entries), *values))
+        return b"".join(parts)
+
+    def decode(self, payload):
+        if payload[:1] != bytes([self.MAGIC]):
+            return CODECS["senml+json"].decode(payload)     # record that was sent as JSON (mixed entries)
+        magic, version, name_code, unit_code, count, bn_len = self.HEADER.unpack_from(payload, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Not a senml+bin payload")
+        offset = self.HEADER.size
+        bn = payload[offset:offset + bn_len].decode("utf-8")
+        offset += bn_len
+        if name_code == self.INLINE:
+            name, offset = self._read_inline(payload, offset)
+        else:
+            name = self.NAMES[name_code]
+        if unit_code == self.INLINE:
+            unit, offset = self._read_inline(payload, offset)
+        else:
+            unit = self.UNITS[unit_code]
+
+        end = offset + count * self.ENTRY.size
+        entries = [{"n": name, "u": unit, "t": t, "v": {"x": x, "y": y, "z": z}}
+                   for t, x, y, z in self.ENTRY.iter_unpack(payload[offset:end])]
+        return {"bn": bn, "e": entries}
+
+    @staticmethod
+    def _inline(text):
+        data = text.encode("utf-8")
+        return bytes([len(data)]) + data
+
+    @staticmethod
+    def _read_inline(payload, offset):
+        length = payload[offset]
+        return payload[offset + 1:offset + 1 + length].decode("utf-8"), offset + 1 + length
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), BinaryCodec())}
+
+
+def get_codec(name=None):
+    """ Codec by name (as advertised in the catalog), JSON when unknown or missing. """
+    return CODECS.get(name or DEFAULT_CODEC, CODECS[DEFAULT_CODEC])
+
+
+def decode_payload(payload, codec_name=None):
+    """
+    Decode a sensor/command payload. With the codec advertised in the catalog for the topic
+    it is used directly, otherwise the encoding is recognised from the first byte.
+    """
+    if codec_name in CODECS:
+        return CODECS[codec_name].decode(payload)
+    return CODECS["senml+bin"].decode(payload)     # falls back to JSON when it is not binary
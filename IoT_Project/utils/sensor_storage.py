@@ -6,6 +6,9 @@ import time
 import threading
 import csv
 
+# columns of the per second summaries (x, y, z hold the peaks)
+SUMMARY_FIELDS = [f"{axis}_{stat}" for axis in ["x", "y", "z"] for stat in ["min", "max", "mean"]]
+
 class SensorStorage:
     def __init__(self):
         self.last_saved_second = {}
@@ -20,14 +23,35 @@ class SensorStorage:
 
     def process_message(self, payload):
         sensor_id = payload["bn"]
-        timestamp = payload["e"][0]["t"]
-        sensor_type = payload["e"][0]["n"]
-        unit = payload["e"][0]["u"]
-        current_second = int(timestamp)
-
         if sensor_id is None:
             return
 
+        # A batched record carries several samples, each with its own timestamp
+        for entry in payload["e"]:
+            if entry["n"] in ["acceleration", "velocity"]:     # not the heartbeats of quiet sensors
+                self.process_entry(sensor_id, entry)
+            elif entry["n"] in ["acceleration_summary", "velocity_summary"]:
+                self.process_summary(sensor_id, entry)
+
+    def process_summary(self, sensor_id, entry):
+        # per second summary: x, y, z are the peaks (max |v|), with min/max/mean of each axis next to them
+        reading = {"n": sensor_id, "u": entry["u"], "t": entry["t"]}
+        for axis in ["x", "y", "z"]:
+            stats = entry["v"][axis]
+            reading[axis] = stats["peak"]
+            reading[f"{axis}_min"] = stats["min"]
+            reading[f"{axis}_max"] = stats["max"]
+            reading[f"{axis}_mean"] = stats["mean"]
+        with self.lock:
+            self.last_saved_second[sensor_id] = int(entry["t"])
+            self.save_reading(sensor_id, reading)
+
+    def process_entry(self, sensor_id, entry):
+        timestamp = entry["t"]
+        sensor_type = entry["n"]
+        unit = entry["u"]
+        current_second = int(timestamp)
+
         with self.lock:
             # Save only once per second
             if self.last_saved_second.get(sensor_id) == current_second:
@@ -36,7 +60,7 @@ class SensorStorage:
             
             reading = None
             if sensor_type in ["acceleration", "velocity"]:
-                values = payload["e"][0]["v"]
+                values = entry["v"]
                 reading = {
                     "n": sensor_id,
                     "u": unit,
@@ -47,40 +71,46 @@ class SensorStorage:
                 }
             
             if reading:
-                # --- Save to CSV file ---
-                csv_filename = os.path.join(self.data_folder, f"{sensor_id}.csv")
-                csv_header = ["timestamp", "name", "unit", "x", "y", "z"]
-                
-                write_header = not os.path.exists(csv_filename) or os.path.getsize(csv_filename) == 0
-                
-                with open(csv_filename, "a", newline='') as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=csv_header)
-                    if write_header:
-                        writer.writeheader()
-                    writer.writerow({
-                        "timestamp": reading["t"],
-                        "name": reading["n"],
-                        "unit": reading["u"],
-                        "x": reading["x"],
-                        "y": reading["y"],
-                        "z": reading["z"]
-                    })
-                    
-                # --- Save to JSON file ---
-                json_filename = os.path.join(self.data_folder, f"{sensor_id}.json")
+                self.save_reading(sensor_id, reading)
+
+    def save_reading(self, sensor_id, reading):
+        # --- Save to CSV file ---
+        csv_filename = os.path.join(self.data_folder, f"{sensor_id}.csv")
+        csv_header = ["timestamp", "name", "unit", "x", "y", "z"] + SUMMARY_FIELDS
+
+        write_header = not os.path.exists(csv_filename) or os.path.getsize(csv_filename) == 0
+
+        with open(csv_filename, "a", newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=csv_header)
+            if write_header:
+                writer.writeheader()
+            row = {
+                "timestamp": reading["t"],
+                "name": reading["n"],
+                "unit": reading["u"],
+                "x": reading["x"],
+                "y": reading["y"],
+                "z": reading["z"]
+            }
+            for field in SUMMARY_FIELDS:    # empty for raw samples
+                row[field] = reading.get(field, "")
+            writer.writerow(row)
+
+        # --- Save to JSON file ---
+        json_filename = os.path.join(self.data_folder, f"{sensor_id}.json")
+        data_list = []
+        if os.path.exists(json_filename):
+            try:
+                with open(json_filename, "r") as f:
+                    data_list = json.load(f)
+            except json.JSONDecodeError:
+                print(f"[WARNING] Corrupted JSON file found for {sensor_id}. Starting a new one.")
                 data_list = []
-                if os.path.exists(json_filename):
-                    try:
-                        with open(json_filename, "r") as f:
-                            data_list = json.load(f)
-                    except json.JSONDecodeError:
-                        print(f"[WARNING] Corrupted JSON file found for {sensor_id}. Starting a new one.")
-                        data_list = []
-                
-                data_list.append(reading)
 
-                with open(json_filename, "w") as f:
-                    json.dump(data_list, f, indent=2)
+        data_list.append(reading)
+
+        with open(json_filename, "w") as f:
+            json.dump(data_list, f, indent=2)
                 
     def get_history(self, sensor_id, limit):
         json_filename = os.path.join(self.data_folder, f"{sensor_id}.json")
@@ -10,6 +10,8 @@ class TopicFetcher:
         self.catalog_url = url
         self.adjust_topic = None
         self.warning_topic = None
+        self.decision_topic = None
+        self.catalog_topic = None
 
     def get_adjust_topic(self):
         """
@@ -40,4 +42,34 @@ class TopicFetcher:
         except Exception as e:
             print(f"[ERROR] Failed to fetch Warning topic via REST: {e}")
             return None
+
+    def get_decision_topic(self):
+        """
+        Fetch the topic where sharded controller workers publish their decisions.
+        """
+        try:
+            response = requests.get(f"{self.catalog_url}/get_decision_topic")
+            response.raise_for_status()
+            data = response.json()
+            self.decision_topic = data.get("D_topic")
+            print(f"[CONFIG] Decision topic retrieved via REST: {self.decision_topic}")
+            return self.decision_topic
+        except Exception as e:
+            print(f"[ERROR] Failed to fetch Decision topic via REST: {e}")
+            return None
+
+    def get_catalog_topic(self):
+        """
+        Fetch the topic where the catalog publishes the device changes.
+        """
+        try:
+            response = requests.get(f"{self.catalog_url}/get_catalog_topic")
+            response.raise_for_status()
+            data = response.json()
+            self.catalog_topic = data.get("C_topic")
+            print(f"[CONFIG] Catalog topic retrieved via REST: {self.catalog_topic}")
+            return self.catalog_topic
+        except Exception as e:
+            print(f"[ERROR] Failed to fetch Catalog topic via REST: {e}")
+            return None
     
\ No newline at end of file
@@ -0,0 +1,58 @@
+# warning_topics.py
+import time
+import uuid
+
+'''
+Per building warning topics (instead of one EQ_WARNING/ broadcast for every actuator):
+    EQ_WARNING/<region>/<building>      alert for the actuators of one building
+    EQ_WARNING/                         broadcast (building of the sensor unknown)
+The region comes from "warning_regions" in system_config.json ({"North": ["Building_A", ...]}),
+buildings that are not listed are in the "default" region.
+    actuators of a building subscribe to    EQ_WARNING/+/<building>  (+ the broadcast)
+    everything of a region                  EQ_WARNING/<region>/#
+    monitoring (web service)                EQ_WARNING/#
+'''
+
+DEFAULT_REGION = "default"
+
+
+class WarningTopics:
+    def __init__(self, base, regions=None):
+        self.base = base if base.endswith("/") else f"{base}/"
+        self.regions = {}       # building -> region
+        for region, buildings in (regions or {}).items():
+            for building in buildings:
+                self.regions[self.key(building)] = region
+
+    @staticmethod
+    def key(building):
+        # same normalization as the device topics of the catalog
+        return building.replace(" ", "_")
+
+    def for_building(self, building):
+        """ Topic of the alerts of one building (broadcast topic when the building is unknown). """
+        if not building:
+            return self.base
+        key = self.key(building)
+        return f"{self.base}{self.regions.get(key, DEFAULT_REGION)}/{key}"
+
+    def building_filter(self, building):
+        return f"{self.base}+/{self.key(building)}"
+
+    def region_filter(self, region):
+        return f"{self.base}{region}/#"
+
+    def all(self):
+        return f"{self.base}#"
+
+
+def warning_message(command, building=None, trigger=None):
+    """
+    Warning payload with a correlation id and the timestamps of the alert path (see utils/latency_metrics.py):
+    trigger = {"sensor_id": .., "t_sample": SenML t of the triggering sample, "t_decision": ..}
+    """
+    msg = {"command": command, "building": building, "id": uuid.uuid4().hex[:12]}
+    if trigger:
+        msg.update(trigger)
+    msg["t_publish"] = time.time()
+    return msg